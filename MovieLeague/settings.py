@@ -91,19 +91,41 @@ TEMPLATE_LOADERS = (
     'django.template.loaders.app_directories.Loader',
 #     'django.template.loaders.eggs.Loader',
 )
+if not DEBUG:
+    # Compile each template once per process instead of reading and parsing it on every render. Templates edited
+    # while the server runs are only picked up after a restart, so development keeps the plain loaders.
+    TEMPLATE_LOADERS = (
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    )
 
 MIDDLEWARE_CLASSES = (
+    'league.instrumentation.QueryInstrumentationMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'league.middleware.RankingCacheMiddleware',
+    'league.middleware.ReplicaMiddleware',
     # Uncomment the next line for simple clickjacking protection:
     # 'django.middleware.clickjacking.XFrameOptionsMiddleware',
 )
 
 ROOT_URLCONF = 'MovieLeague.urls'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'movieleague',
+        # Or share the cache between processes with:
+        # 'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        # 'LOCATION': '/var/tmp/movieleague_cache',
+    }
+}
+# Whether the cache above is shared between processes, so warm_league_cache and the standings worker can render
+# pages into it for the web processes. Worked out from the backend unless set.
+# LEAGUE_SHARED_CACHE = True
+
 # Python dotted path to the WSGI application used by Django's runserver.
 WSGI_APPLICATION = 'MovieLeague.wsgi.application'
 
@@ -152,6 +174,54 @@ SOCIAL_AUTH_ASSOCIATE_URL_NAME = 'socialauth_associate_complete'
 # Change this to enable Google Analytics
 GOOGLE_ANALYTICS_ID = 'UA-XXXXX-X'
 
+# Record per-request query counts and timings, logged to league.instrumentation and served at /stats/ to
+# INTERNAL_IPS. It logs every query of every request, so it is only on while debugging.
+LEAGUE_INSTRUMENTATION = DEBUG
+LEAGUE_INSTRUMENTATION_HISTORY = 200
+
+# Seconds to keep rendered league pages and standings fragments, 0 to disable caching
+LEAGUE_CACHE_TTL = 300
+
+# Serve movie gross lookups from an in-memory index loaded once per process instead of querying per movie
+LEAGUE_GROSS_INDEX = False
+# Seconds between the index's checks for grosses reconciled by other processes
+LEAGUE_GROSS_INDEX_CHECK = 5
+
+# Gross update sources in order of trust, highest first, for reconciling a movie's canonical gross; sources not
+# listed rank below every listed one. Run reconcile_grosses after changing it.
+LEAGUE_GROSS_SOURCES = ()
+
+# Queue standings recomputation jobs when gross updates, memberships or teams change, for run_standings_worker
+LEAGUE_STANDINGS_JOBS = True
+
+# Live scoreboards: the pages, of 'league', 'season' and 'division', whose standings are kept up to date from a
+# stream of the season's changes. Every open stream holds a server thread, so with the default sync worker only
+# list pages few people watch at once; to stream every page, serve with an evented worker, for example
+#     gunicorn -k gevent --worker-connections 1000 MovieLeague.wsgi
+# and list all three. 'thread' publishes standings changes from a background thread, 'local' only when polled. The
+# publisher checks watched seasons every LEAGUE_LIVE_POLL_INTERVAL seconds, and connections are held for up to
+# LEAGUE_LIVE_MAX_AGE seconds, after which the browser reconnects, with a keepalive every LEAGUE_LIVE_KEEPALIVE
+# seconds.
+LEAGUE_LIVE_PAGES = ()
+LEAGUE_LIVE_PUBLISHER = 'thread'
+LEAGUE_LIVE_POLL_INTERVAL = 2
+LEAGUE_LIVE_KEEPALIVE = 15
+LEAGUE_LIVE_MAX_AGE = 55
+
+# Aliases in DATABASES of read replicas of 'default'. While a GET or HEAD request to one of LEAGUE_REPLICA_VIEWS
+# is served, reads go to a replica, unless the request or, within LEAGUE_REPLICA_PIN_SECONDS, the same browser
+# wrote something or the season the page shows changed. For example, with a replica kept in step by the database's own replication:
+#     DATABASES['replica'] = dict(DATABASES['default'], HOST='replica.example.com')
+#     LEAGUE_READ_REPLICAS = ('replica',)
+DATABASE_ROUTERS = ['league.routing.ReplicaRouter']
+LEAGUE_READ_REPLICAS = ()
+LEAGUE_REPLICA_VIEWS = ('league.views', 'league.api')
+LEAGUE_REPLICA_PIN_SECONDS = 10
+
+# Seconds to keep database connections open between requests when served through MovieLeague.wsgi, 0 to close
+# them after every request
+LEAGUE_CONN_MAX_AGE = 60
+
 # A sample logging configuration. The only tangible logging
 # performed by this configuration is to send an email to
 # the site admins on every HTTP 500 error when DEBUG=False.
@@ -163,6 +233,9 @@ LOGGING = {
     'filters': {
         'require_debug_false': {
             '()': 'django.utils.log.RequireDebugFalse'
+        },
+        'require_debug_true': {
+            '()': 'django.utils.log.RequireDebugTrue'
         }
     },
     'handlers': {
@@ -170,6 +243,11 @@ LOGGING = {
             'level': 'ERROR',
             'filters': ['require_debug_false'],
             'class': 'django.utils.log.AdminEmailHandler'
+        },
+        'console': {
+            'level': 'INFO',
+            'filters': ['require_debug_true'],
+            'class': 'logging.StreamHandler'
         }
     },
     'loggers': {
@@ -178,5 +256,10 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': True,
         },
+        'league.instrumentation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     }
 }
@@ -19,8 +19,24 @@ urlpatterns = patterns('',
     url(r'', include('social_auth.urls')),
 
     (r'^$', 'league.views.home'),
+    url(r'^stats/$', 'league.views.stats', name="stats"),
+    url(r'^jobs/$', 'league.views.job_status', name="job_status"),
+    url(r'^api/leagues/$', 'league.api.leagues', name="api_leagues"),
+    url(r'^api/leagues/(?P<league_id>\d+)/$', 'league.api.league_detail', name="api_league"),
+    url(r'^api/leagues/(?P<league_id>\d+)/export/(?P<table_name>\w+)/$', 'league.api.league_export',
+        name="api_league_export"),
+    url(r'^api/seasons/(?P<season_id>\d+)/$', 'league.api.season_detail', name="api_season"),
+    url(r'^api/divisions/(?P<division_id>\d+)/$', 'league.api.division_detail', name="api_division"),
+    url(r'^api/divisions/(?P<division_id>\d+)/series/$', 'league.api.division_value_series',
+        name="api_division_series"),
+    url(r'^api/teams/(?P<team_id>\d+)/$', 'league.api.team_detail', name="api_team"),
+    url(r'^api/teams/(?P<team_id>\d+)/series/$', 'league.api.team_value_series', name="api_team_series"),
+    url(r'^api/movies/(?P<movie_id>\d+)/grosses/$', 'league.api.movie_grosses', name="api_movie_grosses"),
     url(r'^league/(?P<league_id>\d*)/seasons', 'league.views.seasons', name="seasons"),
+    url(r'^league/(?P<league_id>\d*)/alltime', 'league.views.alltime_leaderboard', name="alltime"),
     url(r'^division/(?P<division_id>\d*)', 'league.views.division', name="division"),
+    url(r'^season/(?P<season_id>\d+)/live/$', 'league.views.season_live', name="season_live"),
+    url(r'^season/(?P<season_id>\d+)/picks', 'league.views.season_picks', name="season_picks"),
     url(r'^season/(?P<season_id>\d*)', 'league.views.season', name="season"),
     url(r'^league/(?P<league_id>\d*)', 'league.views.league', name="league"),
     url(r'^team/(?P<team_id>\d*)', 'league.views.team', name="team"),
@@ -27,6 +27,10 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "MovieLeague.settings")
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
 
+# Reuse database connections across requests if settings.LEAGUE_CONN_MAX_AGE is set
+from league.routing import persistent_connections
+persistent_connections()
+
 # Apply WSGI middleware here.
 # from helloworld.wsgi import HelloWorldApplication
 # application = HelloWorldApplication(application)
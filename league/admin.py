@@ -1,11 +1,101 @@
-from league.models import League, Season, Division, Team, Movie, MovieGrossUpdate
-from django.contrib import admin
+import datetime
+import re
+
+from django import forms
+from django.conf.urls import patterns, url
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.core.exceptions import PermissionDenied
+from django.core.urlresolvers import reverse
+from django.http import HttpResponseRedirect
+from django.shortcuts import render
+
+from league import ingest, rollover
+from league.models import League, Season, Division, Team, Movie, MovieExternalId, MovieGrossUpdate
+from league.standings import MOVIE_ID_CHUNK_SIZE
+
+# A movie, then a tab, comma or semicolon, then its gross, which may have a dollar sign and thousands separators
+PASTED_LINE = re.compile(r'^(?P<movie>.*?)\s*[\t,;]\s*\$?(?P<gross>\d[\d,]*)\s*$')
+
+
+def _chunks(values):
+    values = sorted(values)
+    for start in range(0, len(values), MOVIE_ID_CHUNK_SIZE):
+        yield values[start:start + MOVIE_ID_CHUNK_SIZE]
+
+
+def resolve_movies(names, source):
+    """
+    Returns a dict of each name to the id of the movie it names, looking it up by exact name, then by external
+    identifier for the source, then by id, and a list of the names that match several movies by name. Runs a query
+    per lookup for every 500 names.
+    """
+    names = set(names)
+    movie_ids = {}
+    ambiguous = set()
+    for chunk in _chunks(names):
+        for movie_id, name in Movie.objects.filter(name__in=chunk).values_list('id', 'name'):
+            if name in movie_ids:
+                ambiguous.add(name)
+            movie_ids[name] = movie_id
+    for chunk in _chunks(names - set(movie_ids)):
+        external_ids = MovieExternalId.objects.filter(source=source, identifier__in=chunk)
+        movie_ids.update(external_ids.values_list('identifier', 'movie_id'))
+    numbers = dict((int(name), name) for name in names - set(movie_ids) if name.isdigit())
+    for chunk in _chunks(numbers):
+        movie_ids.update((numbers[movie_id], movie_id)
+                         for movie_id in Movie.objects.filter(id__in=chunk).values_list('id', flat=True))
+    return movie_ids, sorted(ambiguous)
+
+
+class PasteGrossesForm(forms.Form):
+    date = forms.DateField()
+    source = forms.CharField(max_length=255)
+    grosses = forms.CharField(widget=forms.Textarea(attrs={'rows': 20, 'cols': 80}),
+                              help_text="One movie per line: its name, external identifier for the source or id, "
+                                        "then a tab, comma or semicolon and its gross.")
+
+    def clean(self):
+        cleaned_data = super(PasteGrossesForm, self).clean()
+        if self.errors:
+            return cleaned_data
+        lines = []
+        errors = []
+        for number, line in enumerate(cleaned_data['grosses'].splitlines(), 1):
+            if not line.strip():
+                continue
+            match = PASTED_LINE.match(line.strip())
+            if match is None:
+                errors.append("Line %d has no movie and gross: %s" % (number, line))
+            else:
+                lines.append((number, match.group('movie'), int(match.group('gross').replace(',', ''))))
+        movie_ids, ambiguous = resolve_movies([movie for number, movie, gross in lines], cleaned_data['source'])
+        for number, movie, gross in lines:
+            if movie in ambiguous:
+                errors.append("Line %d names several movies, give its id instead: %s" % (number, movie))
+            elif movie not in movie_ids:
+                errors.append("Line %d names no movie: %s" % (number, movie))
+        if errors:
+            raise forms.ValidationError(errors)
+        if not lines:
+            raise forms.ValidationError("Paste at least one movie and gross")
+        self.updates = [MovieGrossUpdate(movie_id=movie_ids[movie], date=cleaned_data['date'], gross=gross,
+                                         source=cleaned_data['source']) for number, movie, gross in lines]
+        return cleaned_data
+
+
+class CopyDivisionsForm(forms.Form):
+    season = forms.ModelChoiceField(queryset=Season.objects.select_related('league').order_by('-start_date'),
+                                    help_text="The season to copy the divisions and their teams into.")
 
 
 class LeagueAdmin(admin.ModelAdmin):
     fieldsets = [
         (None, {'fields': ['name', 'commissioner', 'short_description', 'long_description']})
     ]
+    raw_id_fields = ['commissioner']
+    list_display = ['name', 'commissioner']
+    list_select_related = True
 
 
 class SeasonAdmin(admin.ModelAdmin):
@@ -13,6 +103,9 @@ class SeasonAdmin(admin.ModelAdmin):
         (None, {'fields': ['league', 'name', 'movies']}),
         ('Dates', {'fields': ['start_date', 'end_date']})
     ]
+    raw_id_fields = ['league', 'movies']
+    list_display = ['name', 'league', 'start_date', 'end_date']
+    list_select_related = True
 
 
 class DivisionAdmin(admin.ModelAdmin):
@@ -20,6 +113,27 @@ class DivisionAdmin(admin.ModelAdmin):
         (None,
          {'fields': ['season', 'name', 'sort_order', 'currency_unit', 'max_currency', 'num_promoted', 'num_relegated']})
     ]
+    list_display = ['name', 'season', 'sort_order', 'max_currency']
+    list_select_related = True
+    actions = ['copy_to_season']
+
+    def copy_to_season(self, request, queryset):
+        form = CopyDivisionsForm(request.POST if 'apply' in request.POST else None)
+        if form.is_valid():
+            season = form.cleaned_data['season']
+            try:
+                teams = rollover.copy_divisions(list(queryset), season)
+            except ValueError as error:
+                self.message_user(request, str(error), level=messages.ERROR)
+                return None
+            self.message_user(request, "Copied %d divisions and %d teams into %s" % (queryset.count(), teams, season))
+            return None
+        return render(request, 'admin/league/division/copy_to_season.html', {
+            'title': "Copy divisions to another season", 'form': form,
+            'divisions': queryset.select_related('season'),
+            'opts': self.model._meta, 'app_label': self.model._meta.app_label,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME})
+    copy_to_season.short_description = "Copy the selected divisions and their teams to another season"
 
 
 class MovieMembershipAdmin(admin.ModelAdmin):
@@ -30,6 +144,7 @@ class MovieMembershipAdmin(admin.ModelAdmin):
 
 class MovieMembershipInline(admin.TabularInline):
     model = Team.movies.through
+    raw_id_fields = ['movie']
 
 
 class TeamAdmin(admin.ModelAdmin):
@@ -37,17 +152,51 @@ class TeamAdmin(admin.ModelAdmin):
         (None, {'fields': ['division', 'owner', 'name']})
     ]
     inlines = [MovieMembershipInline]
+    raw_id_fields = ['division', 'owner']
+    list_display = ['get_name', 'owner', 'division']
+    list_select_related = True
+    search_fields = ['name', 'owner__username']
 
 
 class MovieAdmin(admin.ModelAdmin):
     fieldsets = [
         (None, {'fields': ['name', 'release_date']})
     ]
+    list_display = ['name', 'release_date']
+    # Prefix searches can use the index on name
+    search_fields = ['^name']
 
 class MovieGrossUpdateAdmin(admin.ModelAdmin):
     fieldsets = [
         (None, {'fields': ['movie', 'date', 'gross', 'source']})
     ]
+    raw_id_fields = ['movie']
+    list_display = ['movie', 'date', 'source', 'gross']
+    list_select_related = True
+    search_fields = ['^movie__name']
+
+    def get_urls(self):
+        return patterns('', url(r'^paste/$', self.admin_site.admin_view(self.paste_view),
+                                name='league_moviegrossupdate_paste')) + super(MovieGrossUpdateAdmin, self).get_urls()
+
+    def paste_view(self, request):
+        """
+        Adds a day's grosses for many movies at once from pasted lines, in one batched write.
+        """
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        if request.method == 'POST':
+            form = PasteGrossesForm(request.POST)
+            if form.is_valid():
+                stats = ingest.save_updates(form.updates)
+                self.message_user(request, "Added %d gross updates, skipped %d already stored" %
+                                  (stats.created, stats.duplicates))
+                return HttpResponseRedirect(reverse('admin:league_moviegrossupdate_changelist'))
+        else:
+            form = PasteGrossesForm(initial={'date': datetime.date.today()})
+        return render(request, 'admin/league/moviegrossupdate/paste.html', {
+            'title': "Paste grosses", 'form': form, 'opts': self.model._meta,
+            'app_label': self.model._meta.app_label})
 
 
 admin.site.register(League, LeagueAdmin)
@@ -55,4 +204,4 @@ admin.site.register(Season, SeasonAdmin)
 admin.site.register(Division, DivisionAdmin)
 admin.site.register(Team, TeamAdmin)
 admin.site.register(Movie, MovieAdmin)
-admin.site.register(MovieGrossUpdate, MovieGrossUpdateAdmin)
\ No newline at end of file
+admin.site.register(MovieGrossUpdate, MovieGrossUpdateAdmin)
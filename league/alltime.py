@@ -0,0 +1,101 @@
+"""
+All-time owner leaderboards.
+
+OwnerRecord keeps each owner's totals across a league's seasons. A season's results are added once, when it is
+closed after it ends, so the leaderboard is read straight from the table instead of re-ranking every past season.
+A title is a win of the season's top division; promotions and relegations count finishes in those places of
+divisions that have a division above or below them.
+"""
+
+import datetime
+
+from django.db import transaction
+
+from league.models import ClosedSeason, OwnerRecord, Season
+from league.snapshots import season_standings
+
+SORT_FIELDS = ('total_value', 'titles', 'promotions', 'relegations', 'efficiency', 'seasons')
+BATCH_SIZE = 500
+
+
+def season_results(season):
+    """
+    Returns a dict of owner id to the season's contribution to the owner's record.
+    """
+    ladder = sorted(season_standings(season), key=lambda item: (item[0].sort_order, item[0].id))
+    results = {}
+    for index, (division, rows) in enumerate(ladder):
+        for row in rows:
+            result = results.setdefault(row.team.owner_id, {'seasons': 0, 'total_value': 0, 'total_cost': 0,
+                                                             'titles': 0, 'promotions': 0, 'relegations': 0})
+            result['seasons'] += 1
+            result['total_value'] += row.value
+            result['total_cost'] += row.cost
+            result['titles'] += index == 0 and row.position == 0
+            result['promotions'] += index > 0 and row.is_promoted()
+            result['relegations'] += index < len(ladder) - 1 and row.is_relegated()
+    return results
+
+
+def _close_season(season):
+    if ClosedSeason.objects.filter(season=season).exists():
+        return False
+    results = season_results(season)
+    records = dict((record.owner_id, record) for record
+                   in OwnerRecord.objects.filter(league=season.league_id, owner__in=results.keys()))
+    updated = []
+    for owner_id, result in results.items():
+        record = records.get(owner_id) or OwnerRecord(league_id=season.league_id, owner_id=owner_id)
+        for field, value in result.items():
+            setattr(record, field, getattr(record, field) + value)
+        record.efficiency = record.total_value // record.total_cost if record.total_cost else 0
+        record.id = None
+        updated.append(record)
+    OwnerRecord.objects.filter(league=season.league_id, owner__in=records.keys()).delete()
+    OwnerRecord.objects.bulk_create(updated, batch_size=BATCH_SIZE)
+    ClosedSeason.objects.create(season=season)
+    return True
+
+
+@transaction.commit_on_success
+def close_season(season):
+    """
+    Adds the season's results to its league's owner records, unless it was already closed. Returns whether it was
+    added. Existing records are replaced in bulk rather than updated one by one.
+    """
+    return _close_season(season)
+
+
+def _unclosed_seasons(league):
+    seasons = Season.objects.filter(end_date__lt=datetime.date.today(), closedseason__isnull=True)
+    if league is not None:
+        seasons = seasons.filter(league=league)
+    return seasons.order_by('start_date')
+
+
+def close_ended_seasons(league=None):
+    """
+    Closes every ended season not closed yet, optionally only the league's, and returns the seasons closed. Each
+    season is closed in its own transaction.
+    """
+    return [season for season in _unclosed_seasons(league) if close_season(season)]
+
+
+@transaction.commit_on_success
+def rebuild_league(league):
+    """
+    Recomputes the league's records from scratch, for corrections to seasons that were already closed, in one
+    transaction so a failure leaves the old records in place.
+    """
+    OwnerRecord.objects.filter(league=league).delete()
+    ClosedSeason.objects.filter(season__league=league).delete()
+    return [season for season in _unclosed_seasons(league) if _close_season(season)]
+
+
+def leaderboard(league, sort='total_value'):
+    """
+    Returns the league's owner records ordered by the sort field, highest first.
+    """
+    if sort not in SORT_FIELDS:
+        raise ValueError("Cannot sort by %s" % sort)
+    return OwnerRecord.objects.filter(league=league).select_related('owner').order_by('-' + sort, '-total_value', 'id')
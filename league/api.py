@@ -0,0 +1,207 @@
+"""
+Read-only JSON API.
+
+Every endpoint builds its response from a fixed number of querysets, using select_related and prefetch_related for
+related objects and the batched standings functions for values, so the query count doesn't grow with the number of
+teams, movies or gross updates returned. Lists are paginated with the page and per_page parameters, and the fields
+parameter, a comma separated list of keys, trims each returned object down to those keys. League, season, division
+and team responses are cached and answer conditional GETs like the pages showing the same data. League exports are
+streamed rather than built in memory.
+"""
+
+from functools import wraps
+import json
+
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from league import export
+from league.caching import division_seasons, league_page, league_seasons, season_seasons, team_seasons
+from league.models import Division, League, Movie, MovieGrossUpdate, Season, Team
+from league.series import division_series, team_series
+from league.snapshots import current_standings, snapshot_date
+from league.standings import gross_values_on_date
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class BadRequest(Exception):
+    pass
+
+
+def json_response(data, status=200):
+    return HttpResponse(json.dumps(data, cls=DjangoJSONEncoder), status=status, content_type='application/json')
+
+
+def api_view(view):
+    """
+    Restricts a view to GET and turns BadRequest into a 400 response.
+    """
+    @require_GET
+    @wraps(view)
+    def wrapper(request, **kwargs):
+        try:
+            return view(request, **kwargs)
+        except BadRequest as error:
+            return json_response({'error': str(error)}, status=400)
+    return wrapper
+
+
+def select_fields(request, data):
+    """
+    Returns the object restricted to the keys listed in the request's fields parameter, if it has one.
+    """
+    fields = request.GET.get('fields')
+    if not fields:
+        return data
+    fields = fields.split(',')
+    return dict((key, value) for key, value in data.items() if key in fields)
+
+
+def paginate(request, items):
+    """
+    Returns the requested page of items, a list or queryset, and a description of the pagination.
+    """
+    try:
+        per_page = int(request.GET.get('per_page', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise BadRequest("per_page must be an integer")
+    if not 1 <= per_page <= MAX_PAGE_SIZE:
+        raise BadRequest("per_page must be between 1 and %d" % MAX_PAGE_SIZE)
+    paginator = Paginator(items, per_page)
+    try:
+        page = paginator.page(request.GET.get('page', 1))
+    except (EmptyPage, PageNotAnInteger) as error:
+        raise BadRequest(str(error))
+    return list(page.object_list), {'page': page.number, 'per_page': per_page, 'count': paginator.count,
+                                    'num_pages': paginator.num_pages}
+
+
+def league_data(league):
+    return {'id': league.id, 'name': league.name, 'short_description': league.short_description,
+            'long_description': league.long_description, 'commissioner': league.commissioner.username}
+
+
+def season_data(season):
+    return {'id': season.id, 'league': season.league_id, 'name': season.name, 'start_date': season.start_date,
+            'end_date': season.end_date}
+
+
+def division_data(division):
+    return {'id': division.id, 'season': division.season_id, 'name': division.name,
+            'sort_order': division.sort_order, 'currency_unit': division.currency_unit,
+            'max_currency': division.max_currency, 'num_promoted': division.num_promoted,
+            'num_relegated': division.num_relegated}
+
+
+def standing_data(row):
+    return {'team': row.team.id, 'name': row.get_name(), 'owner': row.team.owner.username, 'position': row.position,
+            'cost': row.cost, 'value': row.value, 'promoted': row.is_promoted(), 'relegated': row.is_relegated()}
+
+
+def movie_data(movie):
+    return {'id': movie.id, 'name': movie.name, 'release_date': movie.release_date}
+
+
+@api_view
+def leagues(request):
+    page, pagination = paginate(request, League.objects.select_related('commissioner').order_by('id'))
+    return json_response({'leagues': [select_fields(request, league_data(league)) for league in page],
+                          'pagination': pagination})
+
+
+@api_view
+@league_page(league_seasons)
+def league_detail(request, league_id):
+    requested_league = get_object_or_404(League.objects.select_related('commissioner')
+                                         .prefetch_related('season_set'), id=league_id)
+    data = league_data(requested_league)
+    data['seasons'] = [season_data(season) for season
+                       in sorted(requested_league.season_set.all(), key=lambda season: season.start_date)]
+    return json_response(select_fields(request, data))
+
+
+@api_view
+@league_page(season_seasons)
+def season_detail(request, season_id):
+    requested_season = get_object_or_404(Season.objects.prefetch_related('division_set'), id=season_id)
+    data = season_data(requested_season)
+    data['divisions'] = [division_data(division) for division in requested_season.division_set.all()]
+    return json_response(select_fields(request, data))
+
+
+@api_view
+@league_page(division_seasons)
+def division_detail(request, division_id):
+    requested_division = get_object_or_404(Division.objects.select_related('season'), id=division_id)
+    rows, pagination = paginate(request, current_standings(requested_division))
+    data = division_data(requested_division)
+    data['date'] = snapshot_date(requested_division.season)
+    data['standings'] = [standing_data(row) for row in rows]
+    return json_response(dict(select_fields(request, data), pagination=pagination))
+
+
+@api_view
+@league_page(team_seasons)
+def team_detail(request, team_id):
+    requested_team = get_object_or_404(Team.objects.select_related('owner', 'division__season'), id=team_id)
+    day = snapshot_date(requested_team.division.season)
+    memberships = list(requested_team.moviemembership_set.select_related('movie'))
+    values = gross_values_on_date([membership.movie_id for membership in memberships], day)
+    data = {'id': requested_team.id, 'name': requested_team.get_name(), 'owner': requested_team.owner.username,
+            'division': requested_team.division_id, 'date': day}
+    for row in current_standings(requested_team.division):
+        if row.team.id == requested_team.id:
+            data.update(position=row.position, cost=row.cost, value=row.value)
+    data['memberships'] = [dict(movie_data(membership.movie), price=membership.price,
+                                value=values.get(membership.movie_id, 0)) for membership in memberships]
+    return json_response(select_fields(request, data))
+
+
+@api_view
+@league_page(division_seasons)
+def division_value_series(request, division_id):
+    requested_division = get_object_or_404(Division.objects.select_related('season'), id=division_id)
+    days, rows = division_series(requested_division)
+    data = {'division': requested_division.id, 'dates': days,
+            'teams': [{'team': team.id, 'name': team.get_name(), 'values': values} for team, values in rows]}
+    return json_response(select_fields(request, data))
+
+
+@api_view
+@league_page(team_seasons)
+def team_value_series(request, team_id):
+    requested_team = get_object_or_404(Team.objects.select_related('owner', 'division__season'), id=team_id)
+    days, values = team_series(requested_team)
+    return json_response(select_fields(request, {'team': requested_team.id, 'name': requested_team.get_name(),
+                                                 'dates': days, 'values': values}))
+
+
+@api_view
+def movie_grosses(request, movie_id):
+    movie = get_object_or_404(Movie, id=movie_id)
+    updates = MovieGrossUpdate.objects.filter(movie=movie).order_by('date', 'source')
+    if request.GET.get('source'):
+        updates = updates.filter(source=request.GET['source'])
+    page, pagination = paginate(request, updates.values('date', 'source', 'gross'))
+    data = movie_data(movie)
+    data['grosses'] = page
+    return json_response(dict(select_fields(request, data), pagination=pagination))
+
+
+@api_view
+def league_export(request, league_id, table_name):
+    requested_league = get_object_or_404(League, id=league_id)
+    export_format = request.GET.get('format', 'csv')
+    try:
+        chunks = export.export(requested_league, table_name, export_format)
+    except ValueError as error:
+        raise BadRequest(str(error))
+    response = StreamingHttpResponse(chunks, content_type=export.CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = 'attachment; filename="league-%d-%s.%s"' % (
+        requested_league.id, table_name, export.EXTENSIONS[export_format])
+    return response
@@ -0,0 +1,216 @@
+"""
+Benchmark runner for the standings hot paths.
+
+Times point-in-time gross lookups, Division.sorted_teams, the season movie board and full renders of every league
+page through the test client against whatever data is in the database, usually a league from the generate_league
+command. The standings templates are also rendered on their own from display rows built beforehand, with the plain
+and the cached template loaders, which times the templates alone and shows they run no queries. The division list is
+rendered for growing numbers of teams both from display rows and, as a baseline, from Team objects whose methods the
+template calls for every row, so the results show how each path scales with the roster. Each result records
+wall time, query count, how far the benchmark raised the process's peak resident memory and that peak itself, and
+results are written as JSON so two runs can be compared.
+"""
+
+import datetime
+import json
+import resource
+import time
+
+from django.core.urlresolvers import reverse
+from django.template import Context, Template
+from django.template.loader import render_to_string
+from django.test.client import Client
+from django.test.utils import override_settings
+
+from league import display
+from league.caching import season_version
+from league.instrumentation import CapturedQueries
+from league.models import Division, Movie, MovieGrossUpdate, MovieMembership, Team
+from league.standings import gross_values_on_date, season_movie_board
+
+TEMPLATE_LOADERS = ('django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader')
+CACHED_TEMPLATE_LOADERS = (('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),)
+
+# The division standings list as it was rendered before display rows, calling model methods for every team and movie
+OBJECT_DIVISION_STANDINGS = """{% load humanize %}<ol>{% for team in teams %}
+<li data-team="{{ team.id }}"><h3{% if team.is_promoted %} class="promoted"{% elif team.is_relegated %}
+class="relegated"{% endif %}><a href="{% url "team" team.id %}">{{ team.get_name }}</a>
+<small>{{ division.currency_unit|safe }} {{ team.get_team_cost|intcomma }} for </small>
+${{ team.get_team_value|intcomma }}</h3><ul>{% for membership in team.moviemembership_set.all %}
+<li>{{ membership.movie.name }} ({{ membership.movie.release_date|date }}) {{ division.currency_unit|safe }}
+{{ membership.price|intcomma }} for ${{ membership.value_on_team|intcomma }}
+{% if membership.price > 0 %}Efficiency: ${{ membership.efficiency|intcomma }}{% else %}Free pick{% endif %}</li>
+{% endfor %}</ul></li>{% endfor %}</ol>"""
+
+
+def _peak_memory_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(function, repeat=3):
+    """
+    Runs the function repeat times and returns its timings, the queries of its first run and the peak memory. The
+    process's peak only ever grows, so peak_memory_growth_kb is what these runs added to it, which is zero when they
+    stayed under a peak set earlier, and process_peak_memory_kb is the peak of the whole run so far.
+    """
+    timings = []
+    queries = None
+    peak_before = _peak_memory_kb()
+    for _ in range(repeat):
+        with CapturedQueries() as captured:
+            started = time.time()
+            function()
+            timings.append(time.time() - started)
+        if queries is None:
+            queries = len(captured.queries)
+    return {
+        'seconds_best': min(timings),
+        'seconds_mean': sum(timings) / len(timings),
+        'queries': queries,
+        'peak_memory_growth_kb': _peak_memory_kb() - peak_before,
+        'process_peak_memory_kb': _peak_memory_kb(),
+    }
+
+
+def _page(client, url):
+    def render():
+        response = client.get(url)
+        if response.status_code != 200:
+            raise AssertionError("%s returned %d" % (url, response.status_code))
+    return render
+
+
+def _template(name, context):
+    def render():
+        render_to_string(name, context)
+    return render
+
+
+def _object_template(division, teams):
+    template = Template(OBJECT_DIVISION_STANDINGS)
+
+    def render():
+        template.render(Context({'division': division, 'teams': teams}))
+    return render
+
+
+def roster_sizes(count):
+    """
+    Returns the numbers of teams the division list is rendered for: one, half the division and all of it.
+    """
+    return sorted(set([1, max(1, count // 2), count]))
+
+
+def _template_benchmarks(season, division):
+    """
+    Returns (name, template loaders, function) triples rendering the season and division standings templates from
+    rows built once up front, with either template loader, and the division list for every roster size from rows
+    and from Team objects.
+    """
+    common = {'season': season, 'season_version': season_version(season.id), 'cache_ttl': 0}
+    rows = display.division_rows(division)
+    pages = [('season_standings', 'season_standings.html', dict(common, season_standings=display.season_rows(season))),
+             ('division_standings', 'division_standings.html', dict(common, division=division, standings=rows))]
+    benchmarks = []
+    for name, template, context in pages:
+        benchmarks.append(('template.' + name, TEMPLATE_LOADERS, _template(template, context)))
+        benchmarks.append(('template.%s.cached' % name, CACHED_TEMPLATE_LOADERS, _template(template, context)))
+    teams = list(Team.objects.filter(division=division).select_related('owner', 'division__season'))
+    for size in roster_sizes(len(teams)):
+        context = dict(common, division=division, standings=rows[:size])
+        benchmarks.append(('template.division_rows.teams_%d' % size, CACHED_TEMPLATE_LOADERS,
+                           _template('division_standings.html', context)))
+        benchmarks.append(('template.division_objects.teams_%d' % size, CACHED_TEMPLATE_LOADERS,
+                           _object_template(division, teams[:size])))
+    return benchmarks
+
+
+def template_scaling(results, sizes):
+    """
+    Returns the growth in best seconds and queries per team added between the smallest and largest roster, for the
+    division list rendered from rows and from Team objects.
+    """
+    scaling = {}
+    if len(sizes) < 2:
+        return scaling
+    smallest, largest = sizes[0], sizes[-1]
+    for path in ('rows', 'objects'):
+        first = results['template.division_%s.teams_%d' % (path, smallest)]
+        last = results['template.division_%s.teams_%d' % (path, largest)]
+        scaling[path] = {
+            'seconds_per_team': (last['seconds_best'] - first['seconds_best']) / (largest - smallest),
+            'queries_per_team': float(last['queries'] - first['queries']) / (largest - smallest),
+        }
+    return scaling
+
+
+def run_benchmarks(league, repeat=3):
+    """
+    Benchmarks the league's most recent season and returns the results as a JSON-serializable dict.
+    """
+    season = league.season_set.latest()
+    division = Division.objects.filter(season=season)[0]
+    team = Team.objects.filter(division=division)[0]
+    movie_ids = list(MovieMembership.objects.filter(team__division__season=season).values_list('movie_id', flat=True))
+    movie = Movie.objects.get(id=movie_ids[0])
+    source = MovieGrossUpdate.objects.filter(movie=movie).values_list('source', flat=True)[0]
+    mid_season = season.start_date + (season.end_date - season.start_date) / 2
+    client = Client()
+    benchmarks = [
+        ('gross_values_on_date', lambda: gross_values_on_date(movie_ids, mid_season)),
+        ('Movie.get_value_on_date', lambda: movie.get_value_on_date(mid_season, source=source)),
+        ('Division.sorted_teams', lambda: division.sorted_teams()),
+        ('season_movie_board', lambda: season_movie_board(season)),
+        ('view.home', _page(client, reverse('league.views.home'))),
+        ('view.league', _page(client, reverse('league', args=[league.id]))),
+        ('view.seasons', _page(client, reverse('seasons', args=[league.id]))),
+        ('view.season', _page(client, reverse('season', args=[season.id]))),
+        ('view.division', _page(client, reverse('division', args=[division.id]))),
+        ('view.team', _page(client, reverse('team', args=[team.id]))),
+    ]
+    results = {}
+    # Pages are timed uncached, since after the first run the page cache would answer without any work
+    with override_settings(ALLOWED_HOSTS=['*'], LEAGUE_CACHE_TTL=0):
+        for name, function in benchmarks:
+            results[name] = measure(function, repeat=repeat)
+        # Changing the loaders empties the cached loader, so each template benchmark keeps one setting for all its runs
+        for name, loaders, function in _template_benchmarks(season, division):
+            with override_settings(TEMPLATE_LOADERS=loaders):
+                results[name] = measure(function, repeat=repeat)
+    return {
+        'run_at': datetime.datetime.now().isoformat(),
+        'league': league.id,
+        'template_scaling': template_scaling(results, roster_sizes(Team.objects.filter(division=division).count())),
+        'scale': {
+            'divisions': Division.objects.filter(season=season).count(),
+            'teams': Team.objects.filter(division__season=season).count(),
+            'memberships': MovieMembership.objects.filter(team__division__season=season).count(),
+            'movies': Movie.objects.count(),
+            'gross_updates': MovieGrossUpdate.objects.count(),
+        },
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare(previous, current):
+    """
+    Returns (name, previous best seconds, current best seconds, previous queries, current queries) for every
+    benchmark present in both runs.
+    """
+    rows = []
+    for name in sorted(current['results']):
+        if name in previous['results']:
+            before, after = previous['results'][name], current['results'][name]
+            rows.append((name, before['seconds_best'], after['seconds_best'], before['queries'], after['queries']))
+    return rows
+
+
+def write_results(results, path):
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True)
+
+
+def read_results(path):
+    with open(path) as results_file:
+        return json.load(results_file)
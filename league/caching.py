@@ -0,0 +1,288 @@
+"""
+Page and fragment caching keyed on per-season data versions.
+
+Every season has a SeasonVersion row in the database, replaced by model signals whenever a gross update,
+membership, team, division, the season or its league changes, and by bulk writes that bypass signals, in whichever
+process made the change. Cached pages and template fragments include the tokens of the seasons they show in their
+keys, so a change makes them unreachable instead of having to find and delete them. Anonymous page views are served
+whole from the cache after a single query reading the tokens; everyone else gets the cached fragments.
+
+The tokens also give anonymous pages an ETag, and the times they were replaced a Last-Modified time, so polling
+clients and proxies get 304 Not Modified until something they show changes. A season without a row yet has the
+token 'none' until its first change.
+"""
+
+from functools import wraps
+import datetime
+import hashlib
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from league import routing
+
+# The versions of the seasons shown by the page being rendered, read once by league_page
+_page = threading.local()
+
+
+# Backends that keep entries in each process, so pages cached by one process are never served by another
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+
+
+def shared_cache():
+    """
+    Returns whether the default cache is shared between processes, from settings.LEAGUE_SHARED_CACHE if it is set
+    and otherwise from the cache backend.
+    """
+    shared = getattr(settings, 'LEAGUE_SHARED_CACHE', None)
+    if shared is None:
+        shared = settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+    return shared
+
+
+def cache_ttl():
+    """
+    Returns how long rendered pages and fragments are kept, in seconds. Zero disables caching.
+    """
+    return getattr(settings, 'LEAGUE_CACHE_TTL', 300)
+
+
+def _version_string(versions):
+    tokens = [token or 'none' for season_id, token, modified in versions]
+    return '-'.join([datetime.date.today().isoformat()] + tokens)
+
+
+def _versions(seasons):
+    """
+    Returns (season id, token, modified) for each of the seasons in a Season queryset, read from the primary so a
+    change is seen as soon as it is committed.
+    """
+    return list(seasons.using(routing.PRIMARY).values_list('id', 'version__token', 'version__modified'))
+
+
+def season_version_map(season_ids):
+    """
+    Returns a dict of each of the given season ids to a string identifying the season's current data, read in one
+    query. It also changes daily, since which movies are released and which snapshot is current depend on the date.
+    """
+    from league.models import Season
+    season_ids = list(season_ids)
+    versions = dict((version[0], version) for version in _versions(Season.objects.filter(id__in=season_ids)))
+    return dict((season_id, _version_string([versions.get(season_id, (season_id, None, None))]))
+                for season_id in season_ids)
+
+
+def season_version(season_id):
+    return season_version_map([season_id])[season_id]
+
+
+def page_version():
+    """
+    Returns the version string of the seasons shown by the page league_page is rendering, without querying.
+    """
+    return _version_string(_page.versions)
+
+
+def bump_seasons(season_ids):
+    """
+    Replaces the version tokens of the given seasons, creating the rows of seasons that don't have one yet.
+    """
+    from league.models import Season, SeasonVersion
+    season_ids = set(season_ids)
+    if not season_ids:
+        return
+    token, now = uuid.uuid4().hex, timezone.now()
+    if SeasonVersion.objects.filter(season__in=season_ids).update(token=token, modified=now) == len(season_ids):
+        return
+    for season_id in Season.objects.filter(id__in=season_ids, version__isnull=True).values_list('id', flat=True):
+        version, created = SeasonVersion.objects.get_or_create(season_id=season_id,
+                                                               defaults={'token': token, 'modified': now})
+        if not created:
+            SeasonVersion.objects.filter(season=season_id).update(token=token, modified=now)
+
+
+def invalidate_all():
+    """
+    Invalidates every cached page and fragment, for bulk writes that bypass model signals.
+    """
+    from league.models import Season
+    bump_seasons(Season.objects.values_list('id', flat=True))
+
+
+def _last_modified(versions):
+    """
+    Returns the newest of the times the seasons' tokens were replaced and the start of today.
+    """
+    today = timezone.make_aware(datetime.datetime.combine(datetime.date.today(), datetime.time()),
+                                timezone.get_default_timezone())
+    return max([today] + [modified for season_id, token, modified in versions if modified is not None])
+
+
+def league_seasons(league_id):
+    from league.models import Season
+    return Season.objects.filter(league=league_id)
+
+
+def latest_league_season(league_id):
+    return league_seasons(league_id).order_by('-start_date')[:1]
+
+
+def season_seasons(season_id):
+    from league.models import Season
+    return Season.objects.filter(id=season_id)
+
+
+def division_seasons(division_id):
+    from league.models import Season
+    return Season.objects.filter(division=division_id)
+
+
+def team_seasons(team_id):
+    from league.models import Season
+    return Season.objects.filter(division__team=team_id)
+
+
+def deferred(function, *args):
+    """
+    Returns a callable that computes function(*args) the first time a template resolves it and reuses the result
+    after that, so work behind a cached fragment only happens when the fragment is rendered.
+    """
+    result = []
+
+    def evaluate():
+        if not result:
+            result.append(function(*args))
+        return result[0]
+    return evaluate
+
+
+def _cached(view):
+    @wraps(view)
+    def cached_view(request, **kwargs):
+        if request.method != 'GET' or not cache_ttl() or request.user.is_authenticated():
+            return view(request, **kwargs)
+        page = u'%s|%s' % (request.get_full_path(), page_version())
+        key = 'league:page:%s' % hashlib.md5(page.encode('utf-8')).hexdigest()
+        response = cache.get(key)
+        if response is None:
+            response = view(request, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response, cache_ttl())
+        return response
+    return cached_view
+
+
+def _etag(request, **kwargs):
+    if request.user.is_authenticated():
+        return None
+    return hashlib.md5(page_version()).hexdigest()
+
+
+def _page_last_modified(request, **kwargs):
+    if request.user.is_authenticated():
+        return None
+    return _last_modified(_page.versions)
+
+
+def _recently_changed(versions):
+    since = timezone.now() - datetime.timedelta(seconds=routing.pin_seconds())
+    return any(modified is not None and modified > since for season_id, token, modified in versions)
+
+
+def league_page(seasons):
+    """
+    Reads the versions of the seasons a view's page shows, once, then answers conditional GETs with 304 Not Modified
+    and serves anonymous GETs from the cache until one of them changes. seasons is called with the view's keyword
+    arguments and returns a Season queryset. If it finds no seasons the view runs uncached. Only anonymous requests
+    get validators and cached pages, since signed in users see their name on every page; the view can use
+    page_version() for its fragment keys either way. Pages showing a season changed too recently for the replicas
+    to have caught up are read from the primary, since they are cached under the new version.
+    """
+    def decorator(view):
+        page_view = condition(etag_func=_etag, last_modified_func=_page_last_modified)(_cached(view))
+
+        @wraps(view)
+        def versioned_view(request, **kwargs):
+            versions = _versions(seasons(**kwargs))
+            if not versions:
+                return view(request, **kwargs)
+            if _recently_changed(versions):
+                routing.read_primary()
+            _page.versions = versions
+            try:
+                return page_view(request, **kwargs)
+            finally:
+                del _page.versions
+        return versioned_view
+    return decorator
+
+
+def warm_season(season, client=None):
+    """
+    Requests every page of the season anonymously so the pages and their fragments are cached, and returns a list
+    of (url, status code).
+    """
+    from django.core.urlresolvers import reverse
+    from django.test.client import Client
+    from django.test.utils import override_settings
+    from league.models import Division, Team
+    client = client or Client()
+    urls = [reverse('league', args=[season.league_id]), reverse('seasons', args=[season.league_id]),
+            reverse('season', args=[season.id])]
+    urls += [reverse('division', args=[division_id])
+             for division_id in Division.objects.filter(season=season).values_list('id', flat=True)]
+    urls += [reverse('team', args=[team_id])
+             for team_id in Team.objects.filter(division__season=season).values_list('id', flat=True)]
+    with override_settings(ALLOWED_HOSTS=['*']):
+        return [(url, client.get(url).status_code) for url in urls]
+
+
+def movie_season_ids(movie_ids):
+    """
+    Returns the ids of the seasons that list any of the movies or have them on a team.
+    """
+    from django.db.models import Q
+    from league.models import Season
+    seasons = Season.objects.filter(Q(movies__in=movie_ids) | Q(division__team__movies__in=movie_ids))
+    return seasons.values_list('id', flat=True).distinct()
+
+
+def gross_update_changed(sender, instance, **kwargs):
+    bump_seasons(movie_season_ids([instance.movie_id]))
+
+
+def membership_changed(sender, instance, **kwargs):
+    from league.models import Team
+    bump_seasons(Team.objects.filter(id=instance.team_id).values_list('division__season', flat=True))
+
+
+def team_changed(sender, instance, **kwargs):
+    from league.models import Division
+    bump_seasons(Division.objects.filter(id=instance.division_id).values_list('season', flat=True))
+
+
+def division_changed(sender, instance, **kwargs):
+    bump_seasons([instance.season_id])
+
+
+def season_changed(sender, instance, **kwargs):
+    bump_seasons([instance.id])
+
+
+def league_changed(sender, instance, **kwargs):
+    bump_seasons(instance.season_set.values_list('id', flat=True))
+
+
+def season_movies_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        bump_seasons([instance.id])
+    elif pk_set is not None:
+        bump_seasons(pk_set)
+    else:
+        bump_seasons(instance.season_set.values_list('id', flat=True))
@@ -0,0 +1,98 @@
+"""
+Display rows for the standings templates.
+
+Templates used to call model methods and filters for every team they listed: each row resolved the team's name,
+cost, value and promotion or relegation through several method lookups, and the league page looked up the latest
+season three times. The builders here resolve every value a page shows once, in the view, into plain dicts holding
+strings and numbers already formatted for display, so rendering a row is only dictionary lookups. Builders are
+wrapped in caching.deferred by the views, so the work still only happens when a fragment isn't cached.
+"""
+
+from django.contrib.humanize.templatetags.humanize import intcomma
+from django.template.defaultfilters import floatformat
+
+from league.snapshots import division_standings, league_leaders, season_standings, snapshot_date, team_standing
+from league.standings import gross_values_on_date
+
+
+def _css(row):
+    if row.is_promoted():
+        return 'promoted'
+    elif row.is_relegated():
+        return 'relegated'
+    return ''
+
+
+def team_row(row):
+    """
+    Returns a StandingsRow as a dict of what the standings lists show.
+    """
+    return {'id': row.team.id, 'name': row.get_name(), 'position': row.position, 'division_size': row.division_size,
+            'css': _css(row), 'cost': intcomma(row.cost), 'value': intcomma(row.value)}
+
+
+def membership_row(membership):
+    """
+    Returns a MembershipRow as a dict, with the efficiency rounded to cents, or empty for a free pick.
+    """
+    return {'name': membership.movie.name, 'release_date': membership.movie.release_date,
+            'price': intcomma(membership.price), 'value': intcomma(membership.value_on_team),
+            'efficiency': intcomma(floatformat(membership.efficiency(), 2)) if membership.price > 0 else ''}
+
+
+def _division(division):
+    return {'id': division.id, 'name': division.name, 'currency_unit': division.currency_unit}
+
+
+def season_rows(season):
+    """
+    Returns the season's divisions as dicts, each with its ranked team rows under 'teams'.
+    """
+    divisions = []
+    for division, rows in season_standings(season):
+        divisions.append(dict(_division(division), teams=[team_row(row) for row in rows]))
+    return divisions
+
+
+def division_rows(division):
+    """
+    Returns the division's ranked team rows, each with its movies under 'movies'.
+    """
+    rows = []
+    for row in division_standings(division):
+        rows.append(dict(team_row(row), movies=[membership_row(membership) for membership in row.memberships]))
+    return rows
+
+
+def standing_row(team):
+    """
+    Returns the team's current row in its division's standings, or None if it has none.
+    """
+    row = team_standing(team)
+    return team_row(row) if row else None
+
+
+def roster_rows(team):
+    """
+    Returns the team's movies as dicts valued on the day of its current standings, as the API values them, so they
+    add up to the team's value. Runs two queries.
+    """
+    memberships = list(team.moviemembership_set.select_related('movie'))
+    values = gross_values_on_date([membership.movie_id for membership in memberships],
+                                  snapshot_date(team.division.season))
+    return [{'name': membership.movie.name, 'release_date': membership.movie.release_date, 'price': membership.price,
+             'value': values.get(membership.movie_id, 0)} for membership in memberships]
+
+
+def leader_rows(league):
+    """
+    Returns the league's seasons as dicts, each with its divisions under 'divisions' and every division's leading
+    team row, or None, under 'leader'.
+    """
+    seasons = []
+    for season, leaders in league_leaders(league):
+        seasons.append({'id': season.id, 'name': season.name, 'start_date': season.start_date,
+                        'end_date': season.end_date, 'ended': season.has_ended(),
+                        'divisions': [dict(_division(division), leader=team_row(leader) if leader else None)
+                                      for division, leader in leaders]})
+    return seasons
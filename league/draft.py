@@ -0,0 +1,188 @@
+"""
+Draft optimizer and what-if simulator.
+
+A DraftBoard loads a season once: its divisions and rosters, the price of every movie in every division and each
+movie's gross on every day of the season, laid out as lists indexed by movie. Everything after that runs in memory,
+so owners can ask for the best roster a division's budget could have bought, or re-rank a division with a movie
+swapped, without another query.
+
+A movie costs what was paid for it in the division, the lowest price if several teams hold it. Movies nobody in the
+division drafted cost the median price paid for them across the season, and movies never drafted can't be bought.
+The best roster is a 0/1 knapsack over those prices with the division's max_currency as capacity, solved with a
+dynamic program over every budget up to it; ties go to the cheaper roster.
+"""
+
+from league.models import MovieMembership
+from league.series import season_days, value_series
+from league.standings import MembershipRow, StandingsRow, load_rosters, rank
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Movies times budget above which the NumPy path is used, when NumPy is available
+NUMPY_THRESHOLD = 200000
+
+
+def _gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
+
+def _median(values):
+    values = sorted(values)
+    return values[(len(values) - 1) // 2]
+
+
+def _knapsack_rows(items, budget):
+    best = [0] * (budget + 1)
+    taken = []
+    for price, value in items:
+        row = bytearray(budget + 1)
+        for capacity in range(budget, price - 1, -1):
+            candidate = best[capacity - price] + value
+            if candidate > best[capacity]:
+                best[capacity] = candidate
+                row[capacity] = 1
+        taken.append(row)
+    return best, taken
+
+
+def _knapsack_rows_vectorized(items, budget):
+    best = numpy.zeros(budget + 1, dtype=numpy.int64)
+    taken = []
+    for price, value in items:
+        row = numpy.zeros(budget + 1, dtype=bool)
+        candidates = best[:budget + 1 - price] + value
+        row[price:] = candidates > best[price:]
+        best[price:] = numpy.where(row[price:], candidates, best[price:])
+        taken.append(row)
+    return best.tolist(), taken
+
+
+def knapsack(items, budget, use_numpy=None):
+    """
+    Returns (value, cost, indexes) of the most valuable selection of (price, value) items costing at most the budget,
+    choosing the cheapest of equally valuable selections. use_numpy forces the NumPy path on or off; by default it is
+    used for large inputs when available.
+    """
+    items = list(items)
+    free = [index for index, (price, value) in enumerate(items) if price <= 0 < value]
+    candidates = [index for index, (price, value) in enumerate(items) if 0 < price <= budget and value > 0]
+    # Prices are often round numbers, so scale them down by their common divisor to shrink the table
+    unit = reduce(_gcd, [items[index][0] for index in candidates], 0) or 1
+    capacity = max(budget, 0) // unit
+    scaled = [(items[index][0] // unit, items[index][1]) for index in candidates]
+    if use_numpy is None:
+        use_numpy = numpy is not None and len(scaled) * capacity >= NUMPY_THRESHOLD
+    best, taken = (_knapsack_rows_vectorized if use_numpy else _knapsack_rows)(scaled, capacity)
+    # best[c] is the best value costing at most c, so the smallest c reaching the overall best is the cheapest
+    remaining = best.index(best[capacity])
+    chosen = list(free)
+    for position in range(len(candidates) - 1, -1, -1):
+        if taken[position][remaining]:
+            chosen.append(candidates[position])
+            remaining -= scaled[position][0]
+    chosen.sort()
+    return sum(items[index][1] for index in chosen), sum(items[index][0] for index in chosen), chosen
+
+
+class DraftBoard(object):
+    """
+    A season's divisions, rosters, prices and daily movie grosses, loaded in a fixed number of queries.
+    """
+
+    def __init__(self, season, use_numpy=None):
+        self.season = season
+        self.use_numpy = use_numpy
+        self.days = season_days(season)
+        self.divisions = list(season.division_set.order_by('sort_order', 'id'))
+        self.teams, self.memberships_by_team = load_rosters(self.divisions)
+        self.movies = dict((movie.id, movie) for movie in season.movies.all())
+        paid_by_division = dict((division.id, {}) for division in self.divisions)
+        paid = {}
+        for team in self.teams:
+            for membership in self.memberships_by_team[team.id]:
+                self.movies.setdefault(membership.movie_id, membership.movie)
+                paid.setdefault(membership.movie_id, []).append(membership.price)
+                division_paid = paid_by_division[team.division_id]
+                division_paid[membership.movie_id] = min(membership.price,
+                                                         division_paid.get(membership.movie_id, membership.price))
+        self.movie_ids = sorted(self.movies)
+        self.movie_index = dict((movie_id, index) for index, movie_id in enumerate(self.movie_ids))
+        season_prices = dict((movie_id, _median(prices)) for movie_id, prices in paid.items())
+        self.prices = {}
+        for division in self.divisions:
+            prices = dict(season_prices)
+            prices.update(paid_by_division[division.id])
+            self.prices[division.id] = [prices.get(movie_id) for movie_id in self.movie_ids]
+        series = value_series(dict((movie_id, [movie_id]) for movie_id in self.movie_ids), self.days,
+                              use_numpy=use_numpy)
+        self.grosses = [series[movie_id] for movie_id in self.movie_ids]
+
+    def day_index(self, day=None):
+        """
+        Returns the index of the day in the loaded series, the last loaded day if none is given.
+        """
+        if not self.days:
+            return None
+        if day is None or day >= self.days[-1]:
+            return len(self.days) - 1
+        return max((day - self.days[0]).days, 0)
+
+    def values(self, day=None):
+        """
+        Returns each movie's gross on the day, in movie_ids order.
+        """
+        index = self.day_index(day)
+        if index is None:
+            return [0] * len(self.movie_ids)
+        return [grosses[index] for grosses in self.grosses]
+
+    def price(self, division, movie_id):
+        return self.prices[division.id][self.movie_index[movie_id]]
+
+    def optimal_roster(self, division, day=None):
+        """
+        Returns (value, cost, movies) of the best roster the division's budget could buy, valued on the day.
+        """
+        prices, values = self.prices[division.id], self.values(day)
+        buyable = [index for index, price in enumerate(prices) if price is not None]
+        value, cost, chosen = knapsack([(prices[index], values[index]) for index in buyable], division.max_currency,
+                                       use_numpy=self.use_numpy)
+        return value, cost, [self.movies[self.movie_ids[buyable[index]]] for index in chosen]
+
+    def rerank(self, division, swaps=(), day=None):
+        """
+        Returns the division's ranked StandingsRows valued on the day, with each (team id, movie id out, movie id in)
+        swap applied to the loaded rosters. Either movie may be None to only drop or only add one. A movie swapped
+        in costs its price in the division. Nothing is saved.
+        """
+        values = self.values(day)
+        rosters = dict((team.id, list(self.memberships_by_team[team.id]))
+                       for team in self.teams if team.division_id == division.id)
+        for team_id, movie_out, movie_in in swaps:
+            if team_id not in rosters:
+                raise ValueError("Team %s is not in %s" % (team_id, division))
+            roster = rosters[team_id]
+            if movie_out is not None:
+                kept = [membership for membership in roster if membership.movie_id != movie_out]
+                if len(kept) == len(roster):
+                    raise ValueError("Team %s does not hold movie %s" % (team_id, movie_out))
+                roster[:] = kept
+            if movie_in is not None:
+                if movie_in not in self.movie_index or self.price(division, movie_in) is None:
+                    raise ValueError("Movie %s has no price in %s" % (movie_in, division))
+                roster.append(MovieMembership(movie=self.movies[movie_in], team_id=team_id,
+                                              price=self.price(division, movie_in)))
+        rows = []
+        for team in self.teams:
+            if team.id not in rosters:
+                continue
+            membership_rows = [MembershipRow(membership, values[self.movie_index[membership.movie_id]])
+                               for membership in rosters[team.id]]
+            rows.append(StandingsRow(team, division, sum(row.price for row in membership_rows),
+                                     sum(row.value_on_team for row in membership_rows), membership_rows))
+        return rank(rows)
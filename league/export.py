@@ -0,0 +1,228 @@
+"""
+Streaming export of a league's data.
+
+A league is exported as a table per model: the league itself, its players, seasons, divisions, teams, movies, the
+movies' external identifiers, the movies of each season, memberships and the movies' gross updates. Teams, players
+and the league refer to users by username.
+
+Each table is read in primary key order in chunks, every chunk starting after the last id of the one before, so an
+export holds one chunk in memory whatever the size of the table and works the same on every database backend. Rows
+are written as CSV or JSON lines as they are read.
+
+Gross updates can also be written to a compact columnar file modelled on Parquet: a magic number, then row groups
+of one chunk each, where a group stores its movie, date, gross and source columns one after the other as little
+endian 64 bit integers, then a JSON footer describing the groups, its length and the magic number again. Dates are
+days since 1970-01-01 and sources are indexes into the footer's list of source names. read_gross_columns()
+memory-maps the columns back with NumPy.
+"""
+
+from StringIO import StringIO
+import csv
+import datetime
+import json
+import struct
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from league.models import Division, League, Movie, MovieExternalId, MovieGrossUpdate, MovieMembership, Season, Team
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CHUNK_SIZE = 5000
+FORMATS = ('csv', 'jsonl', 'columnar')
+CONTENT_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson', 'columnar': 'application/octet-stream'}
+EXTENSIONS = {'csv': 'csv', 'jsonl': 'jsonl', 'columnar': 'mlcol'}
+
+MAGIC = 'MLCOL001'
+GROSS_COLUMNS = ('movie', 'date', 'gross', 'source')
+EPOCH = datetime.date(1970, 1, 1)
+
+
+def _movies(league):
+    return Movie.objects.filter(Q(season__league=league) | Q(moviemembership__team__division__season__league=league))
+
+
+# Each table's name, columns and queryset of the league's rows; FIELDS names the field holding a column when it differs
+TABLES = (
+    ('league', ('id', 'name', 'short_description', 'long_description', 'commissioner'),
+     lambda league: League.objects.filter(id=league.id)),
+    ('players', ('id', 'league', 'user'),
+     lambda league: League.players.through.objects.filter(league=league)),
+    ('seasons', ('id', 'league', 'name', 'start_date', 'end_date'),
+     lambda league: Season.objects.filter(league=league)),
+    ('divisions', ('id', 'season', 'name', 'sort_order', 'currency_unit', 'max_currency', 'num_promoted',
+                   'num_relegated'),
+     lambda league: Division.objects.filter(season__league=league)),
+    ('teams', ('id', 'division', 'owner', 'name'),
+     lambda league: Team.objects.filter(division__season__league=league)),
+    ('movies', ('id', 'name', 'release_date'),
+     lambda league: Movie.objects.filter(id__in=_movies(league).values('id'))),
+    ('external_ids', ('id', 'movie', 'source', 'identifier'),
+     lambda league: MovieExternalId.objects.filter(movie__in=_movies(league).values('id'))),
+    ('season_movies', ('id', 'season', 'movie'),
+     lambda league: Season.movies.through.objects.filter(season__league=league)),
+    ('memberships', ('id', 'team', 'movie', 'price'),
+     lambda league: MovieMembership.objects.filter(team__division__season__league=league)),
+    ('grosses', ('id', 'movie', 'date', 'gross', 'source'),
+     lambda league: MovieGrossUpdate.objects.filter(movie__in=_movies(league).values('id'))),
+)
+TABLE_NAMES = tuple(name for name, columns, queryset in TABLES)
+FIELDS = {'league': 'league_id', 'division': 'division_id', 'season': 'season_id', 'team': 'team_id',
+          'movie': 'movie_id', 'owner': 'owner__username', 'commissioner': 'commissioner__username',
+          'user': 'user__username'}
+
+
+def table(name):
+    """
+    Returns the columns and queryset function of the named table, raising ValueError for an unknown name.
+    """
+    for table_name, columns, queryset in TABLES:
+        if table_name == name:
+            return columns, queryset
+    raise ValueError("Unknown table %s, expected one of %s" % (name, ", ".join(TABLE_NAMES)))
+
+
+def rows(league, name, chunk_size=CHUNK_SIZE):
+    """
+    Yields a tuple of column values for every row of the league's table, in id order, reading a chunk at a time.
+    """
+    columns, queryset = table(name)
+    queryset = queryset(league).order_by('id').values_list(*[FIELDS.get(column, column) for column in columns])
+    last_id = None
+    while True:
+        chunk = queryset if last_id is None else queryset.filter(id__gt=last_id)
+        chunk = list(chunk[:chunk_size])
+        for row in chunk:
+            yield row
+        if len(chunk) < chunk_size:
+            break
+        last_id = chunk[-1][0]
+
+
+def _encode(value):
+    if value is None:
+        return ''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+def csv_lines(league, name):
+    """
+    Yields the table as CSV, a header line and then a line per row.
+    """
+    columns, queryset = table(name)
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([_encode(value) for value in values])
+        return buffer.getvalue()
+
+    yield line(columns)
+    for row in rows(league, name):
+        yield line(row)
+
+
+def jsonl_lines(league, name):
+    """
+    Yields the table as JSON lines, an object per row keyed by column.
+    """
+    columns, queryset = table(name)
+    for row in rows(league, name):
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def _int64s(values):
+    return struct.pack('<%dq' % len(values), *values)
+
+
+def gross_columns(league, chunk_size=CHUNK_SIZE):
+    """
+    Yields the league's gross updates in the columnar format, a row group at a time.
+    """
+    yield MAGIC
+    offset = len(MAGIC)
+    sources = {}
+    groups = []
+    group = []
+    for row in rows(league, 'grosses', chunk_size):
+        group.append(row)
+        if len(group) == chunk_size:
+            block = _gross_group(group, sources)
+            groups.append([offset, len(group)])
+            offset += len(block)
+            group = []
+            yield block
+    if group:
+        groups.append([offset, len(group)])
+        yield _gross_group(group, sources)
+    names = sorted(sources, key=sources.get)
+    footer = json.dumps({'columns': GROSS_COLUMNS, 'row_groups': groups, 'sources': names,
+                         'epoch': EPOCH.isoformat()})
+    yield footer + struct.pack('<Q', len(footer)) + MAGIC
+
+
+def _gross_group(group, sources):
+    ids, movie_ids, dates, grosses, source_names = zip(*group)
+    return ''.join([_int64s(movie_ids), _int64s([(date - EPOCH).days for date in dates]), _int64s(grosses),
+                    _int64s([sources.setdefault(source, len(sources)) for source in source_names])])
+
+
+def export(league, name, export_format):
+    """
+    Returns an iterator of the chunks of the league's table in the format. The columnar format only holds grosses.
+    """
+    table(name)
+    if export_format == 'csv':
+        return csv_lines(league, name)
+    if export_format == 'jsonl':
+        return jsonl_lines(league, name)
+    if export_format == 'columnar':
+        if name != 'grosses':
+            raise ValueError("The columnar format only holds grosses")
+        return gross_columns(league)
+    raise ValueError("Unknown format %s, expected one of %s" % (export_format, ", ".join(FORMATS)))
+
+
+def read_footer(path):
+    """
+    Returns the footer of a columnar gross file, checking its magic numbers.
+    """
+    with open(path, 'rb') as columnar:
+        if columnar.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is not a columnar export" % path)
+        columnar.seek(-8 - len(MAGIC), 2)
+        length = struct.unpack('<Q', columnar.read(8))[0]
+        if columnar.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is truncated" % path)
+        columnar.seek(-8 - len(MAGIC) - length, 2)
+        return json.loads(columnar.read(length))
+
+
+def read_gross_columns(path):
+    """
+    Returns the footer of a columnar gross file and a dict of column name to NumPy array. The columns memory-map the
+    file directly when it has a single row group, and are concatenated otherwise.
+    """
+    if numpy is None:
+        raise ImportError("Reading columnar exports needs NumPy")
+    footer = read_footer(path)
+    blocks = [numpy.memmap(path, dtype='<i8', mode='r', offset=offset, shape=(len(footer['columns']), count))
+              for offset, count in footer['row_groups']]
+    columns = {}
+    for index, column in enumerate(footer['columns']):
+        parts = [block[index] for block in blocks]
+        if not parts:
+            columns[column] = numpy.zeros(0, dtype='<i8')
+        else:
+            columns[column] = parts[0] if len(parts) == 1 else numpy.concatenate(parts)
+    return footer, columns
@@ -0,0 +1,224 @@
+"""
+In-memory index of movie gross updates for point-in-time lookups.
+
+Every MovieGrossUpdate row is loaded once into date-sorted arrays per (movie, source), plus one series per movie
+holding its canonical gross across all sources, so finding the gross on a given date is a binary search instead of
+a query. The index is per process and is only consulted when settings.LEAGUE_GROSS_INDEX is true.
+
+Saving or deleting an update marks its movie stale, so it is reloaded from the database on its next lookup and a
+write that is rolled back never reaches the index. Every reconciliation replaces a movie's CanonicalGross rows with
+new ones, so every settings.LEAGUE_GROSS_INDEX_CHECK seconds the index also marks stale the movies with rows newer
+than any it has seen, picking up writes made by other processes. A delete elsewhere may leave no newer row behind,
+so the same check counts the gross updates, and drops the whole index if the count isn't the one it expects.
+"""
+
+import array
+from bisect import bisect_right
+import threading
+import time
+
+from django.conf import settings
+
+DATE_TYPECODE = 'l'
+# 'q' guarantees 64 bits where it exists, 'l' is 64 bits on the platforms that lack it
+GROSS_TYPECODE = 'q' if 'q' in getattr(array, 'typecodes', '') else 'l'
+
+ALL_SOURCES = None
+
+
+class GrossSeries(object):
+    """
+    Parallel arrays of date ordinals and grosses, ordered by date and then by update id.
+    """
+    __slots__ = ('dates', 'grosses')
+
+    def __init__(self):
+        self.dates = array.array(DATE_TYPECODE)
+        self.grosses = array.array(GROSS_TYPECODE)
+
+    def append(self, date, gross):
+        self.dates.append(date.toordinal())
+        self.grosses.append(gross)
+
+    def value_on_date(self, date):
+        index = bisect_right(self.dates, date.toordinal())
+        if index:
+            return self.grosses[index - 1]
+        return 0
+
+    def latest_value(self):
+        if self.grosses:
+            return self.grosses[-1]
+        return 0
+
+
+def check_interval():
+    """
+    Returns how many seconds the index goes between checks for canonical grosses written by other processes.
+    """
+    return getattr(settings, 'LEAGUE_GROSS_INDEX_CHECK', 5)
+
+
+class GrossIndex(object):
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._series = None
+        self._stale_movies = set()
+        self._last_canonical_id = 0
+        self._last_update_id = 0
+        # How many gross updates the database should hold if only this process has deleted any
+        self._update_count = 0
+        self._next_check = 0
+
+    def enabled(self):
+        return getattr(settings, 'LEAGUE_GROSS_INDEX', False)
+
+    def _updates(self, movie_ids=None):
+        from league.models import MovieGrossUpdate
+        updates = MovieGrossUpdate.objects.order_by('movie', 'date', 'id')
+        if movie_ids is not None:
+            updates = updates.filter(movie__in=movie_ids)
+        return updates.values_list('id', 'movie_id', 'source', 'date', 'gross').iterator()
+
+    def _canonical(self, movie_ids=None):
+        from league.models import CanonicalGross
+        points = CanonicalGross.objects.order_by('movie', 'date')
+        if movie_ids is not None:
+            points = points.filter(movie__in=movie_ids)
+        return points.values_list('id', 'movie_id', 'date', 'gross').iterator()
+
+    def _add_rows(self, series, rows, canonical_rows):
+        for update_id, movie_id, source, date, gross in rows:
+            if (movie_id, source) not in series:
+                series[(movie_id, source)] = GrossSeries()
+            series[(movie_id, source)].append(date, gross)
+        for point_id, movie_id, date, gross in canonical_rows:
+            if (movie_id, ALL_SOURCES) not in series:
+                series[(movie_id, ALL_SOURCES)] = GrossSeries()
+            series[(movie_id, ALL_SOURCES)].append(date, gross)
+            self._last_canonical_id = max(self._last_canonical_id, point_id)
+
+    def _check_written(self):
+        """
+        Marks stale the movies whose canonical grosses were replaced or that gained gross updates since the last
+        check, by any process, and drops the index if updates were deleted by another process.
+        """
+        from django.db.models import Count, Max
+        from league.models import CanonicalGross, MovieGrossUpdate
+        if time.time() < self._next_check:
+            return
+        self._next_check = time.time() + check_interval()
+        for point_id, movie_id in CanonicalGross.objects.filter(id__gt=self._last_canonical_id).values_list(
+                'id', 'movie_id').iterator():
+            self._stale_movies.add(movie_id)
+            self._last_canonical_id = max(self._last_canonical_id, point_id)
+        updates = MovieGrossUpdate.objects.aggregate(count=Count('id'), last=Max('id'))
+        if (updates['last'] or 0) > self._last_update_id:
+            for update_id, movie_id in MovieGrossUpdate.objects.filter(id__gt=self._last_update_id).values_list(
+                    'id', 'movie_id').iterator():
+                self._stale_movies.add(movie_id)
+                self._last_update_id = max(self._last_update_id, update_id)
+                self._update_count += 1
+        if updates['count'] != self._update_count:
+            self._series = None
+
+    def _counted(self, rows):
+        for row in rows:
+            self._update_count += 1
+            self._last_update_id = max(self._last_update_id, row[0])
+            yield row
+
+    def _load(self):
+        series = {}
+        self._last_canonical_id = self._last_update_id = self._update_count = 0
+        self._add_rows(series, self._counted(self._updates()), self._canonical())
+        self._series = series
+        self._stale_movies = set()
+        self._next_check = time.time() + check_interval()
+
+    def _get_series(self, movie_ids):
+        """
+        Returns the loaded series, loading everything on first use and reloading any movie invalidated since.
+        """
+        with self._lock:
+            if self._series is not None:
+                self._check_written()
+            if self._series is None:
+                self._load()
+            stale = self._stale_movies.intersection(movie_ids)
+            if stale:
+                for key in [key for key in self._series if key[0] in stale]:
+                    del self._series[key]
+                self._add_rows(self._series, self._updates(stale), self._canonical(stale))
+                self._stale_movies -= stale
+            return self._series
+
+    def values_on_date(self, movie_ids, date, source=ALL_SOURCES):
+        """
+        Returns a dict mapping every given movie id to its gross on the date, or 0 if it had none yet.
+        """
+        movie_ids = set(movie_ids)
+        source = source or ALL_SOURCES
+        series = self._get_series(movie_ids)
+        values = {}
+        for movie_id in movie_ids:
+            movie_series = series.get((movie_id, source))
+            values[movie_id] = movie_series.value_on_date(date) if movie_series else 0
+        return values
+
+    def value_on_date(self, movie_id, date, source=ALL_SOURCES):
+        return self.values_on_date([movie_id], date, source=source)[movie_id]
+
+    def latest_value(self, movie_id, source=ALL_SOURCES):
+        movie_series = self._get_series([movie_id]).get((movie_id, source or ALL_SOURCES))
+        return movie_series.latest_value() if movie_series else 0
+
+    def canonical_changed(self, movie_id, points):
+        """
+        Replaces a movie's canonical series in place with its newly reconciled (date, gross) points.
+        """
+        with self._lock:
+            if self._series is None or movie_id in self._stale_movies:
+                return
+            series = self._series[(movie_id, ALL_SOURCES)] = GrossSeries()
+            for date, gross in points:
+                series.append(date, gross)
+
+    def invalidate_movie(self, movie_id):
+        """
+        Marks a movie's series for reload on its next lookup.
+        """
+        with self._lock:
+            if self._series is not None:
+                self._stale_movies.add(movie_id)
+
+    def update_deleted(self, movie_id, update_id):
+        """
+        Marks the movie of an update deleted by this process for reload and, if the update was counted, expects one
+        update fewer at the next check.
+        """
+        with self._lock:
+            if self._series is not None:
+                self._stale_movies.add(movie_id)
+                if update_id <= self._last_update_id:
+                    self._update_count -= 1
+
+    def reset(self):
+        """
+        Drops the whole index so it is reloaded on next use, for writes that bypass model signals.
+        """
+        with self._lock:
+            self._series = None
+            self._stale_movies = set()
+
+
+gross_index = GrossIndex()
+
+
+def update_saved(sender, instance, **kwargs):
+    gross_index.invalidate_movie(instance.movie_id)
+
+
+def update_deleted(sender, instance, **kwargs):
+    gross_index.update_deleted(instance.movie_id, instance.id)
@@ -0,0 +1,191 @@
+"""
+Streaming ingestion of box-office feeds into MovieGrossUpdate.
+
+Records are read one at a time from CSV or JSONL, resolved to movies through MovieExternalId, deduplicated against
+existing (movie, date, source) rows and written with bulk_create, one transaction per chunk. Only one chunk of
+records is held in memory at a time, so arbitrarily large backfills run in bounded memory.
+"""
+
+import csv
+import datetime
+import json
+import time
+
+from django.db import transaction
+
+from league import caching, jobs, reconcile
+from league.gross_index import gross_index
+from league.models import MovieExternalId, MovieGrossUpdate
+
+FORMATS = ('csv', 'jsonl')
+DEFAULT_CHUNK_SIZE = 5000
+# Keep IN (...) clauses under the sqlite bound parameter limit
+MOVIE_ID_CHUNK_SIZE = 500
+
+
+class IngestStats(object):
+
+    def __init__(self):
+        self.started = time.time()
+        self.read = 0
+        self.created = 0
+        self.duplicates = 0
+        self.unresolved = 0
+        self.invalid = 0
+        # Movie id to the earliest date of an update created for it
+        self.changed_from = {}
+
+    def elapsed(self):
+        return time.time() - self.started
+
+    def rate(self):
+        elapsed = self.elapsed()
+        if elapsed > 0:
+            return self.read / elapsed
+        return 0.0
+
+    def __unicode__(self):
+        return ("read %d, created %d, %d duplicates, %d unresolved, %d invalid in %.1fs (%.0f rows/s)" %
+                (self.read, self.created, self.duplicates, self.unresolved, self.invalid, self.elapsed(),
+                 self.rate()))
+
+    def __str__(self):
+        return self.__unicode__()
+
+
+def format_for_path(path):
+    """
+    Guesses a feed's format from its file name, defaulting to CSV.
+    """
+    if path.endswith('.jsonl') or path.endswith('.json'):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_records(stream, feed_format):
+    """
+    Yields one dict per record in the stream, with source, identifier, date and gross keys.
+    """
+    if feed_format == 'jsonl':
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        for record in csv.DictReader(stream):
+            yield record
+
+
+def external_id_map():
+    """
+    Returns a dict of (source, identifier) to movie id covering every MovieExternalId.
+    """
+    external_ids = MovieExternalId.objects.values_list('source', 'identifier', 'movie_id').iterator()
+    return dict(((source, identifier), movie_id) for source, identifier, movie_id in external_ids)
+
+
+def _parse(record, movie_ids, default_source):
+    """
+    Returns an unsaved MovieGrossUpdate for the record, None if it names an unknown movie, or raises ValueError.
+    """
+    source = record.get('source') or default_source
+    identifier = record.get('identifier')
+    if not source or not identifier:
+        raise ValueError("Record has no source or identifier")
+    date = datetime.datetime.strptime(str(record['date']).strip(), '%Y-%m-%d').date()
+    gross = int(str(record['gross']).replace(',', '').strip())
+    movie_id = movie_ids.get((source, str(identifier).strip()))
+    if movie_id is None:
+        return None
+    return MovieGrossUpdate(movie_id=movie_id, date=date, gross=gross, source=source)
+
+
+def _existing_keys(updates):
+    """
+    Returns the (movie id, date, source) keys among the updates that are already stored.
+    """
+    existing = set()
+    movie_ids_by_source = {}
+    for update in updates:
+        movie_ids_by_source.setdefault(update.source, set()).add(update.movie_id)
+    first_date = min(update.date for update in updates)
+    last_date = max(update.date for update in updates)
+    for source, movie_ids in movie_ids_by_source.items():
+        movie_ids = sorted(movie_ids)
+        for start in range(0, len(movie_ids), MOVIE_ID_CHUNK_SIZE):
+            chunk = movie_ids[start:start + MOVIE_ID_CHUNK_SIZE]
+            stored = MovieGrossUpdate.objects.filter(source=source, movie__in=chunk, date__gte=first_date,
+                                                     date__lte=last_date)
+            existing.update(stored.values_list('movie_id', 'date', 'source'))
+    return existing
+
+
+def _write_chunk(updates, stats):
+    if not updates:
+        return
+    with transaction.commit_on_success():
+        existing = _existing_keys(updates)
+        new_updates = []
+        for update in updates:
+            key = (update.movie_id, update.date, update.source)
+            if key in existing:
+                stats.duplicates += 1
+            else:
+                existing.add(key)
+                new_updates.append(update)
+        MovieGrossUpdate.objects.bulk_create(new_updates)
+    stats.created += len(new_updates)
+    for update in new_updates:
+        stats.changed_from[update.movie_id] = min(update.date, stats.changed_from.get(update.movie_id, update.date))
+
+
+def ingest(records, default_source=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None, stats=None):
+    """
+    Writes the records as MovieGrossUpdates and returns the IngestStats. progress, if given, is called with the
+    stats after every chunk.
+    """
+    stats = stats or IngestStats()
+    movie_ids = external_id_map()
+    chunk = []
+    for record in records:
+        stats.read += 1
+        try:
+            update = _parse(record, movie_ids, default_source)
+        except (KeyError, TypeError, ValueError):
+            stats.invalid += 1
+            continue
+        if update is None:
+            stats.unresolved += 1
+            continue
+        chunk.append(update)
+        if len(chunk) >= chunk_size:
+            _write_chunk(chunk, stats)
+            chunk = []
+            if progress:
+                progress(stats)
+    _write_chunk(chunk, stats)
+    _finish(stats)
+    return stats
+
+
+def _finish(stats):
+    if stats.created:
+        # bulk_create skips the signals that keep the canonical grosses, the index and caches current
+        reconcile.reconcile_movies(stats.changed_from.keys())
+        gross_index.reset()
+        caching.invalidate_all()
+        jobs.movies_changed(stats.changed_from.keys(), min(stats.changed_from.values()))
+
+
+def save_updates(updates, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Writes unsaved MovieGrossUpdates for movies already resolved, skipping any already stored, and returns the
+    IngestStats.
+    """
+    stats = IngestStats()
+    updates = list(updates)
+    stats.read = len(updates)
+    for start in range(0, len(updates), chunk_size):
+        _write_chunk(updates[start:start + chunk_size], stats)
+    _finish(stats)
+    return stats
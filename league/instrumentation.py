@@ -0,0 +1,218 @@
+"""
+Per-request query and latency instrumentation.
+
+QueryInstrumentationMiddleware records each request's query count, database time, template render time and the
+query shapes it repeated, the usual sign of an N+1 loop. Records are logged as JSON to the league.instrumentation
+logger and kept in memory for the stats view. QueryBudgetMixin lets tests hold each view to a query budget.
+"""
+
+from collections import deque
+import json
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_started
+from django.db import connection, connections, reset_queries
+from django.template.base import Template
+
+logger = logging.getLogger('league.instrumentation')
+
+# Queries allowed per page, independent of how many teams and movies the page shows. Each is exactly what the page
+# runs, so any added query fails the budget test rather than fitting under slack.
+DEFAULT_QUERY_BUDGETS = {
+    'home': 1,
+    'league': 8,
+    'seasons': 8,
+    'season': 8,
+    'division': 7,
+    'team': 8,
+    'season_picks': 4,
+    'season_live': 1,
+    'leagues': 2,
+    'league_detail': 3,
+    'season_detail': 3,
+    'division_detail': 6,
+    'team_detail': 8,
+    'movie_grosses': 3,
+}
+
+_lock = threading.Lock()
+_history = deque(maxlen=getattr(settings, 'LEAGUE_INSTRUMENTATION_HISTORY', 200))
+_view_totals = {}
+_render_state = threading.local()
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+
+
+def query_shape(sql):
+    """
+    Reduces a query to its shape by replacing literals with placeholders, so the same query run with different
+    parameters is counted together.
+    """
+    shape = _STRING_LITERAL.sub('?', sql)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    return _PLACEHOLDER_LIST.sub('(...)', shape)
+
+
+def db_time(queries):
+    return sum(float(query['time']) for query in queries)
+
+
+def repeated_shapes(queries, limit=5):
+    """
+    Returns up to limit (shape, count, seconds) tuples for query shapes run more than once, most frequent first.
+    """
+    shapes = {}
+    for query in queries:
+        shape = query_shape(query['sql'])
+        count, seconds = shapes.get(shape, (0, 0.0))
+        shapes[shape] = (count + 1, seconds + float(query['time']))
+    repeated = [(shape, count, seconds) for shape, (count, seconds) in shapes.items() if count > 1]
+    repeated.sort(key=lambda item: (-item[1], -item[2]))
+    return repeated[:limit]
+
+
+class CapturedQueries(object):
+    """
+    Context manager recording the queries run on the default connection, even with DEBUG off. Like
+    assertNumQueries it stops request_started from clearing the log, so it can wrap test client requests.
+    """
+
+    def __enter__(self):
+        self.previous_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        request_started.disconnect(reset_queries)
+        self.start = len(connection.queries)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        request_started.connect(reset_queries)
+        connection.use_debug_cursor = self.previous_debug_cursor
+        self.queries = connection.queries[self.start:]
+
+
+def _install_render_timer():
+    """
+    Wraps Template.render so the time spent rendering the outermost template of each request is accumulated.
+    """
+    if getattr(Template.render, 'instrumented', False):
+        return
+    untimed_render = Template.render
+
+    def render(self, context):
+        if getattr(_render_state, 'rendering', False):
+            return untimed_render(self, context)
+        _render_state.rendering = True
+        started = time.time()
+        try:
+            return untimed_render(self, context)
+        finally:
+            _render_state.rendering = False
+            _render_state.seconds = getattr(_render_state, 'seconds', 0.0) + time.time() - started
+
+    render.instrumented = True
+    Template.render = render
+
+
+def _record(record):
+    with _lock:
+        _history.append(record)
+        totals = _view_totals.setdefault(record['view'], {'requests': 0, 'queries': 0, 'max_queries': 0,
+                                                          'db_ms': 0.0, 'total_ms': 0.0})
+        totals['requests'] += 1
+        totals['queries'] += record['queries']
+        totals['max_queries'] = max(totals['max_queries'], record['queries'])
+        totals['db_ms'] += record['db_ms']
+        totals['total_ms'] += record['total_ms']
+    logger.info(json.dumps(record))
+
+
+def stats():
+    """
+    Returns the recent request records and per-view averages.
+    """
+    with _lock:
+        views = {}
+        for view, totals in _view_totals.items():
+            views[view] = {'requests': totals['requests'],
+                           'max_queries': totals['max_queries'],
+                           'avg_queries': float(totals['queries']) / totals['requests'],
+                           'avg_db_ms': totals['db_ms'] / totals['requests'],
+                           'avg_total_ms': totals['total_ms'] / totals['requests']}
+        return {'views': views, 'recent': list(_history)}
+
+
+def reset_stats():
+    with _lock:
+        _history.clear()
+        _view_totals.clear()
+
+
+class QueryInstrumentationMiddleware(object):
+    """
+    Records query and timing statistics for every request. Disabled unless settings.LEAGUE_INSTRUMENTATION is true,
+    since it wraps Template.render for the whole process and logs every query of every request.
+    """
+
+    def __init__(self):
+        if not getattr(settings, 'LEAGUE_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed()
+        _install_render_timer()
+
+    def process_request(self, request):
+        request._instrumentation_started = time.time()
+        request._instrumentation_view = None
+        # Every connection, since reads may be routed to a replica
+        request._instrumentation_connections = [(each, each.use_debug_cursor, len(each.queries))
+                                                for each in connections.all()]
+        for each in connections.all():
+            each.use_debug_cursor = True
+        _render_state.seconds = 0.0
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._instrumentation_view = view_func.__name__
+
+    def process_response(self, request, response):
+        if not hasattr(request, '_instrumentation_started'):
+            return response
+        queries = []
+        for each, debug_cursor, first_query in request._instrumentation_connections:
+            each.use_debug_cursor = debug_cursor
+            queries.extend(each.queries[first_query:])
+        record = {
+            'path': request.path,
+            'view': request._instrumentation_view,
+            'status': response.status_code,
+            'queries': len(queries),
+            'db_ms': round(db_time(queries) * 1000, 2),
+            'template_ms': round(getattr(_render_state, 'seconds', 0.0) * 1000, 2),
+            'total_ms': round((time.time() - request._instrumentation_started) * 1000, 2),
+            'repeated_queries': [{'sql': shape, 'count': count, 'ms': round(seconds * 1000, 2)}
+                                 for shape, count, seconds in repeated_shapes(queries)],
+        }
+        _record(record)
+        return response
+
+
+class QueryBudgetMixin(object):
+    """
+    TestCase mixin asserting that a page stays within the query budget set for its view in
+    settings.LEAGUE_QUERY_BUDGETS or DEFAULT_QUERY_BUDGETS.
+    """
+
+    def assertWithinQueryBudget(self, view_name, url):
+        budgets = getattr(settings, 'LEAGUE_QUERY_BUDGETS', DEFAULT_QUERY_BUDGETS)
+        with CapturedQueries() as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(captured.queries), budgets[view_name],
+                             "%s ran %d queries, over its budget of %d:\n%s" %
+                             (url, len(captured.queries), budgets[view_name],
+                              "\n".join(query['sql'] for query in captured.queries)))
+        return response
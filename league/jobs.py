@@ -0,0 +1,206 @@
+"""
+Database-backed queue of standings recomputation jobs.
+
+Saving or deleting gross updates, memberships and teams, or ingesting grosses in bulk, discards the snapshots they make
+stale and enqueues a StandingsJob for every affected season. Pending jobs are coalesced, so a season has at most one
+waiting, covering the earliest day that changed; a unique column holding the season's id while a job is pending keeps
+concurrent writers from queueing a second. The run_standings_worker command claims jobs, rebuilds the season's snapshots
+from that day and, when the cache is shared with the web processes, renders its pages back into it, so visitors don't
+pay for the recomputation. Failed jobs are retried with exponential backoff. Enqueueing is disabled unless
+settings.LEAGUE_STANDINGS_JOBS is true.
+"""
+
+import datetime
+import logging
+import traceback
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger('league.jobs')
+
+MAX_ATTEMPTS = 5
+# Seconds before the first retry, doubled after every further failure
+RETRY_DELAY = 30
+# Jobs left running this long belong to a worker that died and are handed out again
+STALE_AFTER = datetime.timedelta(minutes=30)
+CLAIM_CANDIDATES = 10
+
+
+def enabled():
+    return getattr(settings, 'LEAGUE_STANDINGS_JOBS', False)
+
+
+def enqueue(season_ids, from_date=None):
+    """
+    Queues a recomputation of each season from from_date, or the whole season if it is None. A season that already
+    has a pending job gets that job widened instead of a second one.
+    """
+    from league.models import StandingsJob
+    for season_id in set(season_ids):
+        while True:
+            job, created = StandingsJob.objects.get_or_create(pending_season=season_id, defaults={
+                'season_id': season_id, 'from_date': from_date, 'run_after': timezone.now()})
+            if created or job.from_date is None or (from_date is not None and from_date >= job.from_date):
+                break
+            # The job may have been claimed since it was read, in which case the change needs a new one
+            if StandingsJob.objects.filter(id=job.id, status=StandingsJob.PENDING).update(from_date=from_date):
+                break
+
+
+def movies_changed(movie_ids, from_date=None):
+    """
+    Discards the stale snapshots of every season holding any of the movies and queues them, for gross updates
+    written in bulk, which send no signals.
+    """
+    from league.caching import movie_season_ids
+    from league.standings import MOVIE_ID_CHUNK_SIZE
+    movie_ids = sorted(set(movie_ids))
+    season_ids = set()
+    for start in range(0, len(movie_ids), MOVIE_ID_CHUNK_SIZE):
+        season_ids.update(movie_season_ids(movie_ids[start:start + MOVIE_ID_CHUNK_SIZE]))
+    _seasons_changed(season_ids, from_date)
+
+
+def claim_next():
+    """
+    Marks the next due job running and returns it, or returns None if no job is due. Jobs of seasons that another
+    worker is recomputing are left for later, and claiming is a conditional update so two workers never run the
+    same job.
+    """
+    from league.models import StandingsJob
+    now = timezone.now()
+    for job in StandingsJob.objects.filter(status=StandingsJob.RUNNING, updated__lt=now - STALE_AFTER):
+        _requeue(job, now)
+    running = StandingsJob.objects.filter(status=StandingsJob.RUNNING).values('season')
+    due = StandingsJob.objects.filter(status=StandingsJob.PENDING, run_after__lte=now).exclude(season__in=running)
+    for job in due[:CLAIM_CANDIDATES]:
+        claimed = StandingsJob.objects.filter(id=job.id, status=StandingsJob.PENDING).update(
+            status=StandingsJob.RUNNING, pending_season=None, attempts=F('attempts') + 1, updated=now)
+        if claimed:
+            job.status, job.pending_season, job.updated = StandingsJob.RUNNING, None, now
+            job.attempts += 1
+            return job
+    return None
+
+
+def _requeue(job, run_after):
+    """
+    Puts a job that stopped running back in the queue to run at run_after, or, if its season already has a newer
+    pending job, folds it into that one rather than queue both.
+    """
+    from league.models import StandingsJob
+    job.status, job.pending_season, job.run_after = StandingsJob.PENDING, job.season_id, run_after
+    sid = transaction.savepoint()
+    try:
+        job.save()
+        transaction.savepoint_commit(sid)
+    except IntegrityError:
+        transaction.savepoint_rollback(sid)
+        job.status, job.pending_season = StandingsJob.FAILED, None
+        job.save()
+        enqueue([job.season_id], job.from_date)
+
+
+def _failed(job):
+    from league.models import StandingsJob
+    job.last_error = traceback.format_exc()
+    if job.attempts >= MAX_ATTEMPTS:
+        job.status = StandingsJob.FAILED
+        job.save()
+    else:
+        _requeue(job, timezone.now() + datetime.timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1)))
+    logger.error("Standings job %d for season %d failed on attempt %d", job.id, job.season_id, job.attempts,
+                 exc_info=True)
+
+
+def run_job(job):
+    """
+    Rebuilds the job's season snapshots from its from_date and, if the cache is shared, re-renders the season's
+    pages. Returns whether it succeeded; a failure is recorded on the job and scheduled for retry.
+    """
+    from league.caching import shared_cache, warm_season
+    from league.models import StandingsJob
+    from league.snapshots import rebuild_season
+    try:
+        rebuild_season(job.season, start=job.from_date)
+        if shared_cache():
+            warm_season(job.season)
+    except Exception:
+        _failed(job)
+        return False
+    job.status = StandingsJob.DONE
+    job.last_error = ''
+    job.save()
+    return True
+
+
+def work(max_jobs=None):
+    """
+    Runs due jobs until none are left or max_jobs have run, and returns a list of (job, succeeded).
+    """
+    results = []
+    while max_jobs is None or len(results) < max_jobs:
+        job = claim_next()
+        if job is None:
+            break
+        results.append((job, run_job(job)))
+    return results
+
+
+def queue_status(recent=20):
+    """
+    Returns job counts by status, the age of the oldest pending job in seconds and the most recently updated jobs.
+    """
+    from django.db.models import Count, Min
+    from league.models import StandingsJob
+    counts = dict((status, 0) for status, name in StandingsJob.STATUS_CHOICES)
+    counts.update(StandingsJob.objects.values_list('status').annotate(Count('id')).order_by())
+    oldest = StandingsJob.objects.filter(status=StandingsJob.PENDING).aggregate(Min('created'))['created__min']
+    return {
+        'counts': counts,
+        'oldest_pending_seconds': (timezone.now() - oldest).total_seconds() if oldest else None,
+        'recent': [{'id': job.id, 'season': job.season_id, 'status': job.status, 'attempts': job.attempts,
+                    'from_date': job.from_date and job.from_date.isoformat(), 'updated': job.updated.isoformat(),
+                    'error': job.last_error.strip().splitlines()[-1] if job.last_error else None}
+                   for job in StandingsJob.objects.order_by('-updated', '-id')[:recent]],
+    }
+
+
+def _seasons_changed(season_ids, from_date=None):
+    from league.snapshots import discard_snapshots
+    season_ids = list(season_ids)
+    if not season_ids:
+        return
+    discard_snapshots(season_ids, from_date)
+    if enabled():
+        enqueue(season_ids, from_date)
+
+
+def gross_update_changed(sender, instance, created=True, **kwargs):
+    from league.caching import movie_season_ids
+    # An edited update may have moved from an earlier day, so recompute the whole season
+    _seasons_changed(movie_season_ids([instance.movie_id]), instance.date if created else None)
+
+
+def membership_changed(sender, instance, **kwargs):
+    from league.models import Team
+    _seasons_changed(Team.objects.filter(id=instance.team_id).values_list('division__season', flat=True))
+
+
+def team_changed(sender, instance, **kwargs):
+    from league.models import Division
+    _seasons_changed(Division.objects.filter(id=instance.division_id).values_list('season', flat=True))
+
+
+def team_moving(sender, instance, raw=False, **kwargs):
+    """
+    Recomputes the season a team is being moved out of.
+    """
+    from league.models import Team
+    if instance.id is None or raw:
+        return
+    _seasons_changed(Team.objects.filter(id=instance.id).exclude(division=instance.division_id).values_list(
+        'division__season', flat=True))
@@ -0,0 +1,264 @@
+"""
+Live season scoreboards over server-sent events.
+
+Browsers watching a season hold one streaming connection each instead of polling its pages. A publisher keeps a
+channel per watched season with the standings last sent and the season's version. Model signals and bulk writers,
+ingestion and the standings worker included, already replace the version in the database whenever a gross update
+or roster changes, so the publisher only has to compare versions, one query for every watched season, to know
+which standings to recompute. A changed season is recomputed once and the teams whose position, value or cost moved
+are queued to every subscriber, however many there are. Subscribers that fall behind have their queue replaced by
+the full standings.
+
+ThreadedPublisher polls from a background thread while anyone is subscribed. LocalPublisher only publishes when
+poll() is called, for tests and scripts. Each connection ties up a server thread while it is open, so pages only
+open one when listed in settings.LEAGUE_LIVE_PAGES, and connections are closed after a minute by default. Streaming
+busy pages needs an evented server such as gunicorn's gevent worker.
+"""
+
+import hashlib
+import json
+import logging
+import Queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections
+
+from league.caching import season_version_map
+
+logger = logging.getLogger('league.live')
+
+# Events a subscriber may leave unread before its queue is reset to the full standings
+QUEUE_SIZE = 50
+# Milliseconds a disconnected browser waits before reconnecting
+RETRY = 3000
+
+
+def poll_interval():
+    return getattr(settings, 'LEAGUE_LIVE_POLL_INTERVAL', 2)
+
+
+def keepalive_interval():
+    return getattr(settings, 'LEAGUE_LIVE_KEEPALIVE', 15)
+
+
+def max_age():
+    """
+    Returns how many seconds a connection is held before the browser is left to reconnect.
+    """
+    return getattr(settings, 'LEAGUE_LIVE_MAX_AGE', 55)
+
+
+def live_pages():
+    return tuple(getattr(settings, 'LEAGUE_LIVE_PAGES', ()))
+
+
+def page_enabled(name):
+    """
+    Returns whether the page with the given name keeps its standings up to date from the live scoreboard.
+    """
+    return name in live_pages()
+
+
+def standings_state(season_id):
+    """
+    Returns a dict of team id to the team's current standing in the season, the same standings its pages show.
+    """
+    from league.models import Season
+    from league.snapshots import season_standings
+    try:
+        season = Season.objects.get(id=season_id)
+    except Season.DoesNotExist:
+        return {}
+    state = {}
+    for division, rows in season_standings(season):
+        for row in rows:
+            state[row.team.id] = {'team': row.team.id, 'name': row.get_name(), 'division': division.id,
+                                  'position': row.position, 'value': row.value, 'cost': row.cost,
+                                  'promoted': row.is_promoted(), 'relegated': row.is_relegated()}
+    return state
+
+
+def standings_diff(before, after):
+    """
+    Returns the standings of the teams that are new or changed in after, and the ids of the teams it no longer has.
+    """
+    changed = [after[team_id] for team_id in sorted(after) if before.get(team_id) != after[team_id]]
+    return changed, sorted(set(before) - set(after))
+
+
+def format_event(event):
+    """
+    Returns an (event name, event id, data) triple as a server-sent event.
+    """
+    name, event_id, data = event
+    return 'id: %s\nevent: %s\ndata: %s\n\n' % (event_id, name, json.dumps(data, cls=DjangoJSONEncoder))
+
+
+class Channel(object):
+    """
+    A watched season's subscribers and the standings last sent to them.
+    """
+
+    def __init__(self, season_id):
+        self.season_id = season_id
+        self.version = None
+        self.event_id = None
+        self.state = {}
+        self.subscribers = set()
+
+    def standings_event(self):
+        return ('standings', self.event_id, {'season': self.season_id,
+                                             'teams': [self.state[team_id] for team_id in sorted(self.state)]})
+
+
+class LocalPublisher(object):
+    """
+    Publishes standings changes to subscribers when poll() is called, in the calling thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.channels = {}
+        self.computations = 0
+
+    def subscribe(self, season_id, last_event_id=None):
+        """
+        Returns a queue of events for the season, starting with its full standings unless last_event_id shows the
+        subscriber already has the current ones.
+        """
+        with self.lock:
+            channel = self.channels.get(season_id)
+            if channel is None:
+                channel = self.channels[season_id] = Channel(season_id)
+            self._publish(channel, season_version_map([season_id])[season_id])
+            subscription = Queue.Queue(QUEUE_SIZE)
+            if last_event_id != channel.event_id:
+                subscription.put(channel.standings_event())
+            channel.subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, season_id, subscription):
+        with self.lock:
+            channel = self.channels.get(season_id)
+            if channel is not None:
+                channel.subscribers.discard(subscription)
+                if not channel.subscribers:
+                    del self.channels[season_id]
+
+    def poll(self):
+        """
+        Recomputes the standings of every watched season whose data changed, queues the changes to its subscribers
+        and returns how many seasons had changes.
+        """
+        with self.lock:
+            versions = season_version_map(self.channels)
+            return len([channel for channel in self.channels.values()
+                        if self._publish(channel, versions[channel.season_id])])
+
+    def _publish(self, channel, version):
+        event = self._refresh(channel, version)
+        if event is not None:
+            for subscription in channel.subscribers:
+                self._send(channel, subscription, event)
+        return event
+
+    def _refresh(self, channel, version):
+        if version == channel.version:
+            return None
+        state = standings_state(channel.season_id)
+        self.computations += 1
+        changed, removed = standings_diff(channel.state, state)
+        first = channel.version is None
+        channel.version, channel.state = version, state
+        channel.event_id = hashlib.md5(version).hexdigest()
+        if first or not (changed or removed):
+            return None
+        return ('diff', channel.event_id, {'season': channel.season_id, 'teams': changed, 'removed': removed})
+
+    def _send(self, channel, subscription, event):
+        try:
+            subscription.put_nowait(event)
+        except Queue.Full:
+            while True:
+                try:
+                    subscription.get_nowait()
+                except Queue.Empty:
+                    break
+            subscription.put_nowait(channel.standings_event())
+
+
+class ThreadedPublisher(LocalPublisher):
+    """
+    Polls from a background thread started by the first subscriber, which stops once nobody is subscribed.
+    """
+
+    def __init__(self):
+        super(ThreadedPublisher, self).__init__()
+        self.thread = None
+
+    def subscribe(self, season_id, last_event_id=None):
+        with self.lock:
+            subscription = super(ThreadedPublisher, self).subscribe(season_id, last_event_id)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='league-live-publisher')
+                self.thread.daemon = True
+                self.thread.start()
+            return subscription
+
+    def _run(self):
+        while True:
+            time.sleep(poll_interval())
+            with self.lock:
+                if not self.channels:
+                    self.thread = None
+                    return
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Publishing live standings failed")
+            finally:
+                connection.close()
+
+
+PUBLISHERS = {'thread': ThreadedPublisher, 'local': LocalPublisher}
+_publishers = {}
+
+
+def get_publisher():
+    """
+    Returns the process's publisher of the kind named by settings.LEAGUE_LIVE_PUBLISHER.
+    """
+    kind = getattr(settings, 'LEAGUE_LIVE_PUBLISHER', 'thread')
+    if kind not in _publishers:
+        _publishers[kind] = PUBLISHERS[kind]()
+    return _publishers[kind]
+
+
+def event_stream(publisher, season_id, last_event_id=None):
+    """
+    Yields the season's events as server-sent events until the connection reaches its maximum age, with a comment
+    line whenever nothing has been sent for the keepalive interval. Database connections are closed once subscribed,
+    since the request only waits on its queue from then on and would otherwise hold them, and any open transaction,
+    for as long as the browser stays connected.
+    """
+    subscription = publisher.subscribe(season_id, last_event_id)
+    for database in connections.all():
+        database.close()
+    deadline = time.time() + max_age()
+    try:
+        yield 'retry: %d\n\n' % RETRY
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            try:
+                event = subscription.get(timeout=min(keepalive_interval(), remaining))
+            except Queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            yield format_event(event)
+    finally:
+        publisher.unsubscribe(season_id, subscription)
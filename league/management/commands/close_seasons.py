@@ -0,0 +1,33 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from league.alltime import close_ended_seasons, rebuild_league
+from league.models import League
+
+
+class Command(BaseCommand):
+    help = "Adds the results of every ended season not closed yet to its league's all-time owner records."
+    option_list = BaseCommand.option_list + (
+        make_option('--league', type='int', dest='league', help='Only close seasons of this league id'),
+        make_option('--rebuild', action='store_true', dest='rebuild', default=False,
+                    help="Recompute the league's records from all of its ended seasons"),
+    )
+
+    def handle(self, *args, **options):
+        league = None
+        if options['league'] is not None:
+            try:
+                league = League.objects.get(id=options['league'])
+            except League.DoesNotExist:
+                raise CommandError("League %s does not exist" % options['league'])
+        if options['rebuild']:
+            if league is None:
+                raise CommandError("--rebuild needs --league")
+            closed = rebuild_league(league)
+        else:
+            closed = close_ended_seasons(league)
+        for season in closed:
+            self.stdout.write("Closed %s" % season)
+        if not closed:
+            self.stdout.write("No seasons to close")
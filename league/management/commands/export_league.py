@@ -0,0 +1,41 @@
+from optparse import make_option
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from league.export import EXTENSIONS, FORMATS, TABLE_NAMES, export
+from league.models import League
+
+
+class Command(BaseCommand):
+    args = '<league id>'
+    help = ("Writes a league's seasons, divisions, teams, movies, memberships and gross updates to one file per "
+            "table, streaming each table in chunks.")
+    option_list = BaseCommand.option_list + (
+        make_option('--format', dest='format', default='csv', choices=FORMATS,
+                    help='csv, jsonl or columnar, which only holds grosses; csv by default'),
+        make_option('--table', action='append', dest='tables', default=[],
+                    help='Only export this table; may be repeated'),
+        make_option('--output', dest='output', default='.', help='Directory to write the files to'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("Give the id of the league to export")
+        try:
+            league = League.objects.get(id=args[0])
+        except (League.DoesNotExist, ValueError):
+            raise CommandError("League %s does not exist" % args[0])
+        tables = options['tables'] or (['grosses'] if options['format'] == 'columnar' else TABLE_NAMES)
+        if not os.path.isdir(options['output']):
+            raise CommandError("%s is not a directory" % options['output'])
+        for name in tables:
+            try:
+                chunks = export(league, name, options['format'])
+            except ValueError as error:
+                raise CommandError(str(error))
+            path = os.path.join(options['output'], 'league-%d-%s.%s' % (league.id, name, EXTENSIONS[options['format']]))
+            with open(path, 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+            self.stdout.write("Wrote %s" % path)
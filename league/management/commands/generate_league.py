@@ -0,0 +1,27 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from league.synthetic import generate_league
+
+
+class Command(BaseCommand):
+    help = "Generates a synthetic league of the given scale for benchmarking."
+    option_list = BaseCommand.option_list + (
+        make_option('--name', dest='name', help='League name, also used to prefix generated users and movies'),
+        make_option('--seasons', dest='seasons', type='int', default=1),
+        make_option('--divisions', dest='divisions', type='int', default=2, help='Divisions per season'),
+        make_option('--teams', dest='teams', type='int', default=10, help='Teams per division'),
+        make_option('--movies-per-team', dest='movies_per_team', type='int', default=5),
+        make_option('--updates-per-movie', dest='updates_per_movie', type='int', default=60,
+                    help='Daily gross updates per movie and source'),
+        make_option('--sources', dest='sources', type='int', default=1, help='Number of gross sources'),
+        make_option('--seed', dest='seed', type='int', default=0, help='Random seed'),
+    )
+
+    def handle(self, *args, **options):
+        league = generate_league(seasons=options['seasons'], divisions=options['divisions'], teams=options['teams'],
+                                 movies_per_team=options['movies_per_team'],
+                                 updates_per_movie=options['updates_per_movie'], sources=options['sources'],
+                                 seed=options['seed'], name=options['name'])
+        self.stdout.write("Generated league %d: %s" % (league.id, league.name))
@@ -0,0 +1,37 @@
+from optparse import make_option
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from league.ingest import DEFAULT_CHUNK_SIZE, FORMATS, IngestStats, format_for_path, ingest, read_records
+
+
+class Command(BaseCommand):
+    args = '<path or - for stdin> [path ...]'
+    help = "Imports box-office grosses from CSV or JSONL feeds, matching movies on their external ids."
+    option_list = BaseCommand.option_list + (
+        make_option('--format', dest='format', choices=FORMATS,
+                    help='Feed format, guessed from the file name when not given and CSV for stdin'),
+        make_option('--source', dest='source',
+                    help='Source to use for records that do not name one'),
+        make_option('--chunk-size', dest='chunk_size', type='int', default=DEFAULT_CHUNK_SIZE,
+                    help='Number of records written per transaction'),
+    )
+
+    def handle(self, *args, **options):
+        if not args:
+            raise CommandError("Give at least one feed path, or - to read from stdin")
+        stats = IngestStats()
+        for path in args:
+            feed_format = options['format'] or ('csv' if path == '-' else format_for_path(path))
+            stream = sys.stdin if path == '-' else open(path, 'rb')
+            try:
+                ingest(read_records(stream, feed_format), default_source=options['source'],
+                       chunk_size=options['chunk_size'], progress=self.report, stats=stats)
+            finally:
+                if stream is not sys.stdin:
+                    stream.close()
+        self.stdout.write("Done: %s" % stats)
+
+    def report(self, stats):
+        self.stdout.write("Progress: %s" % stats)
@@ -0,0 +1,33 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from league.restore import export_paths, import_league
+
+
+class Command(BaseCommand):
+    args = '<directory>'
+    help = "Loads a league written by export_league into the database as a new league and reports the time taken."
+    option_list = BaseCommand.option_list + (
+        make_option('--format', dest='format', default='csv', choices=('csv', 'jsonl'),
+                    help='Format the league was exported in, csv by default'),
+        make_option('--league', type='int', dest='league',
+                    help='Exported id of the league to load, when the directory holds several'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("Give the directory the league was exported to")
+        try:
+            paths = export_paths(args[0], options['format'], options['league'])
+            league, report = import_league(paths, options['format'])
+        except ValueError as error:
+            raise CommandError(str(error))
+        total_rows = total_seconds = 0
+        for name, rows, seconds in report:
+            self.stdout.write("%-14s %9d rows %8.2fs" % (name, rows, seconds))
+            total_rows += rows
+            total_seconds += seconds
+        self.stdout.write("%-14s %9d rows %8.2fs, %d rows/s" % ('total', total_rows, total_seconds,
+                                                               total_rows / max(total_seconds, 0.001)))
+        self.stdout.write("Imported league %d: %s" % (league.id, league))
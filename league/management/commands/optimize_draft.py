@@ -0,0 +1,68 @@
+from optparse import make_option
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from league.draft import DraftBoard
+from league.models import Season
+
+
+def _movie_id(value):
+    return int(value) if value else None
+
+
+def _swap(value):
+    try:
+        team_id, movie_out, movie_in = value.split(':')
+        return int(team_id), _movie_id(movie_out), _movie_id(movie_in)
+    except ValueError:
+        raise CommandError("Swaps are given as TEAM:OUT:IN movie ids, with OUT or IN left empty, not %s" % value)
+
+
+class Command(BaseCommand):
+    args = '<season id>'
+    help = ("Finds the most valuable roster each division's budget could have bought, and re-ranks a division with "
+            "movies swapped, without changing anything.")
+    option_list = BaseCommand.option_list + (
+        make_option('--division', type='int', dest='division', help='Only report this division id'),
+        make_option('--date', dest='date', help='Value movies on this YYYY-MM-DD date instead of the latest day'),
+        make_option('--swap', action='append', dest='swaps', default=[],
+                    help='Swap a movie on a team, as TEAM:OUT:IN ids; needs --division, and may be repeated'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("Give the id of the season to optimize")
+        try:
+            season = Season.objects.get(id=args[0])
+        except (Season.DoesNotExist, ValueError):
+            raise CommandError("Season %s does not exist" % args[0])
+        day = None
+        if options['date']:
+            try:
+                day = datetime.datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("Dates must be given as YYYY-MM-DD, not %s" % options['date'])
+        swaps = [_swap(value) for value in options['swaps']]
+        if swaps and options['division'] is None:
+            raise CommandError("--swap needs --division")
+
+        board = DraftBoard(season)
+        divisions = board.divisions
+        if options['division'] is not None:
+            divisions = [division for division in divisions if division.id == options['division']]
+            if not divisions:
+                raise CommandError("Division %s is not in %s" % (options['division'], season))
+        for division in divisions:
+            value, cost, movies = board.optimal_roster(division, day)
+            self.stdout.write("%s: best roster worth %d for %d of %d %s" %
+                              (division.name, value, cost, division.max_currency, division.currency_unit))
+            for movie in movies:
+                self.stdout.write("  %s (%d)" % (movie.name, board.price(division, movie.id)))
+            try:
+                rows = board.rerank(division, swaps, day)
+            except ValueError as error:
+                raise CommandError(str(error))
+            self.stdout.write("%s standings%s:" % (division.name, " with swaps" if swaps else ""))
+            for row in rows:
+                self.stdout.write("  %d. %s: %d for %d" % (row.position + 1, row.get_name(), row.value, row.cost))
@@ -0,0 +1,31 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from league.models import Season
+from league.snapshots import rebuild_season, update_snapshots
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds the materialized standings snapshots for the seasons and days affected by gross updates added "
+            "since the last run.")
+    option_list = BaseCommand.option_list + (
+        make_option('--season', action='append', type='int', dest='seasons', default=[],
+                    help='Rebuild every day of this season id instead, may be given more than once'),
+    )
+
+    def handle(self, *args, **options):
+        if options['seasons']:
+            rebuilt = []
+            for season_id in options['seasons']:
+                try:
+                    season = Season.objects.get(id=season_id)
+                except Season.DoesNotExist:
+                    raise CommandError("Season %s does not exist" % season_id)
+                rebuilt.append((season, rebuild_season(season)))
+        else:
+            rebuilt = update_snapshots()
+        for season, count in rebuilt:
+            self.stdout.write("Wrote %d snapshots for %s" % (count, season))
+        if not rebuilt:
+            self.stdout.write("Standings snapshots are up to date")
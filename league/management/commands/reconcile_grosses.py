@@ -0,0 +1,21 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from league.reconcile import reconcile_all, reconcile_movies
+
+
+class Command(BaseCommand):
+    help = ("Recomputes the canonical gross series of every movie, or of the given movies, from their gross updates "
+            "and the source priorities in settings.LEAGUE_GROSS_SOURCES.")
+    option_list = BaseCommand.option_list + (
+        make_option('--movie', type='int', action='append', dest='movies', default=[],
+                    help='Only reconcile this movie id; may be repeated'),
+    )
+
+    def handle(self, *args, **options):
+        if options['movies']:
+            points = reconcile_movies(options['movies'])
+        else:
+            points = reconcile_all()
+        self.stdout.write("Stored %d canonical gross points" % points)
@@ -0,0 +1,59 @@
+from optparse import make_option
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from league.alltime import close_season
+from league.models import Season
+from league.rollover import apply_rollover, describe, next_season_dates, plan_rollover
+
+
+def _date(value):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError("Dates must be given as YYYY-MM-DD, not %s" % value)
+
+
+class Command(BaseCommand):
+    args = '<season id>'
+    help = ("Creates the season after a finished one, copying its divisions and moving promoted and relegated "
+            "owners between adjacent divisions.")
+    option_list = BaseCommand.option_list + (
+        make_option('--name', dest='season_name',
+                    help='Name of the new season, by default the old name with " (next)"'),
+        make_option('--start', dest='start', help='Start date of the new season, by default a year after the old'),
+        make_option('--end', dest='end', help='End date of the new season, by default a year after the old'),
+        make_option('--dry-run', action='store_true', dest='dry_run', default=False,
+                    help='Report the moves without creating anything'),
+        make_option('--force', action='store_true', dest='force', default=False,
+                    help='Roll over a season that has not ended yet'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("Give the id of the season to roll over")
+        try:
+            season = Season.objects.get(id=args[0])
+        except (Season.DoesNotExist, ValueError):
+            raise CommandError("Season %s does not exist" % args[0])
+        if not season.has_ended() and not options['force']:
+            raise CommandError("%s has not ended yet, use --force to roll it over anyway" % season)
+        start_date, end_date = next_season_dates(season)
+        start_date = _date(options['start']) if options['start'] else start_date
+        end_date = _date(options['end']) if options['end'] else end_date
+        name = options['season_name'] or "%s (next)" % season.name
+
+        plan = plan_rollover(season)
+        for line in describe(plan):
+            self.stdout.write(line)
+        if options['dry_run']:
+            self.stdout.write("Dry run, nothing was created")
+            return
+        try:
+            new_season = apply_rollover(season, plan, name, start_date, end_date)
+        except ValueError as error:
+            raise CommandError(str(error))
+        if season.has_ended() and close_season(season):
+            self.stdout.write("Added %s to the all-time records" % season)
+        self.stdout.write("Created season %d: %s with %d divisions" % (new_season.id, new_season, len(plan)))
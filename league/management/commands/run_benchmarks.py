@@ -0,0 +1,38 @@
+from optparse import make_option
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from league.benchmarks import compare, read_results, run_benchmarks, write_results
+from league.models import League
+
+
+class Command(BaseCommand):
+    args = '<league id>'
+    help = "Benchmarks the standings hot paths and page renders for a league and writes the results as JSON."
+    option_list = BaseCommand.option_list + (
+        make_option('--repeat', dest='repeat', type='int', default=3, help='Runs per benchmark'),
+        make_option('--output', dest='output', help='File to write the JSON results to'),
+        make_option('--compare', dest='compare', help='Earlier results file to compare against'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("Give the id of the league to benchmark")
+        try:
+            league = League.objects.get(id=args[0])
+        except League.DoesNotExist:
+            raise CommandError("League %s does not exist" % args[0])
+        results = run_benchmarks(league, repeat=options['repeat'])
+        if options['output']:
+            write_results(results, options['output'])
+        else:
+            self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+        if options['compare']:
+            for name, before, after, queries_before, queries_after in compare(read_results(options['compare']),
+                                                                               results):
+                self.stdout.write("%-24s %9.4fs -> %9.4fs  %5d -> %5d queries" %
+                                  (name, before, after, queries_before, queries_after))
+        for path, scaling in sorted(results['template_scaling'].items()):
+            self.stdout.write("division list from %-8s %9.6fs and %5.1f queries per team" %
+                              (path, scaling['seconds_per_team'], scaling['queries_per_team']))
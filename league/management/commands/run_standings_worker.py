@@ -0,0 +1,28 @@
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand
+
+from league.jobs import work
+
+
+class Command(BaseCommand):
+    help = ("Runs queued standings recomputation jobs, rebuilding snapshots and re-rendering cached pages for "
+            "seasons whose gross updates, memberships or teams changed.")
+    option_list = BaseCommand.option_list + (
+        make_option('--once', action='store_true', dest='once', default=False,
+                    help='Exit once no jobs are due instead of polling'),
+        make_option('--interval', type='float', dest='interval', default=5.0,
+                    help='Seconds to wait between polls of an empty queue'),
+    )
+
+    def handle(self, *args, **options):
+        while True:
+            results = work()
+            for job, succeeded in results:
+                self.stdout.write("%s job %d for season %d (attempt %d)" %
+                                  ("Finished" if succeeded else "Failed", job.id, job.season_id, job.attempts))
+            if options['once']:
+                return
+            if not results:
+                time.sleep(options['interval'])
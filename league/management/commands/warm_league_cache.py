@@ -0,0 +1,34 @@
+from optparse import make_option
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.client import Client
+
+from league.caching import shared_cache, warm_season
+from league.models import Season
+
+
+class Command(BaseCommand):
+    help = "Renders the pages of active seasons so their pages and standings fragments are cached."
+    option_list = BaseCommand.option_list + (
+        make_option('--all', action='store_true', dest='all', default=False,
+                    help='Warm every season, not just the ones in progress'),
+    )
+
+    def handle(self, *args, **options):
+        if not shared_cache():
+            raise CommandError("The cache isn't shared with the web processes, so warming it would have no effect")
+        seasons = Season.objects.select_related('league')
+        if not options['all']:
+            today = datetime.date.today()
+            seasons = seasons.filter(start_date__lte=today, end_date__gte=today)
+        client = Client()
+        warmed = 0
+        for season in seasons:
+            pages = warm_season(season, client)
+            for url, status in pages:
+                if status != 200:
+                    self.stderr.write("%s returned %d" % (url, status))
+            warmed += len(pages)
+            self.stdout.write("Warmed %d pages for %s" % (len(pages), season))
+        self.stdout.write("Warmed %d pages in total" % warmed)
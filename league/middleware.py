@@ -0,0 +1,37 @@
+from league import ranking, routing
+
+
+class RankingCacheMiddleware(object):
+    """
+    Ranks each division at most once per request, however many teams ask for their position.
+    """
+
+    def process_request(self, request):
+        ranking.activate()
+
+    def process_response(self, request, response):
+        ranking.deactivate()
+        return response
+
+    def process_exception(self, request, exception):
+        ranking.deactivate()
+
+
+class ReplicaMiddleware(object):
+    """
+    Sends the reads of read-only requests to the league views to a replica, unless the browser wrote recently.
+    """
+
+    def process_request(self, request):
+        routing.deactivate()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.method in ('GET', 'HEAD') and routing.PIN_COOKIE not in request.COOKIES and
+                view_func.__module__ in routing.replica_views()):
+            routing.activate()
+
+    def process_response(self, request, response):
+        if request.method not in ('GET', 'HEAD') or routing.is_pinned():
+            response.set_cookie(routing.PIN_COOKIE, '1', max_age=routing.pin_seconds())
+        routing.deactivate()
+        return response
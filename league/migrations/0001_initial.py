@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'Movie'
+        db.create_table(u'league_movie', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('name', self.gf('django.db.models.fields.CharField')(max_length=255)),
+            ('release_date', self.gf('django.db.models.fields.DateField')()),
+        ))
+        db.send_create_signal(u'league', ['Movie'])
+
+        # Adding model 'MovieExternalId'
+        db.create_table(u'league_movieexternalid', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('movie', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['league.Movie'])),
+            ('source', self.gf('django.db.models.fields.TextField')(max_length=32)),
+            ('identifier', self.gf('django.db.models.fields.TextField')(max_length=255)),
+        ))
+        db.send_create_signal(u'league', ['MovieExternalId'])
+
+        # Adding model 'MovieGrossUpdate'
+        db.create_table(u'league_moviegrossupdate', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('movie', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['league.Movie'])),
+            ('date', self.gf('django.db.models.fields.DateField')()),
+            ('gross', self.gf('django.db.models.fields.BigIntegerField')()),
+            ('source', self.gf('django.db.models.fields.TextField')(max_length=255)),
+        ))
+        db.send_create_signal(u'league', ['MovieGrossUpdate'])
+
+        # Adding model 'MovieMembership'
+        db.create_table(u'league_moviemembership', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('movie', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['league.Movie'])),
+            ('team', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['league.Team'])),
+            ('price', self.gf('django.db.models.fields.IntegerField')()),
+        ))
+        db.send_create_signal(u'league', ['MovieMembership'])
+
+        # Adding model 'League'
+        db.create_table(u'league_league', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('commissioner', self.gf('django.db.models.fields.related.ForeignKey')(related_name='owned_leagues_set', to=orm['auth.User'])),
+            ('name', self.gf('django.db.models.fields.TextField')(max_length=50)),
+            ('short_description', self.gf('django.db.models.fields.TextField')(max_length=50)),
+            ('long_description', self.gf('django.db.models.fields.TextField')(max_length=255)),
+        ))
+        db.send_create_signal(u'league', ['League'])
+
+        # Adding M2M table for field players on 'League'
+        m2m_table_name = db.shorten_name(u'league_league_players')
+        db.create_table(m2m_table_name, (
+            ('id', models.AutoField(verbose_name='ID', primary_key=True, auto_created=True)),
+            ('league', models.ForeignKey(orm[u'league.league'], null=False)),
+            ('user', models.ForeignKey(orm[u'auth.user'], null=False))
+        ))
+        db.create_unique(m2m_table_name, ['league_id', 'user_id'])
+
+        # Adding model 'Season'
+        db.create_table(u'league_season', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('league', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['league.League'])),
+            ('start_date', self.gf('django.db.models.fields.DateField')()),
+            ('end_date', self.gf('django.db.models.fields.DateField')()),
+            ('name', self.gf('django.db.models.fields.TextField')(max_length=100)),
+        ))
+        db.send_create_signal(u'league', ['Season'])
+
+        # Adding M2M table for field movies on 'Season'
+        m2m_table_name = db.shorten_name(u'league_season_movies')
+        db.create_table(m2m_table_name, (
+            ('id', models.AutoField(verbose_name='ID', primary_key=True, auto_created=True)),
+            ('season', models.ForeignKey(orm[u'league.season'], null=False)),
+            ('movie', models.ForeignKey(orm[u'league.movie'], null=False))
+        ))
+        db.create_unique(m2m_table_name, ['season_id', 'movie_id'])
+
+        # Adding model 'Division'
+        db.create_table(u'league_division', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('season', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['league.Season'])),
+            ('name', self.gf('django.db.models.fields.TextField')(max_length=50)),
+            ('sort_order', self.gf('django.db.models.fields.PositiveSmallIntegerField')()),
+            ('currency_unit', self.gf('django.db.models.fields.TextField')(max_length=10)),
+            ('max_currency', self.gf('django.db.models.fields.IntegerField')()),
+            ('num_relegated', self.gf('django.db.models.fields.SmallIntegerField')()),
+            ('num_promoted', self.gf('django.db.models.fields.SmallIntegerField')()),
+        ))
+        db.send_create_signal(u'league', ['Division'])
+
+        # Adding model 'Team'
+        db.create_table(u'league_team', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('owner', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['auth.User'])),
+            ('division', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['league.Division'])),
+            ('name', self.gf('django.db.models.fields.TextField')(max_length=50, null=True, blank=True)),
+        ))
+        db.send_create_signal(u'league', ['Team'])
+
+
+    def backwards(self, orm):
+        # Deleting model 'Movie'
+        db.delete_table(u'league_movie')
+
+        # Deleting model 'MovieExternalId'
+        db.delete_table(u'league_movieexternalid')
+
+        # Deleting model 'MovieGrossUpdate'
+        db.delete_table(u'league_moviegrossupdate')
+
+        # Deleting model 'MovieMembership'
+        db.delete_table(u'league_moviemembership')
+
+        # Deleting model 'League'
+        db.delete_table(u'league_league')
+
+        # Removing M2M table for field players on 'League'
+        db.delete_table(db.shorten_name(u'league_league_players'))
+
+        # Deleting model 'Season'
+        db.delete_table(u'league_season')
+
+        # Removing M2M table for field movies on 'Season'
+        db.delete_table(db.shorten_name(u'league_season_movies'))
+
+        # Deleting model 'Division'
+        db.delete_table(u'league_division')
+
+        # Deleting model 'Team'
+        db.delete_table(u'league_team')
+
+
+    models = {
+        u'auth.group': {
+            'Meta': {'object_name': 'Group'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '80'}),
+            'permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'})
+        },
+        u'auth.permission': {
+            'Meta': {'ordering': "(u'content_type__app_label', u'content_type__model', u'codename')", 'unique_together': "((u'content_type', u'codename'),)", 'object_name': 'Permission'},
+            'codename': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contenttypes.ContentType']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'})
+        },
+        u'auth.user': {
+            'Meta': {'object_name': 'User'},
+            'date_joined': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '75', 'blank': 'True'}),
+            'first_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'groups': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.Group']", 'symmetrical': 'False', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_active': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'is_staff': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'is_superuser': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'last_login': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'last_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'user_permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'}),
+            'username': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '30'})
+        },
+        u'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        u'league.division': {
+            'Meta': {'ordering': "['sort_order']", 'object_name': 'Division'},
+            'currency_unit': ('django.db.models.fields.TextField', [], {'max_length': '10'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'max_currency': ('django.db.models.fields.IntegerField', [], {}),
+            'name': ('django.db.models.fields.TextField', [], {'max_length': '50'}),
+            'num_promoted': ('django.db.models.fields.SmallIntegerField', [], {}),
+            'num_relegated': ('django.db.models.fields.SmallIntegerField', [], {}),
+            'season': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Season']"}),
+            'sort_order': ('django.db.models.fields.PositiveSmallIntegerField', [], {})
+        },
+        u'league.league': {
+            'Meta': {'object_name': 'League'},
+            'commissioner': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'owned_leagues_set'", 'to': u"orm['auth.User']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'long_description': ('django.db.models.fields.TextField', [], {'max_length': '255'}),
+            'name': ('django.db.models.fields.TextField', [], {'max_length': '50'}),
+            'players': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.User']", 'symmetrical': 'False'}),
+            'short_description': ('django.db.models.fields.TextField', [], {'max_length': '50'})
+        },
+        u'league.movie': {
+            'Meta': {'ordering': "['release_date']", 'object_name': 'Movie'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'release_date': ('django.db.models.fields.DateField', [], {})
+        },
+        u'league.movieexternalid': {
+            'Meta': {'object_name': 'MovieExternalId'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'identifier': ('django.db.models.fields.TextField', [], {'max_length': '255'}),
+            'movie': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Movie']"}),
+            'source': ('django.db.models.fields.TextField', [], {'max_length': '32'})
+        },
+        u'league.moviegrossupdate': {
+            'Meta': {'object_name': 'MovieGrossUpdate'},
+            'date': ('django.db.models.fields.DateField', [], {}),
+            'gross': ('django.db.models.fields.BigIntegerField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'movie': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Movie']"}),
+            'source': ('django.db.models.fields.TextField', [], {'max_length': '255'})
+        },
+        u'league.moviemembership': {
+            'Meta': {'ordering': "['movie']", 'object_name': 'MovieMembership'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'movie': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Movie']"}),
+            'price': ('django.db.models.fields.IntegerField', [], {}),
+            'team': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Team']"})
+        },
+        u'league.season': {
+            'Meta': {'object_name': 'Season'},
+            'end_date': ('django.db.models.fields.DateField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'league': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.League']"}),
+            'movies': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['league.Movie']", 'symmetrical': 'False'}),
+            'name': ('django.db.models.fields.TextField', [], {'max_length': '100'}),
+            'start_date': ('django.db.models.fields.DateField', [], {})
+        },
+        u'league.team': {
+            'Meta': {'object_name': 'Team'},
+            'division': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Division']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'movies': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['league.Movie']", 'through': u"orm['league.MovieMembership']", 'symmetrical': 'False'}),
+            'name': ('django.db.models.fields.TextField', [], {'max_length': '50', 'null': 'True', 'blank': 'True'}),
+            'owner': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['auth.User']"})
+        }
+    }
+
+    complete_apps = ['league']
\ No newline at end of file
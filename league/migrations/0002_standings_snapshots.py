@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'StandingsSnapshot'
+        db.create_table(u'league_standingssnapshot', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('team', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['league.Team'])),
+            ('date', self.gf('django.db.models.fields.DateField')()),
+            ('value', self.gf('django.db.models.fields.BigIntegerField')()),
+            ('cost', self.gf('django.db.models.fields.IntegerField')()),
+            ('position', self.gf('django.db.models.fields.PositiveSmallIntegerField')()),
+        ))
+        db.send_create_signal(u'league', ['StandingsSnapshot'])
+
+        # Adding unique constraint on 'StandingsSnapshot', fields ['team', 'date']
+        db.create_unique(u'league_standingssnapshot', ['team_id', 'date'])
+
+        # Adding model 'StandingsSnapshotCheckpoint'
+        db.create_table(u'league_standingssnapshotcheckpoint', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('last_update_id', self.gf('django.db.models.fields.IntegerField')(default=0)),
+        ))
+        db.send_create_signal(u'league', ['StandingsSnapshotCheckpoint'])
+
+
+    def backwards(self, orm):
+        # Removing unique constraint on 'StandingsSnapshot', fields ['team', 'date']
+        db.delete_unique(u'league_standingssnapshot', ['team_id', 'date'])
+
+        # Deleting model 'StandingsSnapshot'
+        db.delete_table(u'league_standingssnapshot')
+
+        # Deleting model 'StandingsSnapshotCheckpoint'
+        db.delete_table(u'league_standingssnapshotcheckpoint')
+
+
+    models = {
+        u'auth.group': {
+            'Meta': {'object_name': 'Group'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '80'}),
+            'permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'})
+        },
+        u'auth.permission': {
+            'Meta': {'ordering': "(u'content_type__app_label', u'content_type__model', u'codename')", 'unique_together': "((u'content_type', u'codename'),)", 'object_name': 'Permission'},
+            'codename': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contenttypes.ContentType']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'})
+        },
+        u'auth.user': {
+            'Meta': {'object_name': 'User'},
+            'date_joined': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '75', 'blank': 'True'}),
+            'first_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'groups': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.Group']", 'symmetrical': 'False', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_active': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'is_staff': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'is_superuser': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'last_login': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'last_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'user_permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'}),
+            'username': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '30'})
+        },
+        u'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        u'league.division': {
+            'Meta': {'ordering': "['sort_order']", 'object_name': 'Division'},
+            'currency_unit': ('django.db.models.fields.TextField', [], {'max_length': '10'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'max_currency': ('django.db.models.fields.IntegerField', [], {}),
+            'name': ('django.db.models.fields.TextField', [], {'max_length': '50'}),
+            'num_promoted': ('django.db.models.fields.SmallIntegerField', [], {}),
+            'num_relegated': ('django.db.models.fields.SmallIntegerField', [], {}),
+            'season': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Season']"}),
+            'sort_order': ('django.db.models.fields.PositiveSmallIntegerField', [], {})
+        },
+        u'league.league': {
+            'Meta': {'object_name': 'League'},
+            'commissioner': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'owned_leagues_set'", 'to': u"orm['auth.User']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'long_description': ('django.db.models.fields.TextField', [], {'max_length': '255'}),
+            'name': ('django.db.models.fields.TextField', [], {'max_length': '50'}),
+            'players': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.User']", 'symmetrical': 'False'}),
+            'short_description': ('django.db.models.fields.TextField', [], {'max_length': '50'})
+        },
+        u'league.movie': {
+            'Meta': {'ordering': "['release_date']", 'object_name': 'Movie'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'release_date': ('django.db.models.fields.DateField', [], {})
+        },
+        u'league.movieexternalid': {
+            'Meta': {'object_name': 'MovieExternalId'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'identifier': ('django.db.models.fields.TextField', [], {'max_length': '255'}),
+            'movie': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Movie']"}),
+            'source': ('django.db.models.fields.TextField', [], {'max_length': '32'})
+        },
+        u'league.moviegrossupdate': {
+            'Meta': {'object_name': 'MovieGrossUpdate'},
+            'date': ('django.db.models.fields.DateField', [], {}),
+            'gross': ('django.db.models.fields.BigIntegerField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'movie': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Movie']"}),
+            'source': ('django.db.models.fields.TextField', [], {'max_length': '255'})
+        },
+        u'league.moviemembership': {
+            'Meta': {'ordering': "['movie']", 'object_name': 'MovieMembership'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'movie': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Movie']"}),
+            'price': ('django.db.models.fields.IntegerField', [], {}),
+            'team': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Team']"})
+        },
+        u'league.season': {
+            'Meta': {'object_name': 'Season'},
+            'end_date': ('django.db.models.fields.DateField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'league': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.League']"}),
+            'movies': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['league.Movie']", 'symmetrical': 'False'}),
+            'name': ('django.db.models.fields.TextField', [], {'max_length': '100'}),
+            'start_date': ('django.db.models.fields.DateField', [], {})
+        },
+        u'league.standingssnapshot': {
+            'Meta': {'ordering': "['date', 'position']", 'unique_together': "(('team', 'date'),)", 'object_name': 'StandingsSnapshot'},
+            'cost': ('django.db.models.fields.IntegerField', [], {}),
+            'date': ('django.db.models.fields.DateField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'position': ('django.db.models.fields.PositiveSmallIntegerField', [], {}),
+            'team': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Team']"}),
+            'value': ('django.db.models.fields.BigIntegerField', [], {})
+        },
+        u'league.standingssnapshotcheckpoint': {
+            'Meta': {'object_name': 'StandingsSnapshotCheckpoint'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_update_id': ('django.db.models.fields.IntegerField', [], {'default': '0'})
+        },
+        u'league.team': {
+            'Meta': {'object_name': 'Team'},
+            'division': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Division']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'movies': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['league.Movie']", 'through': u"orm['league.MovieMembership']", 'symmetrical': 'False'}),
+            'name': ('django.db.models.fields.TextField', [], {'max_length': '50', 'null': 'True', 'blank': 'True'}),
+            'owner': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['auth.User']"})
+        }
+    }
+
+    complete_apps = ['league']
\ No newline at end of file
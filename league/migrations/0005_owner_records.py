@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'ClosedSeason'
+        db.create_table(u'league_closedseason', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('season', self.gf('django.db.models.fields.related.OneToOneField')(to=orm['league.Season'], unique=True)),
+            ('closed_at', self.gf('django.db.models.fields.DateTimeField')(auto_now_add=True, blank=True)),
+        ))
+        db.send_create_signal(u'league', ['ClosedSeason'])
+
+        # Adding model 'OwnerRecord'
+        db.create_table(u'league_ownerrecord', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('league', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['league.League'])),
+            ('owner', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['auth.User'])),
+            ('seasons', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('total_value', self.gf('django.db.models.fields.BigIntegerField')(default=0)),
+            ('total_cost', self.gf('django.db.models.fields.BigIntegerField')(default=0)),
+            ('efficiency', self.gf('django.db.models.fields.BigIntegerField')(default=0)),
+            ('titles', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('promotions', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('relegations', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+        ))
+        db.send_create_signal(u'league', ['OwnerRecord'])
+
+        # Adding unique constraint on 'OwnerRecord', fields ['league', 'owner']
+        db.create_unique(u'league_ownerrecord', ['league_id', 'owner_id'])
+
+
+    def backwards(self, orm):
+        # Removing unique constraint on 'OwnerRecord', fields ['league', 'owner']
+        db.delete_unique(u'league_ownerrecord', ['league_id', 'owner_id'])
+
+        # Deleting model 'ClosedSeason'
+        db.delete_table(u'league_closedseason')
+
+        # Deleting model 'OwnerRecord'
+        db.delete_table(u'league_ownerrecord')
+
+
+    models = {
+        u'auth.group': {
+            'Meta': {'object_name': 'Group'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '80'}),
+            'permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'})
+        },
+        u'auth.permission': {
+            'Meta': {'ordering': "(u'content_type__app_label', u'content_type__model', u'codename')", 'unique_together': "((u'content_type', u'codename'),)", 'object_name': 'Permission'},
+            'codename': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contenttypes.ContentType']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'})
+        },
+        u'auth.user': {
+            'Meta': {'object_name': 'User'},
+            'date_joined': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '75', 'blank': 'True'}),
+            'first_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'groups': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.Group']", 'symmetrical': 'False', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_active': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'is_staff': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'is_superuser': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'last_login': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'last_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'user_permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'}),
+            'username': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '30'})
+        },
+        u'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        u'league.closedseason': {
+            'Meta': {'object_name': 'ClosedSeason'},
+            'closed_at': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'season': ('django.db.models.fields.related.OneToOneField', [], {'to': u"orm['league.Season']", 'unique': 'True'})
+        },
+        u'league.division': {
+            'Meta': {'ordering': "['sort_order']", 'object_name': 'Division'},
+            'currency_unit': ('django.db.models.fields.TextField', [], {'max_length': '10'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'max_currency': ('django.db.models.fields.IntegerField', [], {}),
+            'name': ('django.db.models.fields.TextField', [], {'max_length': '50'}),
+            'num_promoted': ('django.db.models.fields.SmallIntegerField', [], {}),
+            'num_relegated': ('django.db.models.fields.SmallIntegerField', [], {}),
+            'season': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Season']"}),
+            'sort_order': ('django.db.models.fields.PositiveSmallIntegerField', [], {})
+        },
+        u'league.league': {
+            'Meta': {'object_name': 'League'},
+            'commissioner': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'owned_leagues_set'", 'to': u"orm['auth.User']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'long_description': ('django.db.models.fields.TextField', [], {'max_length': '255'}),
+            'name': ('django.db.models.fields.TextField', [], {'max_length': '50'}),
+            'players': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.User']", 'symmetrical': 'False'}),
+            'short_description': ('django.db.models.fields.TextField', [], {'max_length': '50'})
+        },
+        u'league.movie': {
+            'Meta': {'ordering': "['release_date']", 'object_name': 'Movie'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'release_date': ('django.db.models.fields.DateField', [], {})
+        },
+        u'league.movieexternalid': {
+            'Meta': {'unique_together': "(('source', 'identifier'),)", 'object_name': 'MovieExternalId'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'identifier': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'movie': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Movie']"}),
+            'source': ('django.db.models.fields.CharField', [], {'max_length': '32'})
+        },
+        u'league.moviegrossupdate': {
+            'Meta': {'unique_together': "(('movie', 'date', 'source'),)", 'object_name': 'MovieGrossUpdate', 'index_together': "[['movie', 'source', 'date']]"},
+            'date': ('django.db.models.fields.DateField', [], {}),
+            'gross': ('django.db.models.fields.BigIntegerField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'movie': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Movie']"}),
+            'source': ('django.db.models.fields.CharField', [], {'max_length': '255'})
+        },
+        u'league.moviemembership': {
+            'Meta': {'ordering': "['movie']", 'object_name': 'MovieMembership'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'movie': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Movie']"}),
+            'price': ('django.db.models.fields.IntegerField', [], {}),
+            'team': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Team']"})
+        },
+        u'league.ownerrecord': {
+            'Meta': {'unique_together': "(('league', 'owner'),)", 'object_name': 'OwnerRecord'},
+            'efficiency': ('django.db.models.fields.BigIntegerField', [], {'default': '0'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'league': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.League']"}),
+            'owner': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['auth.User']"}),
+            'promotions': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'relegations': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'seasons': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'titles': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'total_cost': ('django.db.models.fields.BigIntegerField', [], {'default': '0'}),
+            'total_value': ('django.db.models.fields.BigIntegerField', [], {'default': '0'})
+        },
+        u'league.season': {
+            'Meta': {'object_name': 'Season'},
+            'end_date': ('django.db.models.fields.DateField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'league': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.League']"}),
+            'movies': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['league.Movie']", 'symmetrical': 'False'}),
+            'name': ('django.db.models.fields.TextField', [], {'max_length': '100'}),
+            'start_date': ('django.db.models.fields.DateField', [], {})
+        },
+        u'league.standingsjob': {
+            'Meta': {'ordering': "['run_after', 'id']", 'object_name': 'StandingsJob', 'index_together': "[['status', 'run_after']]"},
+            'attempts': ('django.db.models.fields.PositiveSmallIntegerField', [], {'default': '0'}),
+            'created': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'from_date': ('django.db.models.fields.DateField', [], {'null': 'True', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_error': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'run_after': ('django.db.models.fields.DateTimeField', [], {}),
+            'season': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Season']"}),
+            'status': ('django.db.models.fields.CharField', [], {'default': "'pending'", 'max_length': '10'}),
+            'updated': ('django.db.models.fields.DateTimeField', [], {'auto_now': 'True', 'blank': 'True'})
+        },
+        u'league.standingssnapshot': {
+            'Meta': {'ordering': "['date', 'position']", 'unique_together': "(('team', 'date'),)", 'object_name': 'StandingsSnapshot'},
+            'cost': ('django.db.models.fields.IntegerField', [], {}),
+            'date': ('django.db.models.fields.DateField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'position': ('django.db.models.fields.PositiveSmallIntegerField', [], {}),
+            'team': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Team']"}),
+            'value': ('django.db.models.fields.BigIntegerField', [], {})
+        },
+        u'league.standingssnapshotcheckpoint': {
+            'Meta': {'object_name': 'StandingsSnapshotCheckpoint'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_update_id': ('django.db.models.fields.IntegerField', [], {'default': '0'})
+        },
+        u'league.team': {
+            'Meta': {'object_name': 'Team'},
+            'division': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['league.Division']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'movies': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['league.Movie']", 'through': u"orm['league.MovieMembership']", 'symmetrical': 'False'}),
+            'name': ('django.db.models.fields.TextField', [], {'max_length': '50', 'null': 'True', 'blank': 'True'}),
+            'owner': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['auth.User']"})
+        }
+    }
+
+    complete_apps = ['league']
\ No newline at end of file
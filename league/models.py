@@ -1,11 +1,15 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+
+from league import caching, jobs, reconcile, routing
+from league.gross_index import gross_index, update_deleted, update_saved
 
 import datetime
 
 
 class Movie(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, db_index=True)
     release_date = models.DateField()
 
     def _get_source_filtered_updates(self, source=None):
@@ -13,13 +17,28 @@ class Movie(models.Model):
             return self.moviegrossupdate_set.filter(source=source)
         return self.moviegrossupdate_set
 
+    def _get_canonical_value(self, date=None):
+        points = self.canonicalgross_set.order_by('-date')
+        if date is not None:
+            points = points.filter(date__lte=date)
+        grosses = list(points.values_list('gross', flat=True)[:1])
+        return grosses[0] if grosses else 0
+
     def get_value(self, source=None):
+        if gross_index.enabled():
+            return gross_index.latest_value(self.id, source=source)
+        if not source:
+            return self._get_canonical_value()
         source_filtered_updates = self._get_source_filtered_updates(source=source)
         if source_filtered_updates.count() > 0:
             return source_filtered_updates.latest().gross
         return 0
 
     def get_value_on_date(self, date, source=None):
+        if gross_index.enabled():
+            return gross_index.value_on_date(self.id, date, source=source)
+        if not source:
+            return self._get_canonical_value(date)
         source_filtered_updates = self._get_source_filtered_updates(source=source)
         date_filtered_updates = source_filtered_updates.exclude(date__gt=date)
         if date_filtered_updates.count() > 0:
@@ -35,18 +54,36 @@ class Movie(models.Model):
 
 class MovieExternalId(models.Model):
     movie = models.ForeignKey(Movie)
-    source = models.TextField(max_length=32)
-    identifier = models.TextField(max_length=255)
+    source = models.CharField(max_length=32)
+    identifier = models.CharField(max_length=255)
+
+    class Meta:
+        unique_together = ('source', 'identifier')
 
 
 class MovieGrossUpdate(models.Model):
     movie = models.ForeignKey(Movie)
     date = models.DateField()
     gross = models.BigIntegerField()
-    source = models.TextField(max_length=255)
+    source = models.CharField(max_length=255)
 
     class Meta:
         get_latest_by = 'date'
+        # The unique index also serves lookups by (movie, date) across all sources
+        unique_together = ('movie', 'date', 'source')
+        index_together = [['movie', 'source', 'date']]
+
+
+class CanonicalGross(models.Model):
+    """
+    A day a movie's gross reconciled across all sources changed, kept up to date by league.reconcile.
+    """
+    movie = models.ForeignKey(Movie)
+    date = models.DateField()
+    gross = models.BigIntegerField()
+
+    class Meta:
+        unique_together = ('movie', 'date')
 
 
 class MovieMembership(models.Model):
@@ -56,10 +93,14 @@ class MovieMembership(models.Model):
 
     def value_on_team(self):
         end_date = self.team.division.season.end_date
+        if gross_index.enabled():
+            return gross_index.value_on_date(self.movie_id, end_date)
         return self.movie.get_value_on_date(end_date)
 
     def efficiency(self):
-        return self.value_on_team()/self.price
+        if self.price > 0:
+            return self.value_on_team() / float(self.price)
+        return None
 
     class Meta:
         ordering = ['movie']
@@ -84,19 +125,23 @@ class Season(models.Model):
     movies = models.ManyToManyField(Movie)
 
     def has_ended(self):
-        return datetime.date.today > self.end_date
-
-    def _annotate_values(self, movie_list):
-        annotated_movies = []
-        for movie in movie_list:
-            annotated_movies.append((movie, movie.get_value_on_date(self.end_date)))
-        return annotated_movies
+        return datetime.date.today() > self.end_date
+
+    def movie_board(self):
+        """
+        Returns (released, upcoming) lists of (movie, end date gross), computed once per instance so the released
+        and upcoming lists of a page share the same two queries.
+        """
+        if not hasattr(self, '_movie_board'):
+            from league.standings import season_movie_board
+            self._movie_board = season_movie_board(self)
+        return self._movie_board
 
     def released_movies(self):
-        return self._annotate_values(self.movies.exclude(release_date__gt=datetime.date.today()))
+        return self.movie_board()[0]
 
     def unreleased_movies(self):
-        return self._annotate_values(self.movies.filter(release_date__gt=datetime.date.today()))
+        return self.movie_board()[1]
 
     def __unicode__(self):
         return self.name + ", " + str(self.start_date) + " to " + str(self.end_date)
@@ -115,8 +160,8 @@ class Division(models.Model):
     num_promoted = models.SmallIntegerField()
 
     def sorted_teams(self):
-        return sorted(sorted(list(Team.objects.filter(division=self)), key=lambda x: x.get_team_cost()),
-                      key=lambda x: x.get_team_value(), reverse=True)
+        from league.standings import division_standings
+        return [row.team for row in division_standings(self)]
 
     def get_leader(self):
         top_teams = self.sorted_teams()
@@ -151,6 +196,8 @@ class Team(models.Model):
         return cost
 
     def get_team_value(self):
+        if gross_index.enabled():
+            return self.get_team_value_for_date(self.division.season.end_date)
         value = 0
         for movie in self.movies.all():
             if movie.moviegrossupdate_set.count() > 0:
@@ -158,6 +205,10 @@ class Team(models.Model):
         return value
 
     def get_team_value_for_date(self, date):
+        if gross_index.enabled():
+            movie_ids = list(self.moviemembership_set.values_list('movie_id', flat=True))
+            values = gross_index.values_on_date(movie_ids, date)
+            return sum(values[movie_id] for movie_id in movie_ids)
         value = 0
         for movie in self.movies.all():
             value += movie.get_value_on_date(date)
@@ -170,11 +221,8 @@ class Team(models.Model):
             return self.owner.username
 
     def get_position(self, reverse=False):
-        sorted_division = self.division.sorted_teams()
-        if reverse:
-            sorted_division.reverse()
-        position = sorted_division.index(self)
-        return position
+        from league.ranking import team_position
+        return team_position(self, reverse=reverse)
 
     def is_promoted(self):
         return self.get_position() < self.division.num_promoted
@@ -183,4 +231,109 @@ class Team(models.Model):
         return self.get_position(reverse=True) < self.division.num_relegated
 
     def __unicode__(self):
-        return self.get_name()
\ No newline at end of file
+        return self.get_name()
+
+
+class StandingsSnapshot(models.Model):
+    team = models.ForeignKey(Team)
+    date = models.DateField()
+    value = models.BigIntegerField()
+    cost = models.IntegerField()
+    position = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ('team', 'date')
+        ordering = ['date', 'position']
+
+
+class StandingsSnapshotCheckpoint(models.Model):
+    last_update_id = models.IntegerField(default=0)
+
+
+class OwnerRecord(models.Model):
+    """
+    An owner's all-time totals in a league, summed over every closed season.
+    """
+    league = models.ForeignKey(League)
+    owner = models.ForeignKey(User)
+    seasons = models.PositiveIntegerField(default=0)
+    total_value = models.BigIntegerField(default=0)
+    total_cost = models.BigIntegerField(default=0)
+    # Value per unit of currency spent, over all seasons
+    efficiency = models.BigIntegerField(default=0)
+    titles = models.PositiveIntegerField(default=0)
+    promotions = models.PositiveIntegerField(default=0)
+    relegations = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('league', 'owner')
+
+
+class ClosedSeason(models.Model):
+    """
+    Marks a season whose results have been added to its league's OwnerRecords.
+    """
+    season = models.OneToOneField(Season)
+    closed_at = models.DateTimeField(auto_now_add=True)
+
+
+class StandingsJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    season = models.ForeignKey(Season)
+    # Earliest day whose standings changed, or None to recompute the whole season
+    from_date = models.DateField(blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    # The season's id while the job is pending, so a season can't have two pending jobs
+    pending_season = models.IntegerField(blank=True, null=True, unique=True, editable=False)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField()
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        index_together = [['status', 'run_after']]
+        ordering = ['run_after', 'id']
+
+
+class SeasonVersion(models.Model):
+    """
+    Identifies the current data of a season, for the cache keys and validators of the pages showing it. Replaced
+    whenever anything the season's pages show changes, by whichever process changed it.
+    """
+    season = models.OneToOneField(Season, primary_key=True, related_name='version')
+    token = models.CharField(max_length=32)
+    modified = models.DateTimeField()
+
+
+# Pin the rest of the request to the primary before anything is saved, so the handlers below read from it. Deletes
+# aren't watched, since delete or m2m_changed receivers for every model would stop queryset deletes being done in
+# one query, and only requests that aren't GETs, which are pinned anyway, delete anything.
+pre_save.connect(routing.model_written)
+m2m_changed.connect(routing.model_written, sender=Season.movies.through)
+
+# Reconcile first, so the handlers after it see the movie's new canonical series
+post_save.connect(reconcile.gross_update_changed, sender=MovieGrossUpdate)
+post_delete.connect(reconcile.gross_update_changed, sender=MovieGrossUpdate)
+post_save.connect(update_saved, sender=MovieGrossUpdate)
+post_delete.connect(update_deleted, sender=MovieGrossUpdate)
+
+for signal in (post_save, post_delete):
+    signal.connect(caching.gross_update_changed, sender=MovieGrossUpdate)
+    signal.connect(caching.membership_changed, sender=MovieMembership)
+    signal.connect(caching.team_changed, sender=Team)
+    signal.connect(caching.division_changed, sender=Division)
+    signal.connect(caching.season_changed, sender=Season)
+post_save.connect(caching.league_changed, sender=League)
+m2m_changed.connect(caching.season_movies_changed, sender=Season.movies.through)
+
+for signal in (post_save, post_delete):
+    signal.connect(jobs.gross_update_changed, sender=MovieGrossUpdate)
+    signal.connect(jobs.membership_changed, sender=MovieMembership)
+    signal.connect(jobs.team_changed, sender=Team)
+pre_save.connect(jobs.team_moving, sender=Team)
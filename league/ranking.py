@@ -0,0 +1,55 @@
+"""
+Request-scoped cache of division rankings.
+
+Team.get_position(), is_promoted() and is_relegated() each need their division ranked. While a RankingCache is
+active, set up per request by RankingCacheMiddleware, each division is ranked once per date and every later position
+lookup is a dict access.
+"""
+
+import threading
+
+from league.standings import division_standings
+
+_active = threading.local()
+
+
+class RankingCache(object):
+
+    def __init__(self):
+        self._rankings = {}
+
+    def ranking(self, division, date=None):
+        """
+        Returns a dict of team id to (position, division size) for the division valued on the date, or at the end of
+        its season if no date is given.
+        """
+        key = (division.id, date)
+        if key not in self._rankings:
+            rows = division_standings(division, date=date)
+            self._rankings[key] = dict((row.team.id, (row.position, row.division_size)) for row in rows)
+        return self._rankings[key]
+
+
+def activate():
+    _active.cache = RankingCache()
+
+
+def deactivate():
+    _active.cache = None
+
+
+def get_cache():
+    """
+    Returns the active RankingCache, or a throwaway one when no request has activated one.
+    """
+    return getattr(_active, 'cache', None) or RankingCache()
+
+
+def team_position(team, reverse=False, date=None):
+    """
+    Returns the team's zero-based position in its division, counted from the bottom if reverse is true.
+    """
+    position, division_size = get_cache().ranking(team.division, date=date)[team.id]
+    if reverse:
+        return division_size - 1 - position
+    return position
@@ -0,0 +1,107 @@
+"""
+Reconciliation of gross updates from several sources into one canonical series per movie.
+
+On each day a movie has updates, the update of the highest priority source is taken, the newest one if that source
+reported twice. Sources are ranked by settings.LEAGUE_GROSS_SOURCES, highest priority first; sources it doesn't
+list rank below every listed one, equally. A gross is cumulative, so the series is kept monotonic: a day reporting
+less than the series already reached keeps the earlier value. Only the days the canonical gross changes are stored,
+as CanonicalGross rows, so a movie's gross on any date is the latest row on or before it.
+
+Saving or deleting a gross update reconciles its movie straight away; writes that bypass model signals call
+reconcile_movies() themselves.
+"""
+
+from django.conf import settings
+from django.db import transaction
+
+from league.gross_index import gross_index
+
+BATCH_SIZE = 500
+
+
+def source_ranks():
+    """
+    Returns a function giving each source name its rank, lower ranks winning.
+    """
+    sources = list(getattr(settings, 'LEAGUE_GROSS_SOURCES', ()))
+    ranks = dict((source, rank) for rank, source in enumerate(sources))
+    return lambda source: ranks.get(source, len(sources))
+
+
+def canonical_points(updates, rank=None):
+    """
+    Returns the (date, gross) points where the canonical series changes, given a movie's (date, id, source, gross)
+    updates in date order.
+    """
+    rank = rank or source_ranks()
+    points = []
+    value = 0
+    chosen = None
+    for date, update_id, source, gross in updates:
+        key = (rank(source), -update_id)
+        if chosen is None or chosen[0] != date:
+            if chosen is not None and chosen[2] > value:
+                value = chosen[2]
+                points.append((chosen[0], value))
+            chosen = (date, key, gross)
+        elif key < chosen[1]:
+            chosen = (date, key, gross)
+    if chosen is not None and chosen[2] > value:
+        points.append((chosen[0], chosen[2]))
+    return points
+
+
+def _replace_points(movie_ids, points):
+    from league.models import CanonicalGross
+    CanonicalGross.objects.filter(movie__in=movie_ids).delete()
+    CanonicalGross.objects.bulk_create(points, batch_size=BATCH_SIZE)
+
+
+def reconcile_movies(movie_ids):
+    """
+    Recomputes the canonical series of the movies and returns the number of points stored. Runs a query to read
+    each chunk of movies' updates and two to replace their points, in the caller's transaction if there is one and
+    otherwise in one of their own.
+    """
+    from league.models import CanonicalGross, MovieGrossUpdate
+    from league.standings import MOVIE_ID_CHUNK_SIZE
+    rank = source_ranks()
+    movie_ids = sorted(set(movie_ids))
+    stored = 0
+    for start in range(0, len(movie_ids), MOVIE_ID_CHUNK_SIZE):
+        chunk = movie_ids[start:start + MOVIE_ID_CHUNK_SIZE]
+        updates_by_movie = dict((movie_id, []) for movie_id in chunk)
+        updates = MovieGrossUpdate.objects.filter(movie__in=chunk).order_by('movie', 'date', 'id')
+        for movie_id, date, update_id, source, gross in updates.values_list('movie_id', 'date', 'id', 'source',
+                                                                            'gross'):
+            updates_by_movie[movie_id].append((date, update_id, source, gross))
+        points_by_movie = dict((movie_id, canonical_points(movie_updates, rank))
+                               for movie_id, movie_updates in updates_by_movie.items())
+        points = [CanonicalGross(movie_id=movie_id, date=date, gross=gross)
+                  for movie_id, movie_points in points_by_movie.items() for date, gross in movie_points]
+        if transaction.is_managed():
+            # A nested commit_on_success would commit the caller's transaction, which may also still roll back, so
+            # the index reloads the movies rather than take the new points
+            _replace_points(chunk, points)
+            for movie_id in chunk:
+                gross_index.invalidate_movie(movie_id)
+        else:
+            with transaction.commit_on_success():
+                _replace_points(chunk, points)
+            for movie_id, movie_points in points_by_movie.items():
+                gross_index.canonical_changed(movie_id, movie_points)
+        stored += len(points)
+    return stored
+
+
+def reconcile_all():
+    """
+    Recomputes every movie's canonical series, for a change of source priorities.
+    """
+    from league.models import Movie
+    return reconcile_movies(Movie.objects.values_list('id', flat=True))
+
+
+def gross_update_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reconcile_movies([instance.movie_id])
@@ -0,0 +1,242 @@
+"""
+Import of league exports.
+
+Loads the CSV or JSON lines files written by export_league into the database as a new league, a table at a time in
+export order, streaming each file and inserting its rows with executemany in batches. Rows get new ids: the league,
+seasons, divisions, teams and movies are given ids after the highest ones in use, and an id remapping table per
+table translates the references of the rows loaded after them. Constraint checks are deferred until every table is
+loaded, as loaddata does, and the whole import runs in one transaction. Owners, players and the commissioner are
+matched to users by username, and users that don't exist are created without a usable password. A movie's external
+identifiers are unique across the database, so those already held by another movie, such as the original of a
+league imported into the database it was exported from, are left with it.
+
+Bulk inserts skip model signals, so the imported movies' canonical grosses are reconciled and the imported seasons'
+versions bumped once at the end instead.
+"""
+
+import csv
+import glob
+import itertools
+import json
+import os
+import re
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from league import caching, jobs, reconcile
+from league.export import EXTENSIONS, TABLES
+from league.models import (Division, League, Movie, MovieExternalId, MovieGrossUpdate, MovieMembership, Season,
+                           Team)
+
+BATCH_SIZE = 2000
+
+MODELS = {
+    'league': League,
+    'players': League.players.through,
+    'seasons': Season,
+    'divisions': Division,
+    'teams': Team,
+    'movies': Movie,
+    'external_ids': MovieExternalId,
+    'season_movies': Season.movies.through,
+    'memberships': MovieMembership,
+    'grosses': MovieGrossUpdate,
+}
+# Columns holding the exported id of a row in another table
+REFERENCES = {'league': 'league', 'season': 'seasons', 'division': 'divisions', 'team': 'teams', 'movie': 'movies'}
+# Columns holding a username
+USER_COLUMNS = ('owner', 'commissioner', 'user')
+# Tables other tables refer to, whose ids are remapped
+REMAPPED = ('league', 'seasons', 'divisions', 'teams', 'movies')
+
+
+def export_paths(directory, export_format, league_id=None):
+    """
+    Returns a dict of table name to the path of its file in the directory, for the league with the exported id, or
+    the only league exported there if no id is given.
+    """
+    extension = EXTENSIONS[export_format]
+    if league_id is None:
+        pattern = re.compile(r'league-(\d+)-league\.%s$' % re.escape(extension))
+        ids = [pattern.search(path).group(1)
+               for path in glob.glob(os.path.join(directory, 'league-*-league.%s' % extension))]
+        if len(ids) != 1:
+            raise ValueError("Expected one exported league in %s, found %d" % (directory, len(ids)))
+        league_id = ids[0]
+    paths = {}
+    for name, columns, queryset in TABLES:
+        path = os.path.join(directory, 'league-%s-%s.%s' % (league_id, name, extension))
+        if not os.path.exists(path):
+            raise ValueError("%s is missing" % path)
+        paths[name] = path
+    return paths
+
+
+def read_rows(path, export_format):
+    """
+    Yields a dict of column to value for every row of an exported file. CSV values are left as UTF-8 encoded strings.
+    """
+    with open(path, 'rb') as exported:
+        if export_format == 'jsonl':
+            for line in exported:
+                yield json.loads(line)
+        else:
+            for row in csv.DictReader(exported):
+                yield row
+
+
+def _users(paths, export_format):
+    usernames = set()
+    for name in ('league', 'players', 'teams'):
+        for row in read_rows(paths[name], export_format):
+            usernames.update(_text(row[column]) for column in USER_COLUMNS if column in row)
+    existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    User.objects.bulk_create([User(username=username, password='!') for username in usernames - existing])
+    return dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+
+
+def _next_id(model):
+    return (model.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+
+
+def _text(value):
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    return value
+
+
+def _field_converter(field):
+    if field.get_internal_type().endswith('IntegerField'):
+        return int
+    # Text, and dates, which exports hold in ISO format that every backend takes as it is
+    return _text
+
+
+def _lookup(mapping, key, name, column, kind):
+    try:
+        return mapping[key]
+    except KeyError:
+        raise ValueError("%s.%s refers to unknown %s %s" % (name, column, kind, key))
+
+
+def _converters(name, columns, ids, users):
+    """
+    Returns an (exported column, database column, function) triple per column other than the id, the function
+    turning an exported value into the value to save, or raising ValueError for a reference to a row the export
+    doesn't hold. Fields are looked up once per table rather than once per row.
+    """
+    model = MODELS[name]
+    converters = []
+    for column in columns:
+        if column == 'id':
+            continue
+        elif column in REFERENCES:
+            converters.append((column, column + '_id',
+                               lambda value, column=column, mapping=ids[REFERENCES[column]]:
+                               _lookup(mapping, int(value), name, column, REFERENCES[column])))
+        elif column in USER_COLUMNS:
+            converters.append((column, column + '_id',
+                               lambda value, column=column: _lookup(users, _text(value), name, column, 'user')))
+        else:
+            field = model._meta.get_field(column)
+            convert = _field_converter(field)
+            if field.null:
+                convert = lambda value, convert=convert: None if value is None or value == '' else convert(value)
+            converters.append((column, field.column, convert))
+    return converters
+
+
+def _unclaimed_external_ids(rows):
+    """
+    Yields the exported external identifiers that no movie in the database holds yet, checking a batch at a time.
+    """
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, BATCH_SIZE))
+        if not batch:
+            return
+        claimed = set(MovieExternalId.objects.filter(identifier__in=[_text(row['identifier']) for row in batch])
+                      .values_list('source', 'identifier'))
+        for row in batch:
+            if (_text(row['source']), _text(row['identifier'])) not in claimed:
+                yield row
+
+
+def load_table(name, columns, rows, ids, users):
+    """
+    Saves the rows of a table in batches and returns how many there were. Rows of a remapped table are given new
+    ids, recorded in ids[name]; the others get theirs from the database.
+    """
+    model = MODELS[name]
+    converters = _converters(name, columns, ids, users)
+    if name in REMAPPED:
+        remapped = ids.setdefault(name, {})
+        new_ids = itertools.count(_next_id(model))
+
+        def new_id(value):
+            remapped[int(value)] = next(new_ids)
+            return remapped[int(value)]
+        converters.insert(0, ('id', 'id', new_id))
+    statement = "INSERT INTO %s (%s) VALUES (%s)" % (
+        connection.ops.quote_name(model._meta.db_table),
+        ", ".join(connection.ops.quote_name(column) for exported, column, convert in converters),
+        ", ".join(["%s"] * len(converters)))
+    cursor = connection.cursor()
+    batch = []
+    count = 0
+    for row in rows:
+        batch.append([convert(row[exported]) for exported, column, convert in converters])
+        if len(batch) == BATCH_SIZE:
+            cursor.executemany(statement, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(statement, batch)
+    return count + len(batch)
+
+
+def import_league(paths, export_format):
+    """
+    Loads the exported tables at the paths and returns the new league and a timing report, a list of (table, rows,
+    seconds).
+    """
+    ids, report = _load(paths, export_format)
+    started = time.time()
+    points = reconcile.reconcile_movies(ids['movies'].values())
+    report.append(('canonical', points, time.time() - started))
+    season_ids = ids['seasons'].values()
+    caching.bump_seasons(season_ids)
+    if jobs.enabled():
+        jobs.enqueue(season_ids)
+    return League.objects.get(id=ids['league'].values()[0]), report
+
+
+@transaction.commit_on_success
+def _load(paths, export_format):
+    report = []
+    ids = {}
+    started = time.time()
+    users = _users(paths, export_format)
+    report.append(('users', len(users), time.time() - started))
+    with connection.constraint_checks_disabled():
+        for name, columns, queryset in TABLES:
+            started = time.time()
+            rows = read_rows(paths[name], export_format)
+            if name == 'external_ids':
+                rows = _unclaimed_external_ids(rows)
+            count = load_table(name, columns, rows, ids, users)
+            report.append((name, count, time.time() - started))
+    started = time.time()
+    models = [MODELS[name] for name, columns, queryset in TABLES]
+    connection.check_constraints(table_names=[model._meta.db_table for model in models])
+    cursor = connection.cursor()
+    for statement in connection.ops.sequence_reset_sql(no_style(), models):
+        cursor.execute(statement)
+    report.append(('checks', 0, time.time() - started))
+    if len(ids['league']) != 1:
+        raise ValueError("Expected one league in the export, found %d" % len(ids['league']))
+    return ids, report
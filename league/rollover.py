@@ -0,0 +1,127 @@
+"""
+Season rollover.
+
+Ranks every division of a finished season in one pass and builds the next season from it: each division is copied,
+and each team's owner moves up a division if the team finished in a promotion place, down one if it finished in a
+relegation place, and otherwise stays. Divisions form a ladder in sort_order, so the top division has nowhere to
+promote to and the bottom one nowhere to relegate to. Rosters start empty for the new season's draft.
+
+copy_divisions() copies divisions and their teams as they are into another season, for the admin.
+"""
+
+from django.db import transaction
+
+from league import caching
+from league.models import Division, Season, Team
+from league.snapshots import season_standings
+
+STAYED = 'stayed'
+PROMOTED = 'promoted'
+RELEGATED = 'relegated'
+
+BATCH_SIZE = 500
+
+
+def plan_rollover(season):
+    """
+    Returns a list of (division, placements) in ladder order, where placements lists (team, movement) for every team
+    whose owner plays in that division's successor next season. Ranks the whole season in a fixed number of queries.
+    """
+    ladder = sorted(season_standings(season), key=lambda item: (item[0].sort_order, item[0].id))
+    placements = [[] for _ in ladder]
+    for index, (division, rows) in enumerate(ladder):
+        for row in rows:
+            if row.is_promoted() and index > 0:
+                placements[index - 1].append((row.team, PROMOTED))
+            elif row.is_relegated() and index < len(ladder) - 1:
+                placements[index + 1].append((row.team, RELEGATED))
+            else:
+                placements[index].append((row.team, STAYED))
+    return [(division, placements[index]) for index, (division, rows) in enumerate(ladder)]
+
+
+def next_season_dates(season):
+    """
+    Returns the start and end dates of the season shifted by one year.
+    """
+    def next_year(day):
+        try:
+            return day.replace(year=day.year + 1)
+        except ValueError:
+            # 29 February
+            return day.replace(year=day.year + 1, day=28)
+    return next_year(season.start_date), next_year(season.end_date)
+
+
+@transaction.commit_on_success
+def apply_rollover(season, plan, name, start_date, end_date):
+    """
+    Creates the next season with a copy of every division in the plan and a team for every placement, and returns
+    it. Divisions and teams are bulk created in one transaction. Raises ValueError if two of the divisions share a
+    sort_order.
+    """
+    new_season = Season.objects.create(league_id=season.league_id, name=name, start_date=start_date,
+                                       end_date=end_date)
+    new_divisions = _copy_divisions([division for division, placements in plan], new_season)
+    teams = []
+    for new_division, (division, placements) in zip(new_divisions, plan):
+        teams.extend(Team(owner_id=team.owner_id, division=new_division, name=team.name)
+                     for team, movement in placements)
+    Team.objects.bulk_create(teams, batch_size=BATCH_SIZE)
+    caching.bump_seasons([new_season.id])
+    return new_season
+
+
+def _copy_divisions(divisions, season):
+    """
+    Bulk creates a copy of each division in the season and returns the copies in the same order. bulk_create doesn't
+    set primary keys, so copies are found again by sort_order, and raises ValueError unless every division's sort_order
+    is unique among them and not already used in the season.
+    """
+    sort_orders = [division.sort_order for division in divisions]
+    taken = set(Division.objects.filter(season=season).values_list('sort_order', flat=True))
+    for index, sort_order in enumerate(sort_orders):
+        if sort_order in taken or sort_order in sort_orders[:index]:
+            raise ValueError("More than one division of %s would have sort order %d" % (season.name, sort_order))
+    Division.objects.bulk_create([Division(season=season, name=division.name, sort_order=division.sort_order,
+                                           currency_unit=division.currency_unit, max_currency=division.max_currency,
+                                           num_promoted=division.num_promoted, num_relegated=division.num_relegated)
+                                  for division in divisions], batch_size=BATCH_SIZE)
+    copies = dict((copy.sort_order, copy) for copy in Division.objects.filter(season=season))
+    return [copies[sort_order] for sort_order in sort_orders]
+
+
+@transaction.commit_on_success
+def copy_divisions(divisions, season):
+    """
+    Copies the divisions and their teams, with the same owners and names but empty rosters, into the season, and
+    returns the number of teams copied. Divisions and teams are bulk created in one transaction. Raises ValueError if
+    two divisions would share a sort_order in the season.
+    """
+    divisions = sorted(divisions, key=lambda division: (division.sort_order, division.id))
+    new_divisions = _copy_divisions(divisions, season)
+    new_division_ids = dict((division.id, new_division.id) for division, new_division in zip(divisions, new_divisions))
+    teams = [Team(owner_id=owner_id, division_id=new_division_ids[division_id], name=name)
+             for owner_id, division_id, name in Team.objects.filter(division__in=new_division_ids.keys())
+             .order_by('division', 'id').values_list('owner_id', 'division_id', 'name')]
+    Team.objects.bulk_create(teams, batch_size=BATCH_SIZE)
+    caching.bump_seasons([season.id])
+    return len(teams)
+
+
+def describe(plan):
+    """
+    Returns report lines for a plan: one per division, then one per owner changing division.
+    """
+    lines = []
+    for division, placements in plan:
+        counts = dict((movement, 0) for movement in (STAYED, PROMOTED, RELEGATED))
+        for team, movement in placements:
+            counts[movement] += 1
+        lines.append("%s: %d teams, %d stayed, %d promoted in, %d relegated in" %
+                     (division.name, len(placements), counts[STAYED], counts[PROMOTED], counts[RELEGATED]))
+    for division, placements in plan:
+        for team, movement in placements:
+            if movement != STAYED:
+                lines.append("%s %s from %s to %s" % (team.get_name(), movement, team.division.name, division.name))
+    return lines
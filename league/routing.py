@@ -0,0 +1,159 @@
+"""
+Read replica routing and persistent database connections.
+
+ReplicaRouter sends reads to one of the aliases in settings.LEAGUE_READ_REPLICAS while a read-only request is
+active and everything else to the primary. ReplicaMiddleware activates replica reads for GET and HEAD requests to
+the views in settings.LEAGUE_REPLICA_VIEWS, so the league pages, the API and the model methods their templates call
+read from a replica, while the admin, ingestion, management commands and the standings worker never leave the
+primary.
+
+Replicas lag behind the primary, so reads are pinned to the primary once a request has written anything: saving a
+model or changing a many-to-many relation pins the rest of the request, and a request that wrote, or that wasn't a
+GET or HEAD, sets a cookie pinning the browser's requests for the next settings.LEAGUE_REPLICA_PIN_SECONDS, long
+enough for the replicas to catch up, so owners always see their own changes. Pages showing a season that changed
+within the same time read from the primary too, whoever requests them, so they aren't rendered from a replica that
+hasn't caught up and cached under the season's new version.
+
+Django closes every connection at the end of each request. persistent_connections(), called from the WSGI
+module, keeps them open for up to settings.LEAGUE_CONN_MAX_AGE seconds instead, ending each request's transaction
+but reusing the connection.
+"""
+
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+
+# Django's default database. django.db loads the router while it is being imported, so this module can't import
+# anything from it until it is used.
+PRIMARY = 'default'
+PIN_COOKIE = 'league_primary'
+
+_state = threading.local()
+
+
+def replicas():
+    return tuple(getattr(settings, 'LEAGUE_READ_REPLICAS', ()))
+
+
+def replica_views():
+    return tuple(getattr(settings, 'LEAGUE_REPLICA_VIEWS', ('league.views', 'league.api')))
+
+
+def pin_seconds():
+    return getattr(settings, 'LEAGUE_REPLICA_PIN_SECONDS', 10)
+
+
+def connection_max_age():
+    return getattr(settings, 'LEAGUE_CONN_MAX_AGE', 0)
+
+
+def activate():
+    """
+    Sends this thread's reads to a replica, chosen at random, until deactivate() or a write.
+    """
+    _state.replica = random.choice(replicas()) if replicas() else None
+    _state.pinned = False
+
+
+def deactivate():
+    _state.replica = None
+    _state.pinned = False
+
+
+def pin():
+    """
+    Sends this thread's remaining reads to the primary.
+    """
+    _state.pinned = True
+
+
+def read_primary():
+    """
+    Sends this thread's remaining reads to the primary without pinning the browser.
+    """
+    _state.replica = None
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False)
+
+
+def read_alias():
+    """
+    Returns the alias this thread reads from.
+    """
+    replica = getattr(_state, 'replica', None)
+    if replica is None or is_pinned():
+        return PRIMARY
+    return replica
+
+
+class ReplicaRouter(object):
+    """
+    Reads from the active replica, if any, and writes to the primary. Replicas copy the primary's schema, so syncdb
+    and migrations skip them.
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = (PRIMARY,) + replicas()
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_syncdb(self, db, model):
+        if db in replicas():
+            return False
+        return None
+
+
+def model_written(sender, **kwargs):
+    pin()
+
+
+def _connection_opened(sender, connection, **kwargs):
+    connection.league_opened = time.time()
+
+
+def release_connections(**kwargs):
+    """
+    Ends every connection's transaction at the end of a request like Django's close_connection, but only closes the
+    connections older than the maximum age and those that fail.
+    """
+    from django.db import DatabaseError, connections
+    max_age = connection_max_age()
+    for alias in connections:
+        connection = connections[alias]
+        try:
+            connection.abort()
+            if connection.connection is not None:
+                # Also ends the transaction the backend opened for reads, so the next request sees fresh data
+                connection._rollback()
+        except DatabaseError:
+            connection.close()
+            continue
+        opened = getattr(connection, 'league_opened', None)
+        if not max_age or opened is None or time.time() - opened >= max_age:
+            connection.close()
+
+
+def persistent_connections():
+    """
+    Keeps connections open between requests for up to settings.LEAGUE_CONN_MAX_AGE seconds, if it is set. Only for
+    servers: the test client expects Django's own handler.
+    """
+    from django.db import close_connection
+    from django.db.backends.signals import connection_created
+    if not connection_max_age():
+        return
+    connection_created.connect(_connection_opened)
+    request_finished.disconnect(close_connection)
+    request_finished.connect(release_connections)
@@ -0,0 +1,139 @@
+"""
+Daily team value series.
+
+A team's value on every day of its season is computed from one pass over its movies' canonical grosses sorted by
+date, carrying forward each movie's latest gross, instead of valuing every movie on every day. When NumPy is installed,
+large divisions are computed with array operations instead: the grosses are laid out as a movies by days matrix,
+filled forward, and multiplied by the teams by movies roster matrix.
+"""
+
+import datetime
+import heapq
+
+from league.models import CanonicalGross, MovieMembership
+from league.snapshots import snapshot_date
+from league.standings import MOVIE_ID_CHUNK_SIZE, load_rosters
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Movies times days above which the NumPy path is used, when NumPy is available
+NUMPY_THRESHOLD = 20000
+
+
+def season_days(season):
+    """
+    Returns the days of the season up to today.
+    """
+    start, end = season.start_date, snapshot_date(season)
+    return [start + datetime.timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def _sorted_updates(movie_ids, end):
+    """
+    Returns an iterator of (date, id, movie id, gross) for every canonical gross of the movies up to the end date, in
+    date and id order. Runs one query per chunk of movie ids.
+    """
+    movie_ids = sorted(set(movie_ids))
+    chunks = []
+    for start in range(0, len(movie_ids), MOVIE_ID_CHUNK_SIZE):
+        updates = CanonicalGross.objects.filter(movie__in=movie_ids[start:start + MOVIE_ID_CHUNK_SIZE],
+                                                date__lte=end)
+        chunks.append(list(updates.order_by('date', 'id').values_list('date', 'id', 'movie_id', 'gross')))
+    return heapq.merge(*chunks)
+
+
+def _sweep(days, updates, movies_by_team):
+    holders = {}
+    for team_id, movie_ids in movies_by_team.items():
+        for movie_id in movie_ids:
+            holders.setdefault(movie_id, []).append(team_id)
+    grosses = {}
+    totals = dict((team_id, 0) for team_id in movies_by_team)
+    series = dict((team_id, []) for team_id in movies_by_team)
+
+    def record():
+        for team_id, total in totals.items():
+            series[team_id].append(total)
+
+    day = 0
+    for date, update_id, movie_id, gross in updates:
+        while day < len(days) and days[day] < date:
+            record()
+            day += 1
+        change = gross - grosses.get(movie_id, 0)
+        grosses[movie_id] = gross
+        for team_id in holders[movie_id]:
+            totals[team_id] += change
+    while day < len(days):
+        record()
+        day += 1
+    return series
+
+
+def _vectorized(days, updates, movies_by_team):
+    team_ids = list(movies_by_team)
+    movie_ids = sorted(set(movie_id for movie_ids in movies_by_team.values() for movie_id in movie_ids))
+    movie_index = dict((movie_id, index) for index, movie_id in enumerate(movie_ids))
+    rows = [(movie_index[movie_id], max((date - days[0]).days, 0), gross) for date, _, movie_id, gross in updates]
+    grosses = numpy.zeros((len(movie_ids), len(days)), dtype=numpy.int64)
+    if rows:
+        movies, offsets, values = [numpy.array(column, dtype=numpy.int64) for column in zip(*rows)]
+        # Keep the last update of each movie on each day; updates before the season all land on its first day
+        cells = movies * len(days) + offsets
+        last = len(cells) - 1 - numpy.unique(cells[::-1], return_index=True)[1]
+        grosses[movies[last], offsets[last]] = values[last]
+        seen = numpy.zeros(grosses.shape, dtype=bool)
+        seen[movies[last], offsets[last]] = True
+        filled_from = numpy.maximum.accumulate(numpy.where(seen, numpy.arange(len(days)), 0), axis=1)
+        grosses = grosses[numpy.arange(len(movie_ids))[:, None], filled_from]
+    rosters = numpy.zeros((len(team_ids), len(movie_ids)), dtype=numpy.int64)
+    for row, team_id in enumerate(team_ids):
+        for movie_id in movies_by_team[team_id]:
+            rosters[row, movie_index[movie_id]] += 1
+    values = rosters.dot(grosses)
+    return dict((team_id, values[row].tolist()) for row, team_id in enumerate(team_ids))
+
+
+def value_series(movies_by_team, days, use_numpy=None):
+    """
+    Returns a dict of team id to the team's value on each of the days, given a dict of team id to the ids of its
+    movies. use_numpy forces the NumPy path on or off; by default it is used for large inputs when available.
+    """
+    movie_ids = set(movie_id for movie_ids in movies_by_team.values() for movie_id in movie_ids)
+    if not days:
+        return dict((team_id, []) for team_id in movies_by_team)
+    updates = _sorted_updates(movie_ids, days[-1])
+    if use_numpy is None:
+        use_numpy = numpy is not None and len(movie_ids) * len(days) >= NUMPY_THRESHOLD
+    if use_numpy:
+        return _vectorized(days, updates, movies_by_team)
+    return _sweep(days, updates, movies_by_team)
+
+
+def team_series(team, use_numpy=None):
+    """
+    Returns the days of the team's season so far and its value on each.
+    """
+    days = season_days(team.division.season)
+    movie_ids = list(MovieMembership.objects.filter(team=team).values_list('movie_id', flat=True))
+    return days, value_series({team.id: movie_ids}, days, use_numpy=use_numpy)[team.id]
+
+
+def division_series(division, use_numpy=None):
+    """
+    Returns the days of the division's season so far and a list of (team, values) for its teams, in the order of the
+    latest day's standings.
+    """
+    days = season_days(division.season)
+    teams, memberships_by_team = load_rosters([division])
+    movies_by_team = dict((team_id, [membership.movie_id for membership in memberships])
+                          for team_id, memberships in memberships_by_team.items())
+    series = value_series(movies_by_team, days, use_numpy=use_numpy)
+    costs = dict((team_id, sum(membership.price for membership in memberships))
+                 for team_id, memberships in memberships_by_team.items())
+    rows = [(team, series[team.id]) for team in teams]
+    rows.sort(key=lambda row: (-row[1][-1] if row[1] else 0, costs[row[0].id], row[0].id))
+    return days, rows
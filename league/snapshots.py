@@ -0,0 +1,205 @@
+"""
+Materialized daily standings.
+
+StandingsSnapshot stores every team's value, cost and position for each day of its season so pages can read a
+precomputed table rather than valuing every movie per request. The rebuild_standings_snapshots command keeps it
+current, and the readers here fall back to the live standings engine for anything not yet snapshotted. Changes to
+gross updates, memberships and teams discard the snapshots they make stale, so they are read live until rebuilt.
+"""
+
+import datetime
+
+from django.db import transaction
+from django.db.models import Max, Min
+
+from league import caching, standings
+from league.models import (Division, MovieGrossUpdate, MovieMembership, Season, StandingsSnapshot,
+                           StandingsSnapshotCheckpoint, Team)
+
+SNAPSHOT_BATCH_SIZE = 500
+
+
+def snapshot_date(season):
+    """
+    Returns the day whose snapshot holds the season's current standings.
+    """
+    return min(season.end_date, datetime.date.today())
+
+
+def _days(start, end):
+    day = start
+    while day <= end:
+        yield day
+        day += datetime.timedelta(days=1)
+
+
+def _season_divisions(season):
+    divisions = list(Division.objects.filter(season=season))
+    for division in divisions:
+        division.season = season
+    return divisions
+
+
+def rebuild_season(season, start=None, end=None):
+    """
+    Replaces the season's snapshots from start to end, which default to the whole season up to today. Returns the
+    number of snapshots written.
+    """
+    start = max(start or season.start_date, season.start_date)
+    end = min(end or snapshot_date(season), snapshot_date(season))
+    if start > end:
+        return 0
+    divisions = _season_divisions(season)
+    teams, memberships_by_team = standings.load_rosters(divisions)
+    movie_ids = set(membership.movie_id for memberships in memberships_by_team.values() for membership in memberships)
+
+    snapshots = []
+    for day in _days(start, end):
+        values = standings.gross_values_on_date(movie_ids, day)
+        rows = standings.ranked_rows(divisions, teams, memberships_by_team, lambda team: values)
+        for division_rows in rows.values():
+            snapshots.extend(StandingsSnapshot(team_id=row.team.id, date=day, value=row.value, cost=row.cost,
+                                               position=row.position) for row in division_rows)
+    with transaction.commit_on_success():
+        StandingsSnapshot.objects.filter(team__division__season=season, date__gte=start, date__lte=end).delete()
+        StandingsSnapshot.objects.bulk_create(snapshots, batch_size=SNAPSHOT_BATCH_SIZE)
+    caching.bump_seasons([season.id])
+    return len(snapshots)
+
+
+def discard_snapshots(season_ids, start=None):
+    """
+    Deletes the seasons' snapshots from start, or all of them if it is None, so they are rebuilt by the next
+    update_snapshots and read from the live standings until then.
+    """
+    snapshots = StandingsSnapshot.objects.filter(team__division__season__in=list(season_ids))
+    if start is not None:
+        snapshots = snapshots.filter(date__gte=start)
+    snapshots.delete()
+
+
+def update_snapshots():
+    """
+    Brings every started season's snapshots up to date. Only days on or after the earliest gross update added since
+    the last run, and days that have no snapshot yet, including those discarded by changes, are rebuilt. Returns a
+    list of (season, snapshots written).
+    """
+    checkpoint = StandingsSnapshotCheckpoint.objects.get_or_create(pk=1)[0]
+    new_updates = MovieGrossUpdate.objects.filter(id__gt=checkpoint.last_update_id)
+    last_update_id = new_updates.aggregate(Max('id'))['id__max']
+    changed_from = {}
+    if last_update_id is not None:
+        new_updates = new_updates.filter(id__lte=last_update_id)
+        changed_from = dict(new_updates.values_list('movie').annotate(Min('date')).order_by())
+
+    rebuilt = []
+    for season in Season.objects.filter(start_date__lte=datetime.date.today()):
+        latest = StandingsSnapshot.objects.filter(team__division__season=season).aggregate(Max('date'))['date__max']
+        start = latest + datetime.timedelta(days=1) if latest else season.start_date
+        season_movie_ids = MovieMembership.objects.filter(team__division__season=season).values_list('movie_id',
+                                                                                                     flat=True)
+        changed_dates = [changed_from[movie_id] for movie_id in season_movie_ids if movie_id in changed_from]
+        if changed_dates:
+            start = min([start] + changed_dates)
+        count = rebuild_season(season, start=start)
+        if count:
+            rebuilt.append((season, count))
+
+    if last_update_id is not None:
+        checkpoint.last_update_id = last_update_id
+        checkpoint.save()
+    return rebuilt
+
+
+def snapshot_rows(divisions, date):
+    """
+    Returns a dict of division id to ranked StandingsRows read from the snapshots taken on the date, or None if any
+    team in the divisions has no snapshot for it. The rows carry no memberships.
+    """
+    divisions = dict((division.id, division) for division in divisions)
+    snapshots = StandingsSnapshot.objects.filter(team__division__in=divisions.keys(), date=date)
+    snapshots = dict((team_id, (value, cost, position)) for team_id, value, cost, position
+                     in snapshots.values_list('team_id', 'value', 'cost', 'position'))
+    if not snapshots:
+        return None
+    teams = Team.objects.filter(division__in=divisions.keys()).select_related('owner')
+    rows = dict((division_id, []) for division_id in divisions)
+    for team in teams:
+        if team.id not in snapshots:
+            return None
+        team.division = divisions[team.division_id]
+        value, cost, position = snapshots[team.id]
+        row = standings.StandingsRow(team, team.division, cost, value)
+        row.position = position
+        rows[team.division_id].append(row)
+    for division_rows in rows.values():
+        division_rows.sort(key=lambda row: row.position)
+        for row in division_rows:
+            row.division_size = len(division_rows)
+    return rows
+
+
+def _current_rows(season, divisions):
+    rows = snapshot_rows(divisions, snapshot_date(season))
+    if rows is None:
+        rows = standings.standings_for_divisions(divisions)
+    return rows
+
+
+def season_standings(season):
+    """
+    Snapshot-backed equivalent of standings.season_standings.
+    """
+    divisions = _season_divisions(season)
+    rows = _current_rows(season, divisions)
+    return [(division, rows[division.id]) for division in divisions]
+
+
+def division_standings(division):
+    """
+    Snapshot-backed equivalent of standings.division_standings. Each row's memberships are valued with one batched
+    gross lookup on the snapshot's date.
+    """
+    day = snapshot_date(division.season)
+    rows = snapshot_rows([division], day)
+    if rows is None:
+        return standings.division_standings(division)
+    rows = rows[division.id]
+    memberships = list(MovieMembership.objects.filter(team__division=division).select_related('movie'))
+    values = standings.gross_values_on_date([membership.movie_id for membership in memberships], day)
+    memberships_by_team = dict((row.team.id, []) for row in rows)
+    for membership in memberships:
+        memberships_by_team[membership.team_id].append(
+            standings.MembershipRow(membership, values.get(membership.movie_id, 0)))
+    for row in rows:
+        row.memberships = memberships_by_team[row.team.id]
+    return rows
+
+
+def league_leaders(league):
+    """
+    Snapshot-backed equivalent of standings.league_leaders.
+    """
+    leaders = []
+    for season in Season.objects.filter(league=league):
+        divisions = _season_divisions(season)
+        rows = _current_rows(season, divisions)
+        leaders.append((season, [(division, rows[division.id][0] if rows[division.id] else None)
+                                 for division in divisions]))
+    return leaders
+
+
+def current_standings(division):
+    """
+    Returns the division's current ranked StandingsRows, without memberships.
+    """
+    return _current_rows(division.season, [division])[division.id]
+
+
+def team_standing(team):
+    """
+    Returns the team's current StandingsRow within its division.
+    """
+    for row in current_standings(team.division):
+        if row.team.id == team.id:
+            return row
@@ -0,0 +1,246 @@
+"""
+Batched standings computation.
+
+The per-object methods on Team and Division run several queries for every movie on every team. The functions
+here compute cost, value and position for all teams of a division, a season or a whole league in a fixed number
+of queries and return lightweight rows the templates can render directly.
+"""
+
+import datetime
+
+from django.db import connection
+from django.utils.datastructures import SortedDict
+
+from league.gross_index import gross_index
+from league.models import CanonicalGross, Division, MovieGrossUpdate, MovieMembership, Season, Team
+
+# Keep IN (...) clauses under the sqlite bound parameter limit
+MOVIE_ID_CHUNK_SIZE = 500
+
+
+def gross_values_on_date(movie_ids, date, source=None):
+    """
+    Returns a dict mapping each movie id to its canonical gross on the given date, or to the latest gross the source
+    reported on or before it if a source is given. Resolved with one query per chunk of movie ids, or from the
+    in-memory gross index when it is enabled. Movies without any update may be left out of the dict.
+    """
+    if gross_index.enabled():
+        return gross_index.values_on_date(movie_ids, date, source=source)
+    movie_ids = sorted(set(movie_ids))
+    model = MovieGrossUpdate if source else CanonicalGross
+    table = connection.ops.quote_name(model._meta.db_table)
+    latest_update = ("{table}.id = (SELECT u.id FROM {table} u WHERE u.movie_id = {table}.movie_id AND u.date <= %s"
+                     "{source_clause} ORDER BY u.date DESC, u.id DESC LIMIT 1)")
+    latest_update = latest_update.format(table=table, source_clause=" AND u.source = %s" if source else "")
+    params = [date, source] if source else [date]
+    values = {}
+    for start in range(0, len(movie_ids), MOVIE_ID_CHUNK_SIZE):
+        chunk = movie_ids[start:start + MOVIE_ID_CHUNK_SIZE]
+        updates = model.objects.filter(movie__in=chunk).extra(where=[latest_update], params=params)
+        values.update(updates.values_list('movie_id', 'gross'))
+    return values
+
+
+def efficiency(value, price):
+    """
+    Returns the value earned per currency unit paid, unrounded, or None for a free pick.
+    """
+    if price > 0:
+        return value / float(price)
+    return None
+
+
+def season_movie_board(season, today=None):
+    """
+    Returns (released, upcoming) lists of (movie, gross on the season's end date) for the season's movies in release
+    date order. Runs one query for the movies and one batched gross lookup.
+    """
+    today = today or datetime.date.today()
+    movies = list(season.movies.all())
+    values = gross_values_on_date([movie.id for movie in movies], season.end_date)
+    released, upcoming = [], []
+    for movie in movies:
+        (released if movie.release_date <= today else upcoming).append((movie, values.get(movie.id, 0)))
+    return released, upcoming
+
+
+class MembershipRow(object):
+    """
+    A movie membership together with the movie's value at the end of the team's season.
+    """
+    __slots__ = ('membership', 'movie', 'price', 'value_on_team')
+
+    def __init__(self, membership, value):
+        self.membership = membership
+        self.movie = membership.movie
+        self.price = membership.price
+        self.value_on_team = value
+
+    def efficiency(self):
+        return efficiency(self.value_on_team, self.price)
+
+
+class StandingsRow(object):
+    """
+    One team's line in a division table. Mirrors the read-only parts of Team's interface so templates and filters
+    written against teams keep working.
+    """
+    __slots__ = ('team', 'division', 'cost', 'value', 'memberships', 'position', 'division_size')
+
+    def __init__(self, team, division, cost, value, memberships=None):
+        self.team = team
+        self.division = division
+        self.cost = cost
+        self.value = value
+        self.memberships = memberships
+        self.position = None
+        self.division_size = None
+
+    @property
+    def id(self):
+        return self.team.id
+
+    def get_name(self):
+        return self.team.get_name()
+
+    def get_team_cost(self):
+        return self.cost
+
+    def get_team_value(self):
+        return self.value
+
+    def get_position(self, reverse=False):
+        if reverse:
+            return self.division_size - 1 - self.position
+        return self.position
+
+    def is_promoted(self):
+        return self.get_position() < self.division.num_promoted
+
+    def is_relegated(self):
+        return self.get_position(reverse=True) < self.division.num_relegated
+
+    def __unicode__(self):
+        return self.get_name()
+
+
+def rank(rows):
+    """
+    Orders rows by value, breaking ties on the cheaper team, the same order Division.sorted_teams() has always used.
+    """
+    rows.sort(key=lambda row: (-row.value, row.cost, row.team.id))
+    for position, row in enumerate(rows):
+        row.position = position
+        row.division_size = len(rows)
+    return rows
+
+
+def load_rosters(divisions):
+    """
+    Returns the teams of the given divisions, with their division already attached, and a dict of team id to the
+    team's memberships. Runs two queries.
+    """
+    divisions = dict((division.id, division) for division in divisions)
+    teams = list(Team.objects.filter(division__in=divisions.keys()).select_related('owner'))
+    memberships = MovieMembership.objects.filter(team__division__in=divisions.keys()).select_related('movie')
+    memberships_by_team = {}
+    for team in teams:
+        team.division = divisions[team.division_id]
+        memberships_by_team[team.id] = []
+    for membership in memberships:
+        memberships_by_team[membership.team_id].append(membership)
+    return teams, memberships_by_team
+
+
+def ranked_rows(divisions, teams, memberships_by_team, values_for_team):
+    """
+    Builds ranked rows from loaded rosters, returning a dict of division id to rows. values_for_team is called with
+    each team and returns the dict of movie id to gross to value that team with.
+    """
+    rows = dict((division.id, []) for division in divisions)
+    for team in teams:
+        values = values_for_team(team)
+        membership_rows = [MembershipRow(membership, values.get(membership.movie_id, 0))
+                           for membership in memberships_by_team[team.id]]
+        cost = sum(membership.price for membership in membership_rows)
+        value = sum(membership.value_on_team for membership in membership_rows)
+        rows[team.division_id].append(StandingsRow(team, team.division, cost, value, membership_rows))
+    for division_rows in rows.values():
+        rank(division_rows)
+    return rows
+
+
+def standings_for_divisions(divisions, date=None):
+    """
+    Builds ranked rows for the given divisions valued on the date, or on each season's end date if no date is
+    given. Runs two roster queries plus one gross lookup per distinct date.
+    """
+    if not divisions:
+        return {}
+    teams, memberships_by_team = load_rosters(divisions)
+
+    def team_date(team):
+        return date or team.division.season.end_date
+
+    movie_ids_by_date = {}
+    for team in teams:
+        movie_ids = movie_ids_by_date.setdefault(team_date(team), set())
+        movie_ids.update(membership.movie_id for membership in memberships_by_team[team.id])
+    values_by_date = dict((day, gross_values_on_date(movie_ids, day)) for day, movie_ids in movie_ids_by_date.items())
+    return ranked_rows(divisions, teams, memberships_by_team, lambda team: values_by_date.get(team_date(team), {}))
+
+
+def division_standings(division, date=None):
+    """
+    Returns the ranked StandingsRows for a single division, valued at the end of its season unless a date is given.
+    """
+    return standings_for_divisions([division], date=date)[division.id]
+
+
+def season_standings(season):
+    """
+    Returns a list of (division, rows) pairs for every division of the season, in division order.
+    """
+    divisions = list(Division.objects.filter(season=season))
+    for division in divisions:
+        division.season = season
+    rows = standings_for_divisions(divisions)
+    return [(division, rows[division.id]) for division in divisions]
+
+
+def league_leaders(league):
+    """
+    Returns a list of (season, [(division, leading row or None), ...]) pairs covering every season of the league.
+    """
+    seasons = list(Season.objects.filter(league=league))
+    divisions = list(Division.objects.filter(season__in=seasons).select_related('season'))
+    rows = standings_for_divisions(divisions)
+    divisions_by_season = dict((season.id, []) for season in seasons)
+    for division in divisions:
+        division_rows = rows[division.id]
+        divisions_by_season[division.season_id].append((division, division_rows[0] if division_rows else None))
+    return [(season, divisions_by_season[season.id]) for season in seasons]
+
+
+def membership_efficiencies(season, worst=False):
+    """
+    Returns the season's movie memberships annotated in a single query, most efficient first, or least efficient
+    first if worst is true. value_on_team (the movie's gross on the season's end date) and efficiency are set as
+    attributes, the way MembershipRow has them, and efficiency follows efficiency(): free picks have none and are
+    listed last either way.
+    """
+    canonical = connection.ops.quote_name(CanonicalGross._meta.db_table)
+    memberships = connection.ops.quote_name(MovieMembership._meta.db_table)
+    value = ("COALESCE((SELECT c.gross FROM {canonical} c WHERE c.movie_id = {memberships}.movie_id AND c.date <= %s "
+             "ORDER BY c.date DESC LIMIT 1), 0)").format(canonical=canonical, memberships=memberships)
+    select = SortedDict([
+        ('value_on_team', value),
+        ('efficiency', "CASE WHEN {memberships}.price > 0 THEN {value} * 1.0 / {memberships}.price END".format(
+            memberships=memberships, value=value)),
+        ('priced', "CASE WHEN {memberships}.price > 0 THEN 1 ELSE 0 END".format(memberships=memberships)),
+    ])
+    order = ('efficiency', '-price') if worst else ('-efficiency', 'price')
+    return (MovieMembership.objects.filter(team__division__season=season)
+            .select_related('movie', 'team__owner', 'team__division')
+            .extra(select=select, select_params=[season.end_date, season.end_date])
+            .order_by('-priced', *order + ('id',)))
@@ -0,0 +1,75 @@
+/*
+ * Keeps standings lists up to date from a season's live scoreboard. Every element with a data-live attribute, the
+ * URL of the season's event stream, has its li[data-team] items' .team-value and .team-cost text and the promoted
+ * and relegated classes of their data-zone element updated, and the items reordered by position, as standings
+ * change, without reloading the page.
+ */
+(function () {
+    function formatNumber(value) {
+        return String(value).replace(/\B(?=(\d{3})+(?!\d))/g, ',');
+    }
+
+    function setText(item, selector, text) {
+        var element = item.querySelector(selector);
+        if (element) {
+            element.textContent = text;
+        }
+    }
+
+    function setZone(item, team) {
+        var zone = item.hasAttribute('data-zone') ? item : item.querySelector('[data-zone]');
+        if (!zone) {
+            return;
+        }
+        var classes = zone.className.split(/\s+/).filter(function (name) {
+            return name && name !== 'promoted' && name !== 'relegated';
+        });
+        if (team.promoted) {
+            classes.push('promoted');
+        } else if (team.relegated) {
+            classes.push('relegated');
+        }
+        zone.className = classes.join(' ');
+    }
+
+    function update(container, teams) {
+        var lists = [];
+        for (var i = 0; i < teams.length; i++) {
+            var item = container.querySelector('li[data-team="' + teams[i].team + '"]');
+            if (!item) {
+                continue;
+            }
+            item.setAttribute('data-position', teams[i].position);
+            setText(item, '.team-value', '$' + formatNumber(teams[i].value));
+            setText(item, '.team-cost', formatNumber(teams[i].cost));
+            setZone(item, teams[i]);
+            if (lists.indexOf(item.parentNode) < 0) {
+                lists.push(item.parentNode);
+            }
+        }
+        for (var l = 0; l < lists.length; l++) {
+            var items = Array.prototype.slice.call(lists[l].querySelectorAll('li[data-team]'));
+            items.sort(function (a, b) {
+                return parseInt(a.getAttribute('data-position'), 10) - parseInt(b.getAttribute('data-position'), 10);
+            });
+            for (var j = 0; j < items.length; j++) {
+                lists[l].appendChild(items[j]);
+            }
+        }
+    }
+
+    if (!window.EventSource || !document.querySelectorAll) {
+        return;
+    }
+    var containers = document.querySelectorAll('[data-live]');
+    for (var c = 0; c < containers.length; c++) {
+        (function (container) {
+            var source = new EventSource(container.getAttribute('data-live'));
+            var listener = function (event) {
+                update(container, JSON.parse(event.data).teams);
+            };
+            source.addEventListener('standings', listener);
+            source.addEventListener('diff', listener);
+        })(containers[c]);
+    }
+})();
@@ -0,0 +1,63 @@
+/*
+ * Draws a division's daily team values as an SVG line chart in every .race-chart element. The element's
+ * data-series attribute is the URL of the division's value series, and data-team optionally highlights one team.
+ */
+(function () {
+    var SVG = 'http://www.w3.org/2000/svg';
+    var WIDTH = 600, HEIGHT = 260, MARGIN = 8, LABEL_WIDTH = 120;
+
+    function element(name, attributes) {
+        var node = document.createElementNS(SVG, name);
+        for (var key in attributes) {
+            node.setAttribute(key, attributes[key]);
+        }
+        return node;
+    }
+
+    function draw(container, series, highlight) {
+        var days = series.dates.length, max = 1;
+        if (days < 2) {
+            return;
+        }
+        for (var i = 0; i < series.teams.length; i++) {
+            max = Math.max(max, Math.max.apply(null, series.teams[i].values));
+        }
+        var plotWidth = WIDTH - LABEL_WIDTH - 2 * MARGIN, plotHeight = HEIGHT - 2 * MARGIN;
+        var svg = element('svg', {width: WIDTH, height: HEIGHT, viewBox: '0 0 ' + WIDTH + ' ' + HEIGHT});
+        for (var t = series.teams.length - 1; t >= 0; t--) {
+            var team = series.teams[t], points = [];
+            for (var day = 0; day < days; day++) {
+                points.push((MARGIN + plotWidth * day / (days - 1)).toFixed(1) + ',' +
+                            (MARGIN + plotHeight * (1 - team.values[day] / max)).toFixed(1));
+            }
+            var hue = Math.round(360 * t / series.teams.length);
+            var strong = !highlight || team.team === highlight;
+            svg.appendChild(element('polyline', {
+                points: points.join(' '), fill: 'none', stroke: 'hsl(' + hue + ', 60%, 45%)',
+                'stroke-width': strong ? 2.5 : 1, 'stroke-opacity': strong ? 1 : 0.35
+            }));
+            var label = element('text', {
+                x: MARGIN + plotWidth + 4, y: points[days - 1].split(',')[1], 'font-size': 11,
+                fill: 'hsl(' + hue + ', 60%, 35%)', 'dominant-baseline': 'middle'
+            });
+            label.textContent = team.name;
+            svg.appendChild(label);
+        }
+        container.appendChild(svg);
+    }
+
+    var charts = document.querySelectorAll ? document.querySelectorAll('.race-chart') : [];
+    for (var c = 0; c < charts.length; c++) {
+        (function (container) {
+            var request = new XMLHttpRequest();
+            request.onreadystatechange = function () {
+                if (request.readyState === 4 && request.status === 200) {
+                    var highlight = container.getAttribute('data-team');
+                    draw(container, JSON.parse(request.responseText), highlight ? parseInt(highlight, 10) : null);
+                }
+            };
+            request.open('GET', container.getAttribute('data-series'));
+            request.send();
+        })(charts[c]);
+    }
+})();
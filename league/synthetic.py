@@ -0,0 +1,92 @@
+"""
+Synthetic league generator for benchmarking.
+
+Builds a league of any size with bulk inserts: every season gets its own pool of movies shared by all divisions,
+every team drafts from that pool, and every movie gets one cumulative gross update per day per source.
+"""
+
+import datetime
+import random
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from league import caching, reconcile
+from league.gross_index import gross_index
+from league.models import (Division, League, Movie, MovieExternalId, MovieGrossUpdate, MovieMembership, Season,
+                           Team)
+
+BATCH_SIZE = 1000
+
+
+def _bulk_create(model, objects):
+    for start in range(0, len(objects), BATCH_SIZE):
+        model.objects.bulk_create(objects[start:start + BATCH_SIZE])
+
+
+def _gross_updates(movie, days, sources, rng):
+    updates = []
+    for source in sources:
+        gross = 0
+        for day in range(days):
+            gross += int(rng.expovariate(1.0 / 1000000) / (day + 1))
+            updates.append(MovieGrossUpdate(movie_id=movie.id, date=movie.release_date + datetime.timedelta(days=day),
+                                            gross=gross, source=source))
+    return updates
+
+
+@transaction.commit_on_success
+def generate_league(seasons=1, divisions=2, teams=10, movies_per_team=5, updates_per_movie=60, sources=1, seed=0,
+                    name=None):
+    """
+    Creates and returns a league of the given scale. Team owners are shared across seasons, and each season's movie
+    pool holds exactly enough movies for every team in a division to draft a roster no other team in it shares.
+    """
+    rng = random.Random(seed)
+    prefix = name or "synthetic-%d" % rng.randint(0, 10 ** 9)
+    source_names = ["source%d" % i for i in range(sources)]
+
+    _bulk_create(User, [User(username="%s-owner%d" % (prefix, i), password='!') for i in range(divisions * teams)])
+    owners = list(User.objects.filter(username__startswith="%s-owner" % prefix).order_by('id'))
+    league = League.objects.create(commissioner=owners[0], name=prefix, short_description="Synthetic league",
+                                   long_description="Generated for benchmarking")
+    league.players.add(*owners)
+
+    pool_size = teams * movies_per_team
+    for season_number in range(seasons):
+        start_date = datetime.date(2000 + season_number, 1, 1)
+        end_date = start_date + datetime.timedelta(days=updates_per_movie + 90)
+        season = Season.objects.create(league=league, start_date=start_date, end_date=end_date,
+                                       name="%s season %d" % (prefix, season_number))
+
+        movie_name = "%s s%d movie " % (prefix, season_number)
+        _bulk_create(Movie, [Movie(name=movie_name + str(i),
+                                   release_date=start_date + datetime.timedelta(days=rng.randint(0, 90)))
+                             for i in range(pool_size)])
+        movies = list(Movie.objects.filter(name__startswith=movie_name).order_by('id'))
+        season.movies.add(*movies)
+        _bulk_create(MovieExternalId, [MovieExternalId(movie_id=movie.id, source=source,
+                                                       identifier="%s-%d" % (source, movie.id))
+                                       for movie in movies for source in source_names])
+        for movie in movies:
+            _bulk_create(MovieGrossUpdate, _gross_updates(movie, updates_per_movie, source_names, rng))
+        reconcile.reconcile_movies([movie.id for movie in movies])
+
+        memberships = []
+        for division_number in range(divisions):
+            division = Division.objects.create(season=season, name="Division %d" % (division_number + 1),
+                                               sort_order=division_number, currency_unit="C",
+                                               max_currency=movies_per_team * 100, num_promoted=min(2, teams),
+                                               num_relegated=min(2, teams))
+            # Sampling the whole pool shuffles it, and each team drafts its own slice
+            drafted = rng.sample(movies, pool_size)
+            for team_number in range(teams):
+                team = Team.objects.create(owner=owners[division_number * teams + team_number], division=division)
+                for movie in drafted[team_number * movies_per_team:(team_number + 1) * movies_per_team]:
+                    memberships.append(MovieMembership(movie_id=movie.id, team_id=team.id,
+                                                       price=rng.randint(1, 200)))
+        _bulk_create(MovieMembership, memberships)
+    # bulk_create skips the signals that keep the index and caches current
+    gross_index.reset()
+    caching.invalidate_all()
+    return league
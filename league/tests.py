@@ -2,11 +2,53 @@
 Unit tests for data model
 """
 
-from datetime import date
-from django.contrib.auth.models import User
+from StringIO import StringIO
+from datetime import date, datetime, timedelta
+import json
+import os
+import shutil
+import tempfile
+from django.contrib import admin
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.urlresolvers import reverse
+from django.db import IntegrityError
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.template.loader import render_to_string
 from django.test import TestCase
+from django.test.client import RequestFactory
+from django.utils import unittest
+from django.test.utils import override_settings
+from django.utils import timezone
 
+import alltime
+import benchmarks
+import caching
+import display
+import draft
+import export
+from gross_index import gross_index
+import ingest
+from instrumentation import QueryBudgetMixin
+from middleware import ReplicaMiddleware
+import instrumentation
+import jobs
+import live
 import models
+import ranking
+import reconcile
+import restore
+import rollover
+import routing
+import series
+import snapshots
+import standings
+import synthetic
+import views
 
 
 class ModelTest(TestCase):
@@ -84,6 +126,29 @@ class ModelTest(TestCase):
         self.assertEqual(movie.get_value_on_date(date(2013, 7, 5), source="source2"), 8000)
         self.assertEqual(movie.get_value_on_date(date(2013, 7, 6), source="source2"), 8000)
 
+    @override_settings(LEAGUE_GROSS_SOURCES=('trusted', 'fallback'))
+    def test_canonical_gross(self):
+        """
+        Tests that the canonical gross takes the most trusted source of each day and never decreases.
+        """
+        movie = models.Movie(name="Canonical Test Movie", release_date=date(2013, 7, 1))
+        movie.save()
+        for day, gross, source in [(2, 1000, "fallback"), (2, 900, "trusted"), (3, 1500, "other"), (4, 1400, "trusted"),
+                                   (5, 2200, "other"), (5, 2100, "fallback")]:
+            models.MovieGrossUpdate(movie=movie, date=date(2013, 7, day), gross=gross, source=source).save()
+        self.assertEqual([movie.get_value_on_date(date(2013, 7, day)) for day in range(1, 7)],
+                         [0, 900, 1500, 1500, 2100, 2100])
+        self.assertEqual(movie.get_value(), 2100)
+        self.assertEqual(movie.get_value_on_date(date(2013, 7, 4), source="trusted"), 1400)
+        self.assertEqual(standings.gross_values_on_date([movie.id], date(2013, 7, 4)), {movie.id: 1500})
+        self.assertEqual(models.CanonicalGross.objects.filter(movie=movie).count(), 3)
+        models.MovieGrossUpdate.objects.filter(movie=movie, source="other").delete()
+        self.assertEqual(movie.get_value_on_date(date(2013, 7, 4)), 1400)
+        with self.settings(LEAGUE_GROSS_SOURCES=('fallback',)):
+            call_command('reconcile_grosses', movies=[movie.id], stdout=StringIO())
+            self.assertEqual(movie.get_value_on_date(date(2013, 7, 2)), 1000)
+            self.assertEqual(movie.get_value_on_date(date(2013, 7, 4)), 1400)
+
     def test_team(self):
         """
         Tests a team's cost and value
@@ -92,7 +157,7 @@ class ModelTest(TestCase):
         league.save()
         season = models.Season(league=league, start_date=date(2013, 1, 1), end_date=date(2014, 1, 1))
         season.save()
-        division = models.Division(season=season)
+        division = models.Division(season=season, sort_order=0, max_currency=100, num_relegated=0, num_promoted=0)
         division.save()
         team = models.Team(owner=self.user, division=division)
         team.save()
@@ -126,4 +191,1305 @@ class ModelTest(TestCase):
 
         gross_update_4 = models.MovieGrossUpdate(movie=movie2, date=date(2013, 7, 6), gross=3000)
         gross_update_4.save()
-        self.assertEqual(team.get_team_value(), 8500, "Team value not changed by adding an update prior to the latest")
\ No newline at end of file
+        self.assertEqual(team.get_team_value(), 8500, "Team value not changed by adding an update prior to the latest")
+
+
+@override_settings(LEAGUE_GROSS_INDEX=True)
+class GrossIndexModelTest(ModelTest):
+    """
+    Runs the model tests again with gross lookups served from the in-memory index.
+    """
+
+    def setUp(self):
+        gross_index.reset()
+        super(GrossIndexModelTest, self).setUp()
+
+    def tearDown(self):
+        gross_index.reset()
+        super(GrossIndexModelTest, self).tearDown()
+
+    @override_settings(LEAGUE_STANDINGS_JOBS=False)
+    def test_index_lookups(self):
+        """
+        Tests bulk lookups and that added, edited or deleted updates reload their movie.
+        """
+        movie = models.Movie(name="Index Test Movie", release_date=date(2013, 7, 1))
+        movie.save()
+        models.MovieGrossUpdate(movie=movie, date=date(2013, 7, 2), gross=1000, source="source1").save()
+        models.MovieGrossUpdate(movie=movie, date=date(2013, 7, 4), gross=3000, source="source2").save()
+        self.assertEqual(gross_index.values_on_date([movie.id, self.movie.id], date(2013, 7, 3)),
+                         {movie.id: 1000, self.movie.id: 0})
+        with self.assertNumQueries(0):
+            self.assertEqual(gross_index.value_on_date(movie.id, date(2013, 7, 4)), 3000)
+            self.assertEqual(gross_index.value_on_date(movie.id, date(2013, 7, 4), source="source1"), 1000)
+            self.assertEqual(gross_index.latest_value(movie.id, source="source2"), 3000)
+        update = models.MovieGrossUpdate(movie=movie, date=date(2013, 7, 3), gross=2000, source="source1")
+        # The insert, reconciling the movie's canonical grosses, the season lookups that invalidate cached pages and
+        # discard stale snapshots, and reloading the movie into the index
+        with self.assertNumQueries(8):
+            update.save()
+            self.assertEqual(gross_index.value_on_date(movie.id, date(2013, 7, 3)), 2000)
+        update.gross = 2500
+        update.save()
+        self.assertEqual(gross_index.value_on_date(movie.id, date(2013, 7, 3), source="source1"), 2500)
+        update.delete()
+        self.assertEqual(gross_index.value_on_date(movie.id, date(2013, 7, 3)), 1000)
+        self.assertEqual(gross_index.latest_value(movie.id), 3000)
+
+    @override_settings(LEAGUE_GROSS_INDEX_CHECK=0)
+    def test_other_processes(self):
+        """
+        Tests that canonical grosses written and updates deleted without signals, as by another process, are picked
+        up at the next check.
+        """
+        self.assertEqual(gross_index.latest_value(self.movie.id), 0)
+        models.CanonicalGross.objects.create(movie=self.movie, date=date(2013, 7, 2), gross=1500)
+        self.assertEqual(gross_index.latest_value(self.movie.id), 1500)
+        updates = [models.MovieGrossUpdate(movie=self.movie, date=date(2013, 7, 2), gross=1500, source=source)
+                   for source in ["source1", "source2"]]
+        for update in updates:
+            update.save()
+        self.assertEqual(gross_index.latest_value(self.movie.id, source="source2"), 1500)
+        series = gross_index._series
+        # This process's own deletes are expected and keep the rest of the index
+        updates[0].delete()
+        self.assertEqual(gross_index.latest_value(self.movie.id, source="source1"), 0)
+        self.assertIs(gross_index._series, series)
+        # A delete by another process, which leaves the canonical grosses as they were
+        models.MovieGrossUpdate.objects.filter(movie=self.movie, source="source2")._raw_delete('default')
+        self.assertEqual(gross_index.latest_value(self.movie.id, source="source2"), 0)
+        self.assertEqual(gross_index.latest_value(self.movie.id), 1500)
+        self.assertIsNot(gross_index._series, series)
+
+
+class LeagueFixtureMixin(object):
+    """
+    Builds a season with one four-team division, each team holding one movie.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create_user(username='owner%d' % i, email='owner%d@example.com' % i,
+                                               password='password') for i in range(4)]
+        self.league = models.League(commissioner=self.users[0], name="Test League")
+        self.league.save()
+        self.season = models.Season(league=self.league, start_date=date(2013, 1, 1), end_date=date(2013, 12, 31),
+                                    name="2013")
+        self.season.save()
+        self.division = models.Division(season=self.season, name="Premier", sort_order=0, currency_unit="C",
+                                        max_currency=100, num_promoted=1, num_relegated=1)
+        self.division.save()
+        self.movies = []
+        for i, gross in enumerate([1000, 3000, 3000, 500]):
+            movie = models.Movie(name="Standings Movie %d" % i, release_date=date(2013, 7, 1))
+            movie.save()
+            models.MovieGrossUpdate(movie=movie, date=date(2013, 7, 5), gross=gross // 2, source="source1").save()
+            models.MovieGrossUpdate(movie=movie, date=date(2013, 7, 12), gross=gross, source="source1").save()
+            self.movies.append(movie)
+        # Updates past the end of the season never count towards a team's value
+        models.MovieGrossUpdate(movie=self.movies[3], date=date(2014, 1, 5), gross=90000, source="source1").save()
+        self.teams = []
+        for i, (movie, price) in enumerate(zip(self.movies, [10, 30, 20, 5])):
+            team = models.Team(owner=self.users[i], division=self.division)
+            team.save()
+            models.MovieMembership(movie=movie, team=team, price=price).save()
+            self.teams.append(team)
+
+
+class StandingsTest(LeagueFixtureMixin, TestCase):
+
+    def test_gross_values_on_date(self):
+        """
+        Tests the batched lookup of each movie's latest gross on or before a date.
+        """
+        movie_ids = [movie.id for movie in self.movies]
+        self.assertEqual(standings.gross_values_on_date(movie_ids, date(2013, 7, 1)), {})
+        self.assertEqual(standings.gross_values_on_date(movie_ids, date(2013, 7, 5)),
+                         dict(zip(movie_ids, [500, 1500, 1500, 250])))
+        self.assertEqual(standings.gross_values_on_date(movie_ids, date(2014, 2, 1)),
+                         dict(zip(movie_ids, [1000, 3000, 3000, 90000])))
+        self.assertEqual(standings.gross_values_on_date(movie_ids, date(2014, 2, 1), source="source2"), {})
+        for movie in self.movies:
+            for day in [date(2013, 7, 4), date(2013, 7, 5), date(2013, 12, 31), date(2014, 2, 1)]:
+                self.assertEqual(standings.gross_values_on_date([movie.id], day).get(movie.id, 0),
+                                 movie.get_value_on_date(day))
+
+    def test_division_standings(self):
+        """
+        Tests that standings match the team methods and are ordered by value, then by the cheaper team.
+        """
+        with self.assertNumQueries(3):
+            rows = standings.division_standings(self.division)
+        self.assertEqual([row.team for row in rows], [self.teams[2], self.teams[1], self.teams[0], self.teams[3]])
+        for position, row in enumerate(rows):
+            self.assertEqual(row.cost, row.team.get_team_cost())
+            self.assertEqual(row.value, row.team.get_team_value())
+            self.assertEqual(row.get_position(), position)
+        self.assertEqual([row.is_promoted() for row in rows], [True, False, False, False])
+        self.assertEqual([row.is_relegated() for row in rows], [False, False, False, True])
+        self.assertEqual([row.team for row in rows], self.division.sorted_teams())
+        self.assertEqual(self.division.get_leader(), self.teams[2])
+
+    def test_season_standings(self):
+        """
+        Tests that a whole season's standings are computed in a constant number of queries.
+        """
+        second_division = models.Division(season=self.season, name="Second", sort_order=1, currency_unit="C",
+                                          max_currency=100, num_promoted=0, num_relegated=0)
+        second_division.save()
+        team = models.Team(owner=self.users[0], division=second_division)
+        team.save()
+        models.MovieMembership(movie=self.movies[1], team=team, price=1).save()
+        with self.assertNumQueries(4):
+            season_rows = standings.season_standings(self.season)
+        self.assertEqual([division for division, rows in season_rows], [self.division, second_division])
+        self.assertEqual(len(season_rows[0][1]), 4)
+        self.assertEqual([(row.team, row.value) for row in season_rows[1][1]], [(team, 3000)])
+        leaders = standings.league_leaders(self.league)
+        self.assertEqual(leaders, [(self.season, [(self.division, leaders[0][1][0][1]),
+                                                  (second_division, leaders[0][1][1][1])])])
+        self.assertEqual(leaders[0][1][0][1].team, self.teams[2])
+
+    def test_ranking_cache(self):
+        """
+        Tests that an active ranking cache ranks the division once for every team's position lookups.
+        """
+        teams = list(models.Team.objects.filter(division=self.division).select_related('division__season'))
+        ranking.activate()
+        try:
+            with self.assertNumQueries(3):
+                self.assertEqual([team.get_position() for team in teams], [2, 1, 0, 3])
+                self.assertEqual([team.get_position(reverse=True) for team in teams], [1, 2, 3, 0])
+                self.assertEqual([team.is_promoted() for team in teams], [False, False, True, False])
+                self.assertEqual([team.is_relegated() for team in teams], [False, False, False, True])
+                template = Template("{% for team in teams %}<{% if team.is_promoted %}promoted"
+                                    "{% elif team.is_relegated %}relegated{% endif %}>{% endfor %}")
+                rendered = template.render(Context({'teams': teams}))
+        finally:
+            ranking.deactivate()
+        self.assertEqual(rendered, '<><><promoted><relegated>')
+        with self.assertNumQueries(6):
+            self.assertEqual(teams[2].get_position(), 0)
+            self.assertEqual(teams[3].get_position(), 3)
+
+    def test_standings_views(self):
+        """
+        Tests that the pages rendering standings show every team.
+        """
+        for url in [reverse('league', args=[self.league.id]), reverse('seasons', args=[self.league.id]),
+                    reverse('season', args=[self.season.id]), reverse('division', args=[self.division.id])]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, self.users[2].username)
+        response = self.client.get(reverse('division', args=[self.division.id]))
+        self.assertContains(response, "$3,000")
+        self.assertContains(response, "class=\"promoted\"")
+        self.assertContains(response, "class=\"relegated\"")
+
+    def test_roster_rows(self):
+        """
+        Tests that a team's movies are valued on the day of its standing, leaving out grosses after the season.
+        """
+        for team in self.teams:
+            self.assertEqual(sum(row['value'] for row in display.roster_rows(team)),
+                             snapshots.team_standing(team).value)
+        self.assertEqual(display.roster_rows(self.teams[3])[0]['value'], 500)
+
+    def test_display_rows(self):
+        """
+        Tests that the display rows carry the standings already formatted, so the templates render them without
+        running a query.
+        """
+        standings = snapshots.division_standings(self.division)
+        rows = display.division_rows(self.division)
+        self.assertEqual([row['name'] for row in rows], [row.get_name() for row in standings])
+        self.assertEqual([row['css'] for row in rows], ['promoted', '', '', 'relegated'])
+        self.assertEqual(rows[0]['value'], "3,000")
+        self.assertEqual(len(rows[0]['movies']), len(standings[0].memberships))
+        seasons = display.leader_rows(self.league)
+        self.assertEqual(seasons[0]['divisions'][0]['leader']['name'], rows[0]['name'])
+        context = {'season': self.season, 'division': self.division, 'standings': rows,
+                   'season_standings': display.season_rows(self.season), 'season_version': 'v', 'cache_ttl': 0}
+        with self.assertNumQueries(0):
+            rendered = render_to_string('division_standings.html', context)
+            rendered += render_to_string('season_standings.html', context)
+        self.assertEqual(rendered.count('class="promoted"'), 2)
+        self.assertIn("$3,000", rendered)
+
+    def test_season_movie_board(self):
+        """
+        Tests that released and upcoming movies are split and valued on the season's end date in two queries.
+        """
+        upcoming = models.Movie(name="Upcoming Movie", release_date=date(2013, 8, 1))
+        upcoming.save()
+        self.season.movies.add(upcoming, *self.movies)
+        with self.assertNumQueries(2):
+            released, unreleased = standings.season_movie_board(self.season, today=date(2013, 7, 15))
+        self.assertEqual(released, [(movie, movie.get_value_on_date(self.season.end_date)) for movie in self.movies])
+        self.assertEqual(unreleased, [(upcoming, 0)])
+        season = models.Season.objects.get(id=self.season.id)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(season.released_movies()) + len(season.unreleased_movies()), 5)
+        self.assertTrue(season.has_ended())
+
+    def test_membership_efficiencies(self):
+        """
+        Tests the single query efficiency leaderboard against the batched standings rows, with a free pick last.
+        """
+        models.MovieMembership.objects.filter(team=self.teams[3]).update(price=0)
+        with self.assertNumQueries(1):
+            best = list(standings.membership_efficiencies(self.season))
+        self.assertEqual([(membership.movie, membership.value_on_team, membership.efficiency) for membership in best],
+                         [(self.movies[2], 3000, 150), (self.movies[0], 1000, 100), (self.movies[1], 3000, 100),
+                          (self.movies[3], 500, None)])
+        rows = dict((row.movie.id, row) for team in standings.division_standings(self.division)
+                    for row in team.memberships)
+        for membership in best:
+            self.assertEqual(membership.efficiency, rows[membership.movie_id].efficiency())
+        self.assertEqual([membership.movie for membership in standings.membership_efficiencies(self.season, True)],
+                         [self.movies[1], self.movies[0], self.movies[2], self.movies[3]])
+        self.assertEqual(models.MovieMembership.objects.get(team=self.teams[3]).efficiency(), None)
+        response = self.client.get(reverse('season_picks', args=[self.season.id]), {'order': 'worst', 'page': 'x'})
+        self.assertEqual(response.context['page'].object_list[0].movie, self.movies[1])
+        self.assertContains(response, "Free pick")
+        models.MovieMembership.objects.filter(team=self.teams[2]).update(price=19)
+        models.MovieMembership.objects.filter(team=self.teams[0]).update(price=7)
+        best = list(standings.membership_efficiencies(self.season))
+        self.assertEqual([membership.movie for membership in best][:2], [self.movies[2], self.movies[0]])
+        self.assertAlmostEqual(best[0].efficiency, 3000 / 19.0)
+        self.assertAlmostEqual(models.MovieMembership.objects.get(team=self.teams[0]).efficiency(), 1000 / 7.0)
+        self.assertContains(self.client.get(reverse('season_picks', args=[self.season.id])), "$157.89 per")
+
+
+class SnapshotTest(StandingsTest):
+    """
+    Runs the standings tests again with the pages reading materialized snapshots.
+    """
+
+    def setUp(self):
+        super(SnapshotTest, self).setUp()
+        snapshots.update_snapshots()
+
+    def test_rebuild_season(self):
+        """
+        Tests that a full rebuild writes one snapshot per team per day, matching the live team values.
+        """
+        self.assertEqual(snapshots.rebuild_season(self.season), 365 * 4)
+        self.assertEqual(models.StandingsSnapshot.objects.count(), 365 * 4)
+        for day in [date(2013, 1, 1), date(2013, 7, 5), date(2013, 12, 31)]:
+            for snapshot in models.StandingsSnapshot.objects.filter(date=day).select_related('team'):
+                self.assertEqual(snapshot.value, snapshot.team.get_team_value_for_date(day))
+                self.assertEqual(snapshot.cost, snapshot.team.get_team_cost())
+        leaders = models.StandingsSnapshot.objects.filter(date=date(2013, 12, 31), position=0)
+        self.assertEqual([snapshot.team for snapshot in leaders], [self.teams[2]])
+
+    def test_update_snapshots(self):
+        """
+        Tests that only the days from the earliest new gross update onwards are rebuilt.
+        """
+        self.assertEqual(snapshots.update_snapshots(), [])
+        models.MovieGrossUpdate(movie=self.movies[0], date=date(2013, 12, 1), gross=10000, source="source1").save()
+        self.assertEqual(snapshots.update_snapshots(), [(self.season, 31 * 4)])
+        leader = models.StandingsSnapshot.objects.get(date=date(2013, 12, 31), position=0)
+        self.assertEqual((leader.team, leader.value), (self.teams[0], 10000))
+        self.assertEqual(models.StandingsSnapshot.objects.get(date=date(2013, 11, 30), position=0).team,
+                         self.teams[2])
+
+    def test_changes_discard_snapshots(self):
+        """
+        Tests that changes discard the snapshots they make stale, from the gross update's day or for the whole
+        season, and that those are rebuilt by the next update.
+        """
+        update = models.MovieGrossUpdate(movie=self.movies[0], date=date(2013, 12, 1), gross=10000, source="source1")
+        update.save()
+        self.assertEqual(models.StandingsSnapshot.objects.count(), 334 * 4)
+        snapshots.update_snapshots()
+        update.delete()
+        self.assertEqual(models.StandingsSnapshot.objects.count(), 334 * 4)
+        membership = models.MovieMembership.objects.filter(team=self.teams[0])[0]
+        membership.price += 1
+        membership.save()
+        self.assertFalse(models.StandingsSnapshot.objects.exists())
+        self.assertEqual(snapshots.update_snapshots(), [(self.season, 365 * 4)])
+        self.assertEqual(models.StandingsSnapshot.objects.get(team=self.teams[0], date=date(2013, 12, 31)).cost,
+                         self.teams[0].get_team_cost())
+
+    def test_ingest_discards_snapshots(self):
+        """
+        Tests that grosses ingested in bulk discard the snapshots they make stale, so the standings show them.
+        """
+        models.MovieExternalId(movie=self.movies[0], source="source1", identifier="tt-standings").save()
+        stream = StringIO("source,identifier,date,gross\nsource1,tt-standings,2013-12-01,10000\n")
+        self.assertEqual(ingest.ingest(ingest.read_records(stream, 'csv')).created, 1)
+        self.assertEqual(models.StandingsSnapshot.objects.count(), 334 * 4)
+        leader = snapshots.current_standings(self.division)[0]
+        self.assertEqual((leader.team, leader.value), (self.teams[0], 10000))
+
+    def test_pasted_updates_discard_snapshots(self):
+        """
+        Tests that updates saved together, as pasted into the admin, discard the snapshots they make stale.
+        """
+        update = models.MovieGrossUpdate(movie=self.movies[0], date=date(2013, 12, 1), gross=10000, source="source1")
+        self.assertEqual(ingest.save_updates([update]).created, 1)
+        self.assertEqual(models.StandingsSnapshot.objects.count(), 334 * 4)
+        leader = snapshots.current_standings(self.division)[0]
+        self.assertEqual((leader.team, leader.value), (self.teams[0], 10000))
+
+    def test_views_read_snapshots(self):
+        """
+        Tests that the pages render the snapshot values rather than recomputing them.
+        """
+        models.StandingsSnapshot.objects.filter(team=self.teams[2], date=date(2013, 12, 31)).update(value=123456)
+        for url in [reverse('league', args=[self.league.id]), reverse('seasons', args=[self.league.id]),
+                    reverse('season', args=[self.season.id]), reverse('division', args=[self.division.id]),
+                    reverse('team', args=[self.teams[2].id])]:
+            self.assertContains(self.client.get(url), "$123,456")
+
+
+class IngestTest(TestCase):
+
+    def setUp(self):
+        self.fixture_dir = os.path.join(os.path.dirname(__file__), 'fixtures')
+        self.movie1 = models.Movie(name="Ingest Movie 1", release_date=date(2013, 7, 1))
+        self.movie1.save()
+        self.movie2 = models.Movie(name="Ingest Movie 2", release_date=date(2013, 7, 1))
+        self.movie2.save()
+        models.MovieExternalId(movie=self.movie1, source="boxofficemojo", identifier="tt0001").save()
+        models.MovieExternalId(movie=self.movie2, source="boxofficemojo", identifier="tt0002").save()
+        models.MovieExternalId(movie=self.movie1, source="the-numbers", identifier="tt0001").save()
+
+    def _ingest_fixture(self, name, **kwargs):
+        with open(os.path.join(self.fixture_dir, name), 'rb') as stream:
+            return ingest.ingest(ingest.read_records(stream, ingest.format_for_path(name)), **kwargs)
+
+    def test_ingest_csv(self):
+        """
+        Tests that CSV records are resolved, deduplicated and counted.
+        """
+        stats = self._ingest_fixture('box_office_sample.csv', chunk_size=2)
+        self.assertEqual((stats.read, stats.created, stats.duplicates, stats.unresolved, stats.invalid),
+                         (7, 4, 1, 1, 1))
+        self.assertEqual(self.movie1.get_value_on_date(date(2013, 7, 3), source="boxofficemojo"), 2500)
+        self.assertEqual(self.movie1.get_value_on_date(date(2013, 7, 3), source="the-numbers"), 2600)
+        self.assertEqual(self.movie2.get_value(), 4000)
+
+    def test_ingest_jsonl(self):
+        """
+        Tests that JSONL records are ingested and that re-importing a feed creates nothing new.
+        """
+        self._ingest_fixture('box_office_sample.csv')
+        stats = self._ingest_fixture('box_office_sample.jsonl')
+        self.assertEqual((stats.read, stats.created, stats.duplicates, stats.unresolved, stats.invalid),
+                         (4, 2, 1, 0, 1))
+        self.assertEqual(self.movie2.get_value(), 5500)
+        stats = self._ingest_fixture('box_office_sample.jsonl')
+        self.assertEqual((stats.created, stats.duplicates), (0, 3))
+        self.assertEqual(models.MovieGrossUpdate.objects.count(), 6)
+
+    def test_unique_constraints(self):
+        """
+        Tests that the schema rejects a second update for the same movie, date and source, and a reused external id.
+        """
+        models.MovieGrossUpdate(movie=self.movie1, date=date(2013, 7, 2), gross=1000, source="boxofficemojo").save()
+        models.MovieGrossUpdate(movie=self.movie1, date=date(2013, 7, 2), gross=1000, source="the-numbers").save()
+        with self.assertRaises(IntegrityError):
+            models.MovieGrossUpdate(movie=self.movie1, date=date(2013, 7, 2), gross=1200,
+                                    source="boxofficemojo").save()
+        with self.assertRaises(IntegrityError):
+            models.MovieExternalId(movie=self.movie2, source="the-numbers", identifier="tt0001").save()
+
+    def test_import_grosses_command(self):
+        """
+        Tests the management command end to end.
+        """
+        output = StringIO()
+        call_command('import_grosses', os.path.join(self.fixture_dir, 'box_office_sample.csv'),
+                     os.path.join(self.fixture_dir, 'box_office_sample.jsonl'), chunk_size=3, stdout=output)
+        self.assertEqual(models.MovieGrossUpdate.objects.count(), 6)
+        self.assertIn("Done: read 11, created 6, 2 duplicates, 1 unresolved, 2 invalid", output.getvalue())
+
+
+class QueryBudgetTest(QueryBudgetMixin, LeagueFixtureMixin, TestCase):
+
+    @override_settings(LEAGUE_CACHE_TTL=0)
+    def test_view_query_budgets(self):
+        """
+        Tests that every page stays within its query budget, before and after snapshots are built and as the
+        division grows.
+        """
+        for rebuild in [False, True]:
+            if rebuild:
+                snapshots.update_snapshots()
+            self.assertWithinQueryBudget('home', reverse('league.views.home'))
+            self.assertWithinQueryBudget('league', reverse('league', args=[self.league.id]))
+            self.assertWithinQueryBudget('seasons', reverse('seasons', args=[self.league.id]))
+            self.assertWithinQueryBudget('season', reverse('season', args=[self.season.id]))
+            self.assertWithinQueryBudget('division', reverse('division', args=[self.division.id]))
+            self.assertWithinQueryBudget('team', reverse('team', args=[self.teams[0].id]))
+            self.assertWithinQueryBudget('season_picks', reverse('season_picks', args=[self.season.id]))
+            self.assertWithinQueryBudget('leagues', reverse('api_leagues'))
+            self.assertWithinQueryBudget('league_detail', reverse('api_league', args=[self.league.id]))
+            self.assertWithinQueryBudget('season_detail', reverse('api_season', args=[self.season.id]))
+            self.assertWithinQueryBudget('division_detail', reverse('api_division', args=[self.division.id]))
+            self.assertWithinQueryBudget('team_detail', reverse('api_team', args=[self.teams[0].id]))
+            self.assertWithinQueryBudget('movie_grosses', reverse('api_movie_grosses', args=[self.movies[0].id]))
+            for i in range(3):
+                team = models.Team(owner=self.users[i], division=self.division)
+                team.save()
+                for movie in self.movies:
+                    models.MovieMembership(movie=movie, team=team, price=1).save()
+
+    @override_settings(LEAGUE_INSTRUMENTATION=True, INTERNAL_IPS=('127.0.0.1',))
+    def test_stats_endpoint(self):
+        """
+        Tests that instrumented requests are recorded and reported by the stats endpoint.
+        """
+        instrumentation.reset_stats()
+        self.client.get(reverse('division', args=[self.division.id]))
+        stats = json.loads(self.client.get(reverse('stats')).content)
+        self.assertEqual(stats['views']['division']['requests'], 1)
+        self.assertEqual(stats['recent'][0]['path'], reverse('division', args=[self.division.id]))
+        self.assertEqual(stats['recent'][0]['status'], 200)
+        self.assertTrue(stats['recent'][0]['queries'] > 0)
+
+    @override_settings(LEAGUE_INSTRUMENTATION=False)
+    def test_disabled(self):
+        """
+        Tests that the middleware removes itself unless instrumentation is turned on.
+        """
+        self.assertRaises(MiddlewareNotUsed, instrumentation.QueryInstrumentationMiddleware)
+
+    def test_query_shape(self):
+        """
+        Tests that queries differing only in their parameters share a shape.
+        """
+        self.assertEqual(instrumentation.query_shape("SELECT * FROM t WHERE a = 12 AND b = 'x''y' AND c IN (1, 2, 3)"),
+                         "SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)")
+
+
+class ApiTest(LeagueFixtureMixin, TestCase):
+
+    def _get(self, name, args=None, **params):
+        response = self.client.get(reverse(name, args=args), params)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response.status_code, json.loads(response.content)
+
+    def test_division_standings(self):
+        """
+        Tests that a division's standings are ranked, paginated and trimmed to the requested fields.
+        """
+        status, data = self._get('api_division', [self.division.id])
+        self.assertEqual(status, 200)
+        self.assertEqual([(row['name'], row['value'], row['cost']) for row in data['standings']],
+                         [("owner2", 3000, 20), ("owner1", 3000, 30), ("owner0", 1000, 10),
+                          ("owner3", 500, 5)])
+        self.assertTrue(data['standings'][0]['promoted'])
+        self.assertTrue(data['standings'][3]['relegated'])
+        status, data = self._get('api_division', [self.division.id], page=2, per_page=3, fields='standings')
+        self.assertEqual(sorted(data), ['pagination', 'standings'])
+        self.assertEqual([row['position'] for row in data['standings']], [3])
+        self.assertEqual(data['pagination'], {'page': 2, 'per_page': 3, 'count': 4, 'num_pages': 2})
+
+    def test_team_and_league(self):
+        """
+        Tests the team, league and season endpoints.
+        """
+        status, data = self._get('api_team', [self.teams[2].id])
+        self.assertEqual((data['position'], data['value'], data['cost']), (0, 3000, 20))
+        self.assertEqual([(movie['name'], movie['price'], movie['value']) for movie in data['memberships']],
+                         [(self.movies[2].name, 20, 3000)])
+        status, data = self._get('api_league', [self.league.id], fields='name,seasons')
+        self.assertEqual(data['seasons'][0]['id'], self.season.id)
+        self.assertEqual(sorted(data), ['name', 'seasons'])
+        status, data = self._get('api_season', [self.season.id])
+        self.assertEqual([division['name'] for division in data['divisions']], [self.division.name])
+        status, data = self._get('api_leagues')
+        self.assertEqual([league['id'] for league in data['leagues']], [self.league.id])
+
+    def test_movie_grosses(self):
+        """
+        Tests gross histories, source filtering and rejected parameters.
+        """
+        models.MovieGrossUpdate(movie=self.movies[0], date=date(2013, 7, 20), gross=1500, source="source2").save()
+        status, data = self._get('api_movie_grosses', [self.movies[0].id])
+        self.assertEqual([(update['source'], update['gross']) for update in data['grosses']],
+                         [("source1", 500), ("source1", 1000), ("source2", 1500)])
+        status, data = self._get('api_movie_grosses', [self.movies[0].id], source="source2")
+        self.assertEqual([update['gross'] for update in data['grosses']], [1500])
+        status, data = self._get('api_movie_grosses', [self.movies[0].id], per_page=1000)
+        self.assertEqual(status, 400)
+        status, data = self._get('api_movie_grosses', [self.movies[0].id], page=5)
+        self.assertEqual(status, 400)
+        self.assertEqual(self.client.post(reverse('api_leagues')).status_code, 405)
+        self.assertEqual(self.client.get(reverse('api_team', args=[999])).status_code, 404)
+
+
+class SeriesTest(LeagueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super(SeriesTest, self).setUp()
+        # A second source reporting on the same day as the first; the later update wins, as in the lookups
+        models.MovieGrossUpdate(movie=self.movies[0], date=date(2013, 7, 12), gross=1200, source="source2").save()
+
+    def test_team_series(self):
+        """
+        Tests that a team's series carries each movie's latest gross forward, in two queries.
+        """
+        with self.assertNumQueries(2):
+            days, values = series.team_series(self.teams[0])
+        self.assertEqual((days[0], days[-1], len(values)), (date(2013, 1, 1), date(2013, 12, 31), 365))
+        self.assertEqual([values[days.index(date(2013, 7, day))] for day in [4, 5, 11, 12, 13]],
+                         [0, 500, 500, 1200, 1200])
+        self.assertEqual(values[-1], self.teams[0].get_team_value_for_date(date(2013, 12, 31)))
+
+    def test_division_series(self):
+        """
+        Tests that every team's series matches its value computed day by day, in standings order.
+        """
+        days, rows = series.division_series(self.division)
+        self.assertEqual([team.id for team, values in rows], [self.teams[2].id, self.teams[1].id,
+                                                               self.teams[0].id, self.teams[3].id])
+        for day in [date(2013, 7, 4), date(2013, 7, 5), date(2013, 7, 12), date(2013, 12, 31)]:
+            for team, values in rows:
+                self.assertEqual(values[days.index(day)], team.get_team_value_for_date(day))
+
+    @unittest.skipIf(series.numpy is None, "NumPy is not installed")
+    def test_numpy_series(self):
+        """
+        Tests that the NumPy path agrees with the sweep.
+        """
+        models.MovieMembership(movie=self.movies[1], team=self.teams[0], price=1).save()
+        models.MovieGrossUpdate(movie=self.movies[1], date=date(2012, 12, 1), gross=100, source="source1").save()
+        self.assertEqual(series.division_series(self.division, use_numpy=True),
+                         series.division_series(self.division, use_numpy=False))
+
+    def test_series_api(self):
+        """
+        Tests the series endpoints and that the pages link their race charts to them.
+        """
+        data = json.loads(self.client.get(reverse('api_division_series', args=[self.division.id])).content)
+        self.assertEqual((len(data['dates']), data['dates'][0]), (365, "2013-01-01"))
+        self.assertEqual([(team['name'], team['values'][-1]) for team in data['teams']],
+                         [("owner2", 3000), ("owner1", 3000), ("owner0", 1200), ("owner3", 500)])
+        data = json.loads(self.client.get(reverse('api_team_series', args=[self.teams[2].id])).content)
+        self.assertEqual(data['values'][-1], 3000)
+        self.assertContains(self.client.get(reverse('team', args=[self.teams[2].id])),
+                            reverse('api_division_series', args=[self.division.id]))
+
+
+@override_settings(LEAGUE_STANDINGS_JOBS=True)
+class StandingsJobTest(LeagueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super(StandingsJobTest, self).setUp()
+        models.StandingsJob.objects.all().delete()
+
+    def test_enqueue_coalesces(self):
+        """
+        Tests that changes to a season share one pending job covering the earliest changed day.
+        """
+        models.MovieGrossUpdate(movie=self.movies[0], date=date(2013, 8, 1), gross=1100, source="source1").save()
+        models.MovieGrossUpdate(movie=self.movies[1], date=date(2013, 7, 20), gross=3100, source="source1").save()
+        job = models.StandingsJob.objects.get()
+        self.assertEqual((job.season_id, job.status, job.from_date), (self.season.id, 'pending', date(2013, 7, 20)))
+        models.MovieMembership.objects.get(team=self.teams[0]).save()
+        self.assertEqual(models.StandingsJob.objects.get().from_date, None)
+        self.assertRaises(IntegrityError, models.StandingsJob.objects.create, season=self.season,
+                          pending_season=self.season.id, run_after=timezone.now())
+        with self.settings(LEAGUE_STANDINGS_JOBS=False):
+            models.Team.objects.get(id=self.teams[0].id).save()
+        self.assertEqual(models.StandingsJob.objects.count(), 1)
+
+    @override_settings(LEAGUE_SHARED_CACHE=True)
+    def test_worker(self):
+        """
+        Tests that the worker rebuilds snapshots and caches the season's pages, and that a season's jobs never run
+        concurrently.
+        """
+        models.MovieGrossUpdate(movie=self.movies[3], date=date(2013, 8, 1), gross=9000, source="source1").save()
+        running = models.StandingsJob.objects.create(season=self.season, status='running', run_after=timezone.now())
+        self.assertEqual(jobs.work(), [])
+        running.delete()
+        output = StringIO()
+        call_command('run_standings_worker', once=True, stdout=output)
+        self.assertIn("Finished job", output.getvalue())
+        self.assertEqual(models.StandingsJob.objects.get().status, 'done')
+        self.assertEqual(models.StandingsSnapshot.objects.get(team=self.teams[3], date=date(2013, 12, 31)).position, 0)
+        with self.assertNumQueries(1):
+            self.assertContains(self.client.get(reverse('division', args=[self.division.id])), "$9,000")
+
+    def test_stale_jobs(self):
+        """
+        Tests that a job left running by a dead worker is handed out again, folded into its season's pending job if
+        there is one.
+        """
+        jobs.enqueue([self.season.id], date(2013, 8, 1))
+        stale = models.StandingsJob.objects.create(season=self.season, status='running', from_date=date(2013, 7, 1),
+                                                   run_after=timezone.now())
+        models.StandingsJob.objects.filter(id=stale.id).update(updated=timezone.now() - jobs.STALE_AFTER * 2)
+        job = jobs.claim_next()
+        self.assertNotEqual(job.id, stale.id)
+        self.assertEqual((job.from_date, job.pending_season), (date(2013, 7, 1), None))
+        self.assertEqual(models.StandingsJob.objects.get(id=stale.id).status, 'failed')
+        models.StandingsJob.objects.filter(id=job.id).update(updated=timezone.now() - jobs.STALE_AFTER * 2)
+        self.assertEqual(jobs.claim_next().id, job.id)
+
+    def test_retry(self):
+        """
+        Tests that failed jobs are retried with backoff and given up after the last attempt.
+        """
+        jobs.enqueue([self.season.id])
+        rebuild_season = snapshots.rebuild_season
+
+        def broken(*args, **kwargs):
+            raise ValueError("broken")
+        snapshots.rebuild_season = broken
+        try:
+            for attempt in range(1, jobs.MAX_ATTEMPTS + 1):
+                [(job, succeeded)] = jobs.work()
+                self.assertFalse(succeeded)
+                job = models.StandingsJob.objects.get()
+                self.assertEqual(job.attempts, attempt)
+                self.assertEqual(jobs.work(), [])
+                models.StandingsJob.objects.filter(id=job.id).update(run_after=timezone.now())
+        finally:
+            snapshots.rebuild_season = rebuild_season
+        self.assertEqual((job.status, job.last_error.strip().splitlines()[-1]), ('failed', "ValueError: broken"))
+
+    @override_settings(INTERNAL_IPS=('127.0.0.1',))
+    def test_status_view(self):
+        """
+        Tests that the status view reports the queue.
+        """
+        jobs.enqueue([self.season.id])
+        status = json.loads(self.client.get(reverse('job_status')).content)
+        self.assertEqual(status['counts'], {'pending': 1, 'running': 0, 'done': 0, 'failed': 0})
+        self.assertEqual(status['recent'][0]['season'], self.season.id)
+        with self.settings(INTERNAL_IPS=()):
+            self.assertEqual(self.client.get(reverse('job_status')).status_code, 404)
+
+
+class RolloverTest(TestCase):
+
+    def setUp(self):
+        self.league = synthetic.generate_league(divisions=3, teams=4, movies_per_team=2, updates_per_movie=3,
+                                                name="rollover")
+        self.season = self.league.season_set.get()
+        self.ladder = standings.season_standings(self.season)
+
+    def _owners(self, division_index, positions):
+        return set(self.ladder[division_index][1][position].team.owner_id for position in positions)
+
+    def test_rollover(self):
+        """
+        Tests that owners move between adjacent divisions by their final positions, in a fixed number of queries.
+        """
+        with self.assertNumQueries(5):
+            plan = rollover.plan_rollover(self.season)
+        new_season = rollover.apply_rollover(self.season, plan, "Next", date(2001, 1, 1), date(2001, 6, 1))
+        divisions = list(models.Division.objects.filter(season=new_season).order_by('sort_order'))
+        self.assertEqual([division.name for division in divisions], ["Division 1", "Division 2", "Division 3"])
+        owners = [set(models.Team.objects.filter(division=division).values_list('owner_id', flat=True))
+                  for division in divisions]
+        self.assertEqual(owners[0], self._owners(0, [0, 1]) | self._owners(1, [0, 1]))
+        self.assertEqual(owners[1], self._owners(0, [2, 3]) | self._owners(2, [0, 1]))
+        self.assertEqual(owners[2], self._owners(1, [2, 3]) | self._owners(2, [2, 3]))
+
+    def test_rollover_command(self):
+        """
+        Tests the dry run report and that an unfinished season is refused.
+        """
+        output = StringIO()
+        call_command('rollover_season', str(self.season.id), dry_run=True, stdout=output)
+        self.assertIn("Division 2: 4 teams, 0 stayed, 2 promoted in, 2 relegated in", output.getvalue())
+        self.assertIn("Dry run", output.getvalue())
+        self.assertEqual(self.league.season_set.count(), 1)
+        call_command('rollover_season', str(self.season.id), season_name="2001", stdout=output)
+        new_season = self.league.season_set.get(name="2001")
+        self.assertEqual((new_season.start_date, models.Team.objects.filter(division__season=new_season).count()),
+                         (date(2001, 1, 1), 12))
+        new_season.end_date = date.today()
+        new_season.save()
+        self.assertRaises(CommandError, call_command, 'rollover_season', str(new_season.id), stdout=output)
+
+    def test_shared_sort_order(self):
+        """
+        Tests that a season whose divisions share a sort order isn't rolled over, since the copies couldn't be told
+        apart.
+        """
+        models.Division.objects.filter(season=self.season).update(sort_order=0)
+        plan = rollover.plan_rollover(self.season)
+        self.assertRaises(ValueError, rollover.apply_rollover, self.season, plan, "Next", date(2001, 1, 1),
+                          date(2001, 6, 1))
+        self.assertRaises(CommandError, call_command, 'rollover_season', str(self.season.id), stdout=StringIO())
+
+
+class DraftTest(LeagueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super(DraftTest, self).setUp()
+        self.division.max_currency = 35
+        self.division.save()
+
+    def test_knapsack(self):
+        """
+        Tests the dynamic program against every selection of a small set, including the cheaper of equal selections.
+        """
+        import itertools
+        items = [(10, 60), (20, 100), (30, 120), (15, 70), (5, 20), (25, 0), (0, 5), (60, 500)]
+        best = None
+        for size in range(len(items) + 1):
+            for selection in itertools.combinations(range(len(items)), size):
+                value = sum(items[index][1] for index in selection)
+                cost = sum(items[index][0] for index in selection)
+                if cost <= 50 and (best is None or (value, -cost) > (best[0], -best[1])):
+                    best = (value, cost)
+        value, cost, chosen = draft.knapsack(items, 50, use_numpy=False)
+        self.assertEqual((value, cost), best)
+        self.assertEqual((value, cost), (sum(items[index][1] for index in chosen),
+                                         sum(items[index][0] for index in chosen)))
+        self.assertEqual(draft.knapsack([(10, 60), (10, 60)], 5), (0, 0, []))
+
+    @unittest.skipIf(draft.numpy is None, "NumPy is not installed")
+    def test_knapsack_numpy(self):
+        """
+        Tests that the NumPy path picks the same selection.
+        """
+        items = [(price * 5, (price * 37) % 101) for price in range(1, 40)]
+        self.assertEqual(draft.knapsack(items, 400, use_numpy=True), draft.knapsack(items, 400, use_numpy=False))
+
+    def test_optimal_roster(self):
+        """
+        Tests that the board loads in a fixed number of queries and finds the best roster under the division budget.
+        """
+        with self.assertNumQueries(5):
+            board = draft.DraftBoard(self.season)
+        with self.assertNumQueries(0):
+            value, cost, movies = board.optimal_roster(self.division)
+        self.assertEqual((value, cost, movies), (4500, 35, [self.movies[0], self.movies[2], self.movies[3]]))
+        self.assertEqual(board.optimal_roster(self.division, date(2013, 7, 6))[:2], (2250, 35))
+        self.assertEqual(board.optimal_roster(self.division, date(2013, 7, 1))[:2], (0, 0))
+
+    def test_rerank(self):
+        """
+        Tests that a swap re-ranks the division in memory and leaves the saved rosters alone.
+        """
+        board = draft.DraftBoard(self.season)
+        with self.assertNumQueries(0):
+            rows = board.rerank(self.division, [(self.teams[3].id, self.movies[3].id, self.movies[1].id)])
+        self.assertEqual([(row.team, row.value, row.cost) for row in rows],
+                         [(self.teams[2], 3000, 20), (self.teams[1], 3000, 30), (self.teams[3], 3000, 30),
+                          (self.teams[0], 1000, 10)])
+        self.assertEqual([row.team for row in board.rerank(self.division)],
+                         [row.team for row in standings.division_standings(self.division)])
+        self.assertEqual(models.MovieMembership.objects.get(team=self.teams[3]).movie, self.movies[3])
+        self.assertRaises(ValueError, board.rerank, self.division, [(self.teams[0].id, self.movies[1].id, None)])
+
+    def test_optimize_command(self):
+        """
+        Tests the command report with a swap and its validation.
+        """
+        output = StringIO()
+        call_command('optimize_draft', str(self.season.id), division=self.division.id,
+                     swaps=['%d:%d:' % (self.teams[1].id, self.movies[1].id)], stdout=output)
+        self.assertIn("Premier: best roster worth 4500 for 35 of 35 C", output.getvalue())
+        self.assertIn("4. %s: 0 for 0" % self.teams[1].get_name(), output.getvalue())
+        self.assertRaises(CommandError, call_command, 'optimize_draft', str(self.season.id), swaps=['1:2:3'],
+                          stdout=output)
+
+
+class ExportTest(LeagueFixtureMixin, TestCase):
+
+    def _content(self, response):
+        self.assertEqual(response.status_code, 200)
+        return ''.join(response.streaming_content)
+
+    def test_rows(self):
+        """
+        Tests that reading a table in chunks returns every row once, in id order, in a query per chunk.
+        """
+        updates = list(models.MovieGrossUpdate.objects.order_by('id').values_list('id', 'movie', 'date', 'gross',
+                                                                                   'source'))
+        self.assertEqual(len(updates), 9)
+        with self.assertNumQueries(5):
+            self.assertEqual(list(export.rows(self.league, 'grosses', chunk_size=2)), updates)
+        self.assertEqual([row[2] for row in export.rows(self.league, 'teams')],
+                         [user.username for user in self.users])
+        self.assertRaises(ValueError, export.export, self.league, 'users', 'csv')
+
+    def test_export_endpoint(self):
+        """
+        Tests CSV and JSON lines downloads and that unknown formats are refused.
+        """
+        url = reverse('api_league_export', args=[self.league.id, 'memberships'])
+        lines = self._content(self.client.get(url)).splitlines()
+        self.assertEqual(lines[0], 'id,team,movie,price')
+        self.assertEqual(len(lines), 5)
+        response = self.client.get(reverse('api_league_export', args=[self.league.id, 'seasons']), {'format': 'jsonl'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="league-%d-seasons.jsonl"' %
+                         self.league.id)
+        self.assertEqual([json.loads(line) for line in self._content(response).splitlines()],
+                         [{'id': self.season.id, 'league': self.league.id, 'name': '2013', 'start_date': '2013-01-01',
+                           'end_date': '2013-12-31'}])
+        self.assertEqual(self.client.get(url, {'format': 'columnar'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'format': 'xml'}).status_code, 400)
+
+    def test_columnar_export(self):
+        """
+        Tests that the columnar gross file written by the command has a footer describing its row groups.
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            call_command('export_league', str(self.league.id), format='columnar', output=directory, stdout=StringIO())
+            path = os.path.join(directory, 'league-%d-grosses.mlcol' % self.league.id)
+            footer = export.read_footer(path)
+            self.assertEqual(footer['row_groups'], [[8, 9]])
+            self.assertEqual(footer['sources'], ['source1'])
+            self.assertEqual(os.path.getsize(path), 8 + 9 * 4 * 8 + len(json.dumps(footer)) + 16)
+            if export.numpy is not None:
+                footer, columns = export.read_gross_columns(path)
+                self.assertEqual(columns['gross'].tolist(),
+                                 list(models.MovieGrossUpdate.objects.order_by('id').values_list('gross', flat=True)))
+                self.assertEqual(columns['date'][0], (date(2013, 7, 5) - date(1970, 1, 1)).days)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_import_round_trip(self):
+        """
+        Tests that an exported league imports as a copy with new ids, reusing existing owners, in both formats, and
+        that external identifiers are only taken when no movie holds them.
+        """
+        models.MovieMembership.objects.filter(team=self.teams[0]).update(price=0)
+        self.season.movies.add(self.movies[0])
+        self.league.players.add(*self.users[1:])
+        models.MovieExternalId(movie=self.movies[1], source="boxoffice", identifier="tt1").save()
+        directory = tempfile.mkdtemp()
+        try:
+            for export_format in ['csv', 'jsonl']:
+                call_command('export_league', str(self.league.id), format=export_format, output=directory,
+                             stdout=StringIO())
+            for export_format in ['csv', 'jsonl']:
+                output = StringIO()
+                call_command('import_league', directory, format=export_format, stdout=output)
+                self.assertIn("grosses                9 rows", output.getvalue())
+                copy = models.League.objects.order_by('-id')[0]
+                self.assertNotEqual(copy.id, self.league.id)
+                self.assertEqual((copy.name, copy.commissioner), (self.league.name, self.league.commissioner))
+                division = models.Division.objects.get(season__league=copy)
+                self.assertEqual([(row.team.owner, row.cost, row.value)
+                                  for row in standings.division_standings(division)],
+                                 [(row.team.owner, row.cost, row.value)
+                                  for row in standings.division_standings(self.division)])
+                self.assertEqual(list(division.season.movies.values_list('name', flat=True)), [self.movies[0].name])
+                self.assertEqual(list(copy.players.order_by('id')), self.users[1:])
+                external_id = models.MovieExternalId.objects.get(source="boxoffice", identifier="tt1")
+                if export_format == 'csv':
+                    self.assertEqual(external_id.movie, self.movies[1])
+                    external_id.delete()
+                else:
+                    self.assertEqual(external_id.movie.moviemembership_set.get().team.division, division)
+            self.assertEqual(User.objects.count(), 4)
+            self.assertEqual(models.Movie.objects.count(), 12)
+            os.remove(os.path.join(directory, 'league-%d-grosses.csv' % self.league.id))
+            self.assertRaises(CommandError, call_command, 'import_league', directory, stdout=StringIO())
+        finally:
+            shutil.rmtree(directory)
+
+    def test_import_unknown_reference(self):
+        """
+        Tests that a row referring to a row missing from the export is reported by table and column.
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            call_command('export_league', str(self.league.id), format='csv', output=directory, stdout=StringIO())
+            path = os.path.join(directory, 'league-%d-memberships.csv' % self.league.id)
+            with open(path) as memberships:
+                lines = memberships.read().splitlines()
+            membership_id, team, movie, price = lines[1].split(',')
+            lines[1] = ','.join([membership_id, '999999', movie, price])
+            with open(path, 'w') as memberships:
+                memberships.write('\n'.join(lines) + '\n')
+            with self.assertRaises(CommandError) as raised:
+                call_command('import_league', directory, format='csv', stdout=StringIO())
+            self.assertEqual(str(raised.exception), "memberships.team refers to unknown teams 999999")
+        finally:
+            shutil.rmtree(directory)
+
+
+class AllTimeTest(TestCase):
+
+    def setUp(self):
+        self.league = synthetic.generate_league(seasons=2, divisions=2, teams=3, movies_per_team=2,
+                                                updates_per_movie=3, name="alltime")
+
+    def test_close_seasons(self):
+        """
+        Tests that closing seasons adds each owner's results once, matching the standings of every season.
+        """
+        self.assertEqual(len(alltime.close_ended_seasons()), 2)
+        self.assertEqual(alltime.close_ended_seasons(), [])
+        expected = {}
+        for season in self.league.season_set.all():
+            for index, (division, rows) in enumerate(standings.season_standings(season)):
+                for row in rows:
+                    record = expected.setdefault(row.team.owner_id, [0, 0, 0, 0, 0])
+                    record[0] += 1
+                    record[1] += row.value
+                    record[2] += index == 0 and row.position == 0
+                    record[3] += index == 1 and row.is_promoted()
+                    record[4] += index == 0 and row.is_relegated()
+        records = models.OwnerRecord.objects.filter(league=self.league)
+        self.assertEqual(dict((record.owner_id, [record.seasons, record.total_value, record.titles,
+                                                 record.promotions, record.relegations]) for record in records),
+                         expected)
+        self.assertEqual(sum(record.titles for record in records), 2)
+        self.assertEqual(len(alltime.rebuild_league(self.league)), 2)
+        self.assertEqual(models.OwnerRecord.objects.filter(league=self.league).count(), 6)
+
+    def test_leaderboard_view(self):
+        """
+        Tests that the leaderboard is sorted and paginated straight from the records.
+        """
+        call_command('close_seasons', league=self.league.id, stdout=StringIO())
+        best = alltime.leaderboard(self.league, 'promotions')[0]
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('alltime', args=[self.league.id]), {'sort': 'promotions'})
+        self.assertEqual(response.context['page'].object_list[0], best)
+        self.assertContains(response, best.owner.username)
+        response = self.client.get(reverse('alltime', args=[self.league.id]), {'sort': 'bogus', 'page': 9})
+        self.assertEqual((response.context['sort'], response.context['page'].number), ('total_value', 1))
+
+
+class SyntheticLeagueTest(TestCase):
+
+    def test_generate_and_benchmark(self):
+        """
+        Tests that a generated league has the requested scale and that the benchmarks run against it.
+        """
+        league = synthetic.generate_league(seasons=2, divisions=2, teams=3, movies_per_team=2, updates_per_movie=5,
+                                           sources=2, name="bench")
+        self.assertEqual(league.season_set.count(), 2)
+        self.assertEqual(models.Team.objects.filter(division__season__league=league).count(), 12)
+        self.assertEqual(models.MovieMembership.objects.count(), 24)
+        self.assertEqual(models.MovieGrossUpdate.objects.count(), 2 * 6 * 5 * 2)
+        for division in models.Division.objects.filter(season__league=league):
+            memberships = models.MovieMembership.objects.filter(team__division=division)
+            self.assertEqual(len(set(memberships.values_list('movie_id', flat=True))), 6)
+        results = benchmarks.run_benchmarks(league, repeat=1)
+        self.assertEqual(results['scale']['teams'], 6)
+        self.assertEqual(sorted(results['results']), ['Division.sorted_teams', 'Movie.get_value_on_date',
+                                                      'gross_values_on_date', 'season_movie_board',
+                                                      'template.division_objects.teams_1',
+                                                      'template.division_objects.teams_3',
+                                                      'template.division_rows.teams_1',
+                                                      'template.division_rows.teams_3',
+                                                      'template.division_standings',
+                                                      'template.division_standings.cached',
+                                                      'template.season_standings', 'template.season_standings.cached',
+                                                      'view.division', 'view.home', 'view.league', 'view.season',
+                                                      'view.seasons', 'view.team'])
+        self.assertEqual(results['results']['Division.sorted_teams']['queries'], 4)
+        for name in results['results']:
+            if name.startswith('template.') and not name.startswith('template.division_objects.'):
+                self.assertEqual(results['results'][name]['queries'], 0)
+        self.assertEqual(results['template_scaling']['rows']['queries_per_team'], 0)
+        self.assertTrue(results['template_scaling']['objects']['queries_per_team'] > 0)
+        self.assertEqual(results['results']['gross_values_on_date']['queries'], 1)
+        for result in results['results'].values():
+            self.assertTrue(0 <= result['peak_memory_growth_kb'] <= result['process_peak_memory_kb'])
+        self.assertEqual([row[0] for row in benchmarks.compare(results, results)], sorted(results['results']))
+
+
+class CachingTest(LeagueFixtureMixin, TestCase):
+
+    def _division_page(self):
+        return self.client.get(reverse('division', args=[self.division.id]))
+
+    def test_page_served_from_cache(self):
+        """
+        Tests that a cached page is served with only the query reading its version until the season's data changes.
+        """
+        self.assertContains(self._division_page(), "$3,000")
+        with self.assertNumQueries(1):
+            self.assertContains(self._division_page(), "$3,000")
+        models.MovieGrossUpdate(movie=self.movies[2], date=date(2013, 8, 1), gross=7000, source="source1").save()
+        self.assertContains(self._division_page(), "$7,000")
+        models.MovieMembership.objects.filter(team=self.teams[2]).update(price=99)
+        self.assertNotContains(self._division_page(), "C 99")
+        models.MovieMembership.objects.get(team=self.teams[2]).save()
+        self.assertContains(self._division_page(), "C 99")
+
+    def test_settings_invalidate(self):
+        """
+        Tests that editing the league, season or division changes the pages showing them.
+        """
+        self.assertContains(self._division_page(), "$3,000")
+        self.league.name = "Renamed League"
+        self.league.save()
+        self.assertContains(self._division_page(), "Renamed League")
+        self.season.name = "Renamed Season"
+        self.season.save()
+        self.assertContains(self._division_page(), "Renamed Season")
+        self.division.currency_unit = "EUR"
+        self.division.save()
+        self.assertContains(self._division_page(), "EUR")
+
+    def test_fragments_cached_for_users(self):
+        """
+        Tests that signed in users, who skip the page cache, still get the cached standings fragments.
+        """
+        self.client.login(username='owner0', password='password')
+        self.assertContains(self.client.get(reverse('season', args=[self.season.id])), "$3,000")
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('season', args=[self.season.id]))
+        self.assertContains(response, "Welcome, owner0")
+        self.assertContains(response, "$3,000")
+
+    def test_bulk_writes_invalidate(self):
+        """
+        Tests that writes bypassing signals still invalidate cached pages.
+        """
+        self._division_page()
+        models.MovieGrossUpdate.objects.bulk_create([models.MovieGrossUpdate(
+            movie=self.movies[2], date=date(2013, 8, 1), gross=7000, source="source1")])
+        reconcile.reconcile_movies([self.movies[2].id])
+        self.assertNotContains(self._division_page(), "$7,000")
+        caching.invalidate_all()
+        self.assertContains(self._division_page(), "$7,000")
+
+    def test_conditional_get(self):
+        """
+        Tests that unchanged pages are answered with 304 Not Modified after reading their version, and changed ones in
+        full.
+        """
+        response = self._division_page()
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        url = reverse('division', args=[self.division.id])
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        models.MovieMembership.objects.get(team=self.teams[2]).save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.client.login(username='owner0', password='password')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_versions_shared(self):
+        """
+        Tests that versions are kept in the database, so changes made by other processes, which don't share this
+        one's cache, still change pages and their validators.
+        """
+        response = self._division_page()
+        models.SeasonVersion.objects.filter(season=self.season).update(
+            token='other', modified=timezone.make_aware(datetime(2100, 1, 1), timezone.utc))
+        url = reverse('division', args=[self.division.id])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], 'Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_warm_league_cache(self):
+        """
+        Tests that warming renders every page of a season, and refuses to when the cache isn't shared.
+        """
+        self.assertRaises(CommandError, call_command, 'warm_league_cache', all=True)
+        output = StringIO()
+        with self.settings(LEAGUE_SHARED_CACHE=True):
+            call_command('warm_league_cache', all=True, stdout=output)
+        self.assertIn("Warmed 8 pages in total", output.getvalue())
+        with self.assertNumQueries(1):
+            self._division_page()
+
+
+@override_settings(LEAGUE_LIVE_PAGES=('season',), LEAGUE_LIVE_PUBLISHER='local', LEAGUE_LIVE_KEEPALIVE=0)
+class LiveTest(LeagueFixtureMixin, TestCase):
+
+    def _event(self, stream):
+        fields = dict(line.split(': ', 1) for line in next(stream).strip().split('\n'))
+        return fields['event'], fields['id'], json.loads(fields['data'])
+
+    def test_scoreboard(self):
+        """
+        Tests that subscribers get the season's standings, then one computed diff per change, and are removed when
+        their connection closes.
+        """
+        publisher = live.get_publisher()
+        response = self.client.get(reverse('season_live', args=[self.season.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = iter(response.streaming_content)
+        self.assertEqual(next(stream), 'retry: %d\n\n' % live.RETRY)
+        name, event_id, data = self._event(stream)
+        self.assertEqual(name, 'standings')
+        self.assertEqual([(team['team'], team['position'], team['value'], team['cost']) for team in data['teams']],
+                         [(self.teams[0].id, 2, 1000, 10), (self.teams[1].id, 1, 3000, 30),
+                          (self.teams[2].id, 0, 3000, 20), (self.teams[3].id, 3, 500, 5)])
+        self.assertEqual([(team['promoted'], team['relegated']) for team in data['teams']],
+                         [(False, False), (False, False), (True, False), (False, True)])
+        other = live.event_stream(publisher, self.season.id)
+        next(other)
+        self.assertEqual(self._event(other)[0], 'standings')
+        computations = publisher.computations
+        self.assertEqual(publisher.poll(), 0)
+        self.assertEqual(next(stream), ': keepalive\n\n')
+
+        models.MovieGrossUpdate(movie=self.movies[3], date=date(2013, 7, 20), gross=5000, source="source1").save()
+        self.assertEqual(publisher.poll(), 1)
+        self.assertEqual(publisher.computations, computations + 1)
+        for subscriber in (stream, other):
+            name, event_id, data = self._event(subscriber)
+            self.assertEqual(name, 'diff')
+            self.assertEqual(dict((team['team'], team['position']) for team in data['teams']),
+                             {self.teams[0].id: 3, self.teams[1].id: 2, self.teams[2].id: 1, self.teams[3].id: 0})
+            self.assertEqual(dict((team['team'], (team['promoted'], team['relegated'])) for team in data['teams']),
+                             {self.teams[0].id: (False, True), self.teams[1].id: (False, False),
+                              self.teams[2].id: (False, False), self.teams[3].id: (True, False)})
+            self.assertEqual(data['removed'], [])
+
+        reconnected = live.event_stream(publisher, self.season.id, event_id)
+        next(reconnected)
+        self.assertEqual(next(reconnected), ': keepalive\n\n')
+        for subscriber in (response, other, reconnected):
+            subscriber.close()
+        self.assertEqual(publisher.channels, {})
+        self.assertEqual(self.client.get(reverse('season_live', args=[0])).status_code, 404)
+
+    def test_live_pages(self):
+        """
+        Tests that only the pages listed in settings open a live stream, and that the stream is off without any.
+        """
+        self.assertContains(self.client.get(reverse('season', args=[self.season.id])),
+                            'data-live="%s"' % reverse('season_live', args=[self.season.id]))
+        self.assertNotContains(self.client.get(reverse('division', args=[self.division.id])), 'data-live')
+        with self.settings(LEAGUE_LIVE_PAGES=()):
+            self.assertEqual(self.client.get(reverse('season_live', args=[self.season.id])).status_code, 404)
+
+
+@override_settings(LEAGUE_READ_REPLICAS=('replica',))
+class RoutingTest(LeagueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super(RoutingTest, self).setUp()
+        self.router = routing.ReplicaRouter()
+        self.middleware = ReplicaMiddleware()
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        routing.deactivate()
+
+    def _read_alias(self, request, view):
+        self.middleware.process_request(request)
+        self.middleware.process_view(request, view, (), {})
+        return self.router.db_for_read(models.Team)
+
+    def test_replica_reads(self):
+        """
+        Tests that read-only requests to league views read from the replica until they write, and that writes always
+        go to the primary.
+        """
+        request = self.factory.get(reverse('league', args=[self.league.id]))
+        self.assertEqual(self._read_alias(request, views.league), 'replica')
+        self.assertEqual(self.router.db_for_write(models.Team), 'default')
+        self.assertEqual(self.router.db_for_read(models.Team, instance=self.teams[0]), 'replica')
+        self.assertFalse(self.middleware.process_response(request, HttpResponse()).cookies)
+        self.assertEqual(self.router.db_for_read(models.Team), 'default')
+
+        request = self.factory.get(reverse('season', args=[self.season.id]))
+        self.assertEqual(self._read_alias(request, views.season), 'replica')
+        self.teams[0].save()
+        self.assertEqual(self.router.db_for_read(models.Team), 'default')
+        self.assertIn(routing.PIN_COOKIE, self.middleware.process_response(request, HttpResponse()).cookies)
+        self.assertFalse(self.router.allow_syncdb('replica', models.Team))
+        self.assertTrue(self.router.allow_relation(self.teams[0], self.division))
+
+    def test_primary_reads(self):
+        """
+        Tests that the admin, requests that aren't GETs and browsers that wrote recently read from the primary.
+        """
+        self.assertEqual(self._read_alias(self.factory.get('/admin/'), admin.site.index), 'default')
+        request = self.factory.post(reverse('league', args=[self.league.id]))
+        self.assertEqual(self._read_alias(request, views.league), 'default')
+        self.assertIn(routing.PIN_COOKIE, self.middleware.process_response(request, HttpResponse()).cookies)
+        request = self.factory.get(reverse('league', args=[self.league.id]))
+        request.COOKIES[routing.PIN_COOKIE] = '1'
+        self.assertEqual(self._read_alias(request, views.league), 'default')
+        with self.settings(LEAGUE_READ_REPLICAS=()):
+            self.assertEqual(self._read_alias(self.factory.get('/'), views.league), 'default')
+
+    def test_recent_changes_read_primary(self):
+        """
+        Tests that pages showing a season that changed within the pin time read from the primary, without pinning
+        the browser.
+        """
+        def view(request, season_id):
+            return HttpResponse(routing.read_alias())
+        page = caching.league_page(caching.season_seasons)(view)
+        models.SeasonVersion.objects.filter(season=self.season).update(modified=timezone.now() - timedelta(hours=1))
+        for alias in ['replica', 'default']:
+            request = self.factory.get(reverse('season', args=[self.season.id]))
+            request.user = AnonymousUser()
+            self._read_alias(request, views.season)
+            self.assertEqual(page(request, season_id=self.season.id).content, alias)
+            self.assertFalse(self.middleware.process_response(request, HttpResponse()).cookies)
+            caching.bump_seasons([self.season.id])
+
+
+class AdminTest(LeagueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super(AdminTest, self).setUp()
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+
+    def test_raw_id_widgets(self):
+        """
+        Tests that a team's page links movies and users by id rather than listing every one of them.
+        """
+        response = self.client.get(reverse('admin:league_team_change', args=[self.teams[0].id]))
+        self.assertContains(response, 'vForeignKeyRawIdAdminField')
+        self.assertNotContains(response, '<option value="%d">' % self.movies[1].id)
+        self.assertNotContains(response, 'owner1</option>')
+        self.assertEqual(self.client.get(reverse('admin:league_moviegrossupdate_changelist')).status_code, 200)
+
+    def test_paste_grosses(self):
+        """
+        Tests that pasted grosses are matched to movies by name, external identifier or id, and that nothing is
+        written if any line can't be matched.
+        """
+        models.MovieExternalId(movie=self.movies[2], source="boxoffice", identifier="tt2").save()
+        url = reverse('admin:league_moviegrossupdate_paste')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        lines = "\n".join(["Standings Movie 0\t$1,500", "tt2, 3,500", "%d;600" % self.movies[3].id, "",
+                           "Unknown Movie, 10"])
+        response = self.client.post(url, {'date': '2013-07-20', 'source': 'boxoffice', 'grosses': lines})
+        self.assertContains(response, "Line 5 names no movie: Unknown Movie")
+        self.assertFalse(models.MovieGrossUpdate.objects.filter(source="boxoffice").exists())
+        response = self.client.post(url, {'date': '2013-07-20', 'source': 'boxoffice',
+                                          'grosses': lines.rsplit("\n", 1)[0]})
+        self.assertRedirects(response, reverse('admin:league_moviegrossupdate_changelist'))
+        self.assertEqual(sorted(models.MovieGrossUpdate.objects.filter(source="boxoffice")
+                                .values_list('movie_id', 'gross')),
+                         [(self.movies[0].id, 1500), (self.movies[2].id, 3500), (self.movies[3].id, 600)])
+        self.assertEqual(self.movies[2].get_value_on_date(date(2013, 7, 20)), 3500)
+
+    def test_copy_divisions(self):
+        """
+        Tests that divisions are copied into another season with their teams and empty rosters.
+        """
+        season = models.Season(league=self.league, start_date=date(2014, 1, 1), end_date=date(2014, 12, 31),
+                               name="2014")
+        season.save()
+        url = reverse('admin:league_division_changelist')
+        data = {'action': 'copy_to_season', admin.helpers.ACTION_CHECKBOX_NAME: [self.division.id]}
+        self.assertContains(self.client.post(url, data), "Copy divisions")
+        self.client.post(url, dict(data, apply='1', season=season.id))
+        copies = list(season.division_set.all())
+        self.assertEqual([(division.name, division.max_currency) for division in copies], [("Premier", 100)])
+        self.assertEqual(sorted(copies[0].team_set.values_list('owner__username', flat=True)),
+                         ['owner0', 'owner1', 'owner2', 'owner3'])
+        self.assertFalse(models.MovieMembership.objects.filter(team__division=copies[0]).exists())
+        response = self.client.post(url, dict(data, apply='1', season=season.id), follow=True)
+        self.assertContains(response, "More than one division of 2014 would have sort order")
+        self.assertEqual(season.division_set.count(), 1)
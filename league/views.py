@@ -1,36 +1,130 @@
 # Create your views here.
-from django.shortcuts import render
+import json
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
+from league import alltime, display, instrumentation, jobs, live
+from league.caching import (cache_ttl, deferred, division_seasons, latest_league_season, league_page, league_seasons,
+                            page_version, season_seasons, team_seasons)
 from league.models import League, Team, Season, Division
+from league.standings import membership_efficiencies
 
 
 def home(request):
-    return render(request, 'home.html', {'leagues': League.objects.all()})
+    return render(request, 'home.html', {'leagues': League.objects.select_related('commissioner')})
 
 
+@league_page(latest_league_season)
 def league(request, league_id):
-    requested_league = League.objects.get(id=league_id)
+    requested_league = League.objects.select_related('commissioner').get(id=league_id)
     latest_season = requested_league.season_set.latest()
-    return render(request, 'league.html', {'league': requested_league, 'season': latest_season})
+    return render(request, 'league.html', {'league': requested_league, 'season': latest_season,
+                                           'season_standings': deferred(display.season_rows, latest_season),
+                                           'season_version': page_version(), 'live': live.page_enabled('league'),
+                                           'cache_ttl': cache_ttl()})
 
 
+@league_page(team_seasons)
 def team(request, team_id):
-    requested_team = Team.objects.get(id=team_id)
-    return render(request, 'team.html', {'team': requested_team, 'division': requested_team.division,
+    requested_team = Team.objects.select_related('owner', 'division__season__league__commissioner').get(id=team_id)
+    return render(request, 'team.html', {'team': requested_team, 'name': requested_team.get_name(),
+                                         'standing': deferred(display.standing_row, requested_team),
+                                         'memberships': deferred(display.roster_rows, requested_team),
+                                         'division': requested_team.division,
                                          'season': requested_team.division.season,
                                          'league': requested_team.division.season.league})
 
 
+@league_page(league_seasons)
 def seasons(request, league_id):
-    requested_league = League.objects.get(id=league_id)
-    return render(request, 'seasons.html', {'league': requested_league})
+    requested_league = League.objects.select_related('commissioner').get(id=league_id)
+    return render(request, 'seasons.html', {'league': requested_league,
+                                            'season_leaders': deferred(display.leader_rows, requested_league),
+                                            'season_version': page_version(),
+                                            'cache_ttl': cache_ttl()})
 
 
+@league_page(season_seasons)
 def season(request, season_id):
-    requested_season = Season.objects.get(id=season_id)
-    return render(request, 'season.html', {'season': requested_season, 'league': requested_season.league})
+    requested_season = Season.objects.select_related('league').get(id=season_id)
+    return render(request, 'season.html', {'season': requested_season, 'league': requested_season.league,
+                                           'season_standings': deferred(display.season_rows, requested_season),
+                                           'season_version': page_version(), 'live': live.page_enabled('season'),
+                                           'cache_ttl': cache_ttl()})
 
 
+@league_page(division_seasons)
 def division(request, division_id):
-    requested_division = Division.objects.get(id=division_id)
+    requested_division = Division.objects.select_related('season__league').get(id=division_id)
     return render(request, 'division.html', {'division': requested_division, 'season': requested_division.season,
-                                             'league': requested_division.season.league})
\ No newline at end of file
+                                             'league': requested_division.season.league,
+                                             'standings': deferred(display.division_rows, requested_division),
+                                             'season_version': page_version(), 'live': live.page_enabled('division'),
+                                             'cache_ttl': cache_ttl()})
+
+
+ALLTIME_PAGE_SIZE = 25
+ALLTIME_COLUMNS = [('total_value', 'Total Value'), ('titles', 'Titles'), ('promotions', 'Promotions'),
+                   ('relegations', 'Relegations'), ('efficiency', 'Efficiency'), ('seasons', 'Seasons')]
+
+
+def alltime_leaderboard(request, league_id):
+    requested_league = League.objects.select_related('commissioner').get(id=league_id)
+    sort = request.GET.get('sort')
+    if sort not in alltime.SORT_FIELDS:
+        sort = 'total_value'
+    paginator = Paginator(alltime.leaderboard(requested_league, sort), ALLTIME_PAGE_SIZE)
+    try:
+        page = paginator.page(request.GET.get('page', 1))
+    except (EmptyPage, PageNotAnInteger):
+        page = paginator.page(1)
+    return render(request, 'alltime.html', {'league': requested_league, 'page': page, 'sort': sort,
+                                            'columns': ALLTIME_COLUMNS,
+                                            'rank_offset': page.start_index() - 1 if paginator.count else 0})
+
+
+PICKS_PAGE_SIZE = 25
+
+
+@league_page(season_seasons)
+def season_picks(request, season_id):
+    requested_season = Season.objects.select_related('league__commissioner').get(id=season_id)
+    worst = request.GET.get('order') == 'worst'
+    paginator = Paginator(membership_efficiencies(requested_season, worst=worst), PICKS_PAGE_SIZE)
+    try:
+        page = paginator.page(request.GET.get('page', 1))
+    except (EmptyPage, PageNotAnInteger):
+        page = paginator.page(1)
+    return render(request, 'picks.html', {'season': requested_season, 'league': requested_season.league,
+                                          'page': page, 'order': 'worst' if worst else 'best',
+                                          'rank_offset': page.start_index() - 1 if paginator.count else 0})
+
+
+def season_live(request, season_id):
+    if not live.live_pages():
+        raise Http404
+    requested_season = get_object_or_404(Season, id=season_id)
+    response = StreamingHttpResponse(live.event_stream(live.get_publisher(), requested_season.id,
+                                                       request.META.get('HTTP_LAST_EVENT_ID')),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _require_internal(request):
+    if not (settings.DEBUG or request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS):
+        raise Http404
+
+
+def stats(request):
+    _require_internal(request)
+    return HttpResponse(json.dumps(instrumentation.stats()), content_type='application/json')
+
+
+def job_status(request):
+    _require_internal(request)
+    return HttpResponse(json.dumps(jobs.queue_status()), content_type='application/json')